@@ -92,7 +92,7 @@ exports.GTFS = class {
 
     function loadStopTimes(db) {
       load(db, 'stop_times', [
-        {name: 'trip_id', type: 'INTEGER'},
+        {name: 'trip_id', type: 'TEXT'},
         {name: 'arrival_time', type: 'TEXT'},
         {name: 'departure_time', type: 'TEXT'},
         {name: 'stop_id', type: 'INTEGER'},
@@ -117,12 +117,39 @@ exports.GTFS = class {
     function loadTrips(db) {
       load(db, 'trips', [
         {name: 'route_id', type: 'INTEGER'},
-        {name: 'trip_id', type: 'INTEGER'},
+        {name: 'trip_id', type: 'TEXT'},
         {name: 'trip_headsign', type: 'TEXT'},
         {name: 'service_id', type: 'TEXT'}
       ]);
     }
 
+    // generate-gtfs.py --sqlite writes the same tables, already indexed.
+    // It is only used when it is at least as new as every text table, so
+    // that a stale database never shadows a newer feed.
+    const tables = ['agency', 'calendar_dates', 'routes', 'stops', 'stop_times', 'trips'];
+    const precompiled = `${__dirname}/gtfs/gtfs.sqlite`;
+    if (fs.existsSync(precompiled)) {
+      const precompiledTime = fs.statSync(precompiled).mtime.getTime();
+      const stale = tables.filter(table => {
+        const filename = `${__dirname}/gtfs/${table}.txt`;
+        return (
+          fs.existsSync(filename) &&
+          fs.statSync(filename).mtime.getTime() > precompiledTime
+        );
+      });
+      if (stale.length === 0) {
+        console.log(`Loading GTFS from ${precompiled}`);
+        this.db = new sqlite3.Database(precompiled, sqlite3.OPEN_READONLY);
+        return;
+      }
+      console.log(
+        `Ignoring ${precompiled}: older than ${stale
+          .map(table => `${table}.txt`)
+          .join(', ')}`
+      );
+    }
+
+    console.log(`Loading GTFS from ${__dirname}/gtfs/*.txt`);
     this.db = new sqlite3.Database(':memory:');
     this.db.serialize(() => {
       loadAgency(this.db);
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# coding=UTF8
+"""Benchmark feed generation on synthetically scaled-up schedules.
+
+Each scale is built in a fresh interpreter so that its peak RSS is its own,
+by the same feed_pipeline.StreamFeed() that generate-gtfs.py runs, with its
+defaults unless --shapes, --blocks or --check-nearby-stops are given. The
+phases are timed with pipeline_profile: validation, writing the rows, the
+optional stages, and expansion of the trip groups into rows as the rest.
+The report is a JSON document with one entry per scale, which also holds
+the total time of every profiled step.
+"""
+
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+from optparse import OptionParser
+
+import feed_pipeline
+import pipeline_profile
+import schedule_spec
+import spec_scale
+import vehicle_blocks
+
+parser = OptionParser(usage='%prog [--scales 1,10,100,1000] [--report bench.json]')
+parser.add_option('--spec', dest='spec',
+                  help='Schedule spec to scale up')
+parser.add_option('--scales', dest='scales',
+                  help='Comma separated scale factors; each is split into copies of the '
+                       'network, service days and headway density (see spec_scale.Factors)')
+parser.add_option('--report', dest='report',
+                  help='Path of the JSON report')
+parser.add_option('--jobs', dest='jobs', type='int',
+                  help='Worker processes expanding and checking blocks (see generate-gtfs.py)')
+parser.add_option('--shapes', dest='shapes', action='store_true',
+                  help='Also write shapes, as generate-gtfs.py --shapes')
+parser.add_option('--blocks', dest='blocks', action='store_true',
+                  help='Also chain trips into vehicle blocks, as generate-gtfs.py --blocks')
+parser.add_option('--check-nearby-stops', dest='check_nearby_stops', action='store_true',
+                  help='Also check for nearby stops, as generate-gtfs.py --check-nearby-stops')
+parser.add_option('--measure', dest='measure', type='int',
+                  help='Build one scale and print its measurements (used internally)')
+parser.set_defaults(scales='1,10,100,1000', report='bench.json', jobs=1, shapes=False,
+                    blocks=False, check_nearby_stops=False,
+                    spec=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'io2017.json'))
+(options, args) = parser.parse_args()
+
+def PeakRss(who=resource.RUSAGE_SELF):
+    "Return the peak resident set size of this process (or its largest child) in kilobytes."
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+# Profiled steps making up each reported phase; expansion is the rest.
+PHASES = {
+    'validate': ('validate', 'validate feed'),
+    'write': ('write trips', 'write stops and metadata', 'write shapes', 'write zip'),
+    'shapes': ('shapes',),
+    'blocks': ('vehicle blocks', 'vehicle report'),
+}
+
+def Measure(spec_path, scale, jobs=1, shapes=False, blocks=False, check_nearby_stops=False):
+    "Build the feed for `spec_path` scaled by `scale`; return its measurements."
+    copies, days, density = spec_scale.Factors(scale)
+    spec = spec_scale.ScaleSpec(schedule_spec.LoadSpec(spec_path), copies, days, density)
+    output = tempfile.NamedTemporaryFile(suffix='.zip', delete=False)
+    output.close()
+    profiler = pipeline_profile.PipelineProfiler()
+    try:
+        profiler.Start()
+        try:
+            validator = feed_pipeline.StreamFeed(
+                spec, output.name, jobs=jobs, shapes={} if shapes else None,
+                nearby_stops=feed_pipeline.NEARBY_STOP_METERS if check_nearby_stops else 0,
+                blocks=vehicle_blocks.BlockBuilder() if blocks else None)
+        finally:
+            profiler.Stop()
+        zip_bytes = os.path.getsize(output.name)
+    finally:
+        os.remove(output.name)
+    steps = {}
+    for path, node in profiler.nodes.items():
+        steps[path[-1]] = steps.get(path[-1], 0.0) + node.total
+    seconds = dict((phase, sum(steps.get(step, 0.0) for step in names))
+                   for phase, names in PHASES.items())
+    seconds['total'] = profiler.seconds
+    seconds['expand'] = seconds['total'] - sum(seconds[phase] for phase in PHASES)
+    counts = profiler.routes.values()
+    trips = sum(trips for _, trips, _ in counts)
+    stop_times = sum(stop_times for _, _, stop_times in counts)
+    return {
+        'scale': scale,
+        'jobs': jobs,
+        'copies': copies,
+        'days': days,
+        'density': density,
+        'shapes': shapes,
+        'blocks': blocks,
+        'check_nearby_stops': check_nearby_stops,
+        'trips': trips,
+        'stop_times': stop_times,
+        'problems': len(validator.problems),
+        'seconds': seconds,
+        'steps': steps,
+        'stop_times_per_second': stop_times / seconds['total'] if seconds['total'] else None,
+        'zip_bytes': zip_bytes,
+        'peak_rss_kb': PeakRss(),
+        'peak_worker_rss_kb': PeakRss(resource.RUSAGE_CHILDREN) if jobs > 1 else None,
+    }
+
+if options.measure:
+    json.dump(Measure(options.spec, options.measure, options.jobs, options.shapes,
+                      options.blocks, options.check_nearby_stops), sys.stdout)
+    sys.exit(0)
+
+results = []
+for scale in [int(scale) for scale in options.scales.split(',')]:
+    flags = [flag for flag, used in (('--shapes', options.shapes), ('--blocks', options.blocks),
+                                     ('--check-nearby-stops', options.check_nearby_stops))
+             if used]
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                      '--spec', options.spec, '--jobs', str(options.jobs),
+                                      '--measure', str(scale)] + flags)
+    result = json.loads(output.decode('utf-8'))
+    results.append(result)
+    sys.stderr.write('%5dx %8d trips %9d stop_times  expand %7.2fs  validate %7.2fs  '
+                     'write %7.2fs  peak RSS %7d kB\n' % (
+                         scale, result['trips'], result['stop_times'], result['seconds']['expand'],
+                         result['seconds']['validate'], result['seconds']['write'],
+                         result['peak_rss_kb']))
+
+report = {
+    'spec': os.path.basename(options.spec),
+    'python': platform.python_version(),
+    'platform': platform.platform(),
+    'results': results,
+}
+with open(options.report, 'w') as report_file:
+    json.dump(report, report_file, indent=2, sort_keys=True)
+    report_file.write('\n')
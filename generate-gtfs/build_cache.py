@@ -0,0 +1,102 @@
+# coding=UTF8
+"""Content-hashed cache of expanded trip blocks.
+
+Trips are expanded one block per (route, service period). The cache keys
+each block by a hash of everything its rows depend on: the route, the
+service period, the stops it visits and its resolved trip groups (start
+times and delta_minutes offsets, in seconds). A rebuild after editing one
+departure time then only expands and validates the blocks whose hash
+changed, and splices every other block back in from disk.
+
+Entries written during a build are staged and only become visible on
+Commit(), so a build that fails validation never caches its rows.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from array import array
+
+# Bump when the meaning of cached rows changes.
+CACHE_VERSION = 2
+
+_COLUMNS = ('trip_headsign', 'trip_route', 'trip_service', 'trip_offsets',
+            'st_stop', 'st_time', 'st_pickup', 'st_drop_off',
+            'freq_trip', 'freq_start', 'freq_end', 'freq_headway')
+
+def _ToBytes(column):
+    return column.tobytes() if hasattr(column, 'tobytes') else column.tostring()
+
+def _FromBytes(data):
+    column = array('i')
+    if hasattr(column, 'frombytes'):
+        column.frombytes(data)
+    else:
+        column.fromstring(data)
+    return column
+
+class BuildCache(object):
+    "A directory of cached trip blocks, one file per input hash."
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.hits = 0
+        self.misses = 0
+        self._used = set()
+        self._staged = []
+
+    def Digest(self, inputs):
+        "Return the hex digest of `inputs`, a JSON-serializable description of a block."
+        encoded = json.dumps([CACHE_VERSION, inputs], sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+    def _Path(self, digest, suffix=''):
+        return os.path.join(self.directory, digest + '.block' + suffix)
+
+    def Contains(self, digest):
+        return os.path.exists(self._Path(digest))
+
+    def Load(self, digest, schedule):
+        "Append the cached rows for `digest` to `schedule`; return whether they were found."
+        self._used.add(digest)
+        try:
+            with open(self._Path(digest), 'rb') as block_file:
+                stored = pickle.load(block_file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return False
+        rows = dict((column, _FromBytes(stored[column])) for column in _COLUMNS)
+        rows['headsigns'] = stored['headsigns']
+        schedule.ExtendRows(rows)
+        self.hits += 1
+        return True
+
+    def Store(self, digest, rows):
+        "Stage `rows` (from CompiledSchedule.Rows()) under `digest` until Commit()."
+        self._used.add(digest)
+        stored = dict((column, _ToBytes(rows[column])) for column in _COLUMNS)
+        stored['headsigns'] = rows['headsigns']
+        with open(self._Path(digest, '.tmp'), 'wb') as block_file:
+            pickle.dump(stored, block_file, 2)
+        self._staged.append(digest)
+
+    def Commit(self):
+        "Publish the staged blocks and delete blocks this build did not use."
+        for digest in self._staged:
+            os.rename(self._Path(digest, '.tmp'), self._Path(digest))
+        self._staged = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.block') and filename[:-len('.block')] not in self._used:
+                os.remove(os.path.join(self.directory, filename))
+
+    def Discard(self):
+        "Drop the staged blocks."
+        for digest in self._staged:
+            try:
+                os.remove(self._Path(digest, '.tmp'))
+            except OSError:
+                pass
+        self._staged = []
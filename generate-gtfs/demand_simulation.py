@@ -0,0 +1,331 @@
+# coding=UTF8
+"""Discrete-event simulation of passenger demand against vehicle capacity.
+
+Demand is read from a CSV file with the columns
+
+  stop_id, to_stop_id    where the passengers wait and where they travel to,
+                         stop ids as in the spec
+  start_time, end_time   their arrival window, 'HH:MM:SS', end exclusive;
+                         equal times make a single arrival
+  passengers             how many arrive over the window, evenly spread
+
+Each window is cut into cohorts of passengers arriving at the same stop for
+the same destination within `cohort_seconds` of each other; a cohort
+arrives at the middle of its interval. The cohorts are rows of flat arrays
+sorted by arrival, and one is only split when a vehicle fills up before all
+of it has boarded.
+
+Passengers ride one trip, with no transfers: they board the first vehicle
+that picks up at their stop, drops off at their destination later on and
+has room, first come first served. The capacity of a vehicle is the
+"capacity" of its route in the spec, or a default.
+
+The event queue is a heap of vehicle stop visits, (time, run, position):
+a vehicle run pushes its next stop as it leaves the previous one, so the
+heap never holds more than one event per run. Passengers need no events of
+their own: the cohorts waiting at a stop for a destination form a queue in
+arrival order, and a visiting vehicle boards from its head the cohorts that
+have arrived by then.
+"""
+
+import collections
+import csv
+import heapq
+import io
+import sys
+from array import array
+
+import gtfs_time
+import schedule_spec
+
+PY2 = sys.version_info[0] == 2
+
+# Passengers a vehicle holds when its route has no "capacity".
+DEFAULT_CAPACITY = 50
+
+DemandRow = collections.namedtuple('DemandRow', ['stop', 'to_stop', 'start', 'end', 'passengers'])
+
+def ReadDemand(path, stop_index):
+    """Return the DemandRows of the CSV file at `path`, with the stops as
+    indexes in `stop_index` (stop id -> index) and the times in seconds."""
+    if PY2:
+        csv_file = open(path, 'rb')
+    else:
+        csv_file = io.open(path, encoding='utf-8-sig', newline='')
+    rows = []
+    with csv_file:
+        for row in csv.DictReader(csv_file):
+            if PY2:
+                row = dict((key.decode('utf-8-sig'), value.decode('utf-8'))
+                           for key, value in row.items())
+            stops = []
+            for key in ('stop_id', 'to_stop_id'):
+                stop_id = row[key].strip()
+                if stop_id not in stop_index:
+                    raise ValueError('Unknown %s %r in %s' % (key, stop_id, path))
+                stops.append(stop_index[stop_id])
+            start = gtfs_time.ParseTime(row['start_time'])
+            end = gtfs_time.ParseTime(row['end_time'])
+            if end < start:
+                raise ValueError('end_time %s before start_time %s in %s' % (
+                    row['end_time'], row['start_time'], path))
+            rows.append(DemandRow(stops[0], stops[1], start, end, float(row['passengers'])))
+    return rows
+
+def _Percentile(waits, fraction):
+    "The `fraction` percentile of `waits`, a list of (seconds, passengers)."
+    waits = sorted(waits)
+    threshold = fraction * sum(count for _, count in waits)
+    seen = 0
+    for seconds, count in waits:
+        seen += count
+        if seen >= threshold:
+            return seconds
+    return 0
+
+class DemandSimulation(object):
+    """Passengers of `demand` (DemandRows) riding the trips of a
+    CompiledSchedule that run on `date` (YYYYMMDD).
+
+    With `passengers`, the demand is scaled to that many passengers in all.
+    Run() simulates the day; then TripRows() and StopRows() report the load
+    of every vehicle run and the wait at every stop.
+    """
+
+    def __init__(self, compiled, date, demand, capacity=DEFAULT_CAPACITY, cohort_seconds=60,
+                 passengers=None):
+        self.compiled = compiled
+        self.date = date
+        self._Cohorts(demand, cohort_seconds, passengers)
+        self._Runs(capacity)
+        self._Reset()
+
+    def _Cohorts(self, demand, cohort_seconds, passengers):
+        total = sum(row.passengers for row in demand)
+        scale = float(passengers) / total if passengers is not None and total > 0 else 1.0
+        cohorts = []
+        # Passengers expected and assigned to cohorts so far: rounding the
+        # running total makes the cohorts add up to the demand.
+        expected = 0.0
+        assigned = 0
+        for row in demand:
+            length = max(row.end - row.start, 0)
+            slots = max(1, -(-length // cohort_seconds))
+            for slot in range(slots):
+                start = row.start + slot * cohort_seconds
+                end = min(start + cohort_seconds, row.end) if length else start
+                expected += row.passengers * scale / slots
+                count = int(expected + 0.5) - assigned
+                assigned += count
+                if count > 0:
+                    cohorts.append(((start + end) // 2, row.stop, row.to_stop, count))
+        cohorts.sort()
+        self.cohort_time = array('i', [cohort[0] for cohort in cohorts])
+        self.cohort_stop = array('i', [cohort[1] for cohort in cohorts])
+        self.cohort_to_stop = array('i', [cohort[2] for cohort in cohorts])
+        self.cohort_size = array('i', [cohort[3] for cohort in cohorts])
+        # (stop, to_stop) -> queue; each queue lists its cohorts in arrival order.
+        self.queue_index = {}
+        self.queue_cohorts = []
+        self.queue_to_stop = array('i')
+        for cohort, key in enumerate(zip(self.cohort_stop, self.cohort_to_stop)):
+            queue = self.queue_index.get(key)
+            if queue is None:
+                queue = self.queue_index[key] = len(self.queue_cohorts)
+                self.queue_cohorts.append(array('i'))
+                self.queue_to_stop.append(key[1])
+            self.queue_cohorts[queue].append(cohort)
+
+    def _Boarding(self, stops, pickups, drop_offs):
+        "The queues a trip with these stop times boards from, at each position."
+        queues = []
+        for position, stop in enumerate(stops):
+            if pickups[position] == schedule_spec.NOT_AVAILABLE:
+                queues.append(())
+                continue
+            targets = set(to_stop for to_stop, drop_off in zip(stops[position + 1:],
+                                                                 drop_offs[position + 1:])
+                          if drop_off != schedule_spec.NOT_AVAILABLE)
+            queues.append(tuple(self.queue_index[stop, to_stop] for to_stop in sorted(targets)
+                                if (stop, to_stop) in self.queue_index))
+        return tuple(queues)
+
+    def _Runs(self, default_capacity):
+        compiled = self.compiled
+        services = set(i for i, period in enumerate(compiled.service_periods)
+                       if self.date in period['dates'])
+        starts = collections.defaultdict(list)
+        for trip, start, end, headway in zip(compiled.freq_trip, compiled.freq_start,
+                                             compiled.freq_end, compiled.freq_headway):
+            starts[trip].extend(range(start, end, headway))
+        # (stops, pickups, drop_offs) -> pattern.
+        pattern_index = {}
+        self.pattern_stops = []
+        self.pattern_drop_offs = []
+        self.pattern_queues = []
+        self.run_trip = array('i')
+        self.run_pattern = array('i')
+        self.run_shift = array('i')
+        self.run_capacity = array('i')
+        for trip in range(compiled.NumTrips()):
+            if compiled.trip_service[trip] not in services:
+                continue
+            begin, end = compiled.trip_offsets[trip], compiled.trip_offsets[trip + 1]
+            stops = tuple(compiled.st_stop[begin:end])
+            pickups = tuple(compiled.st_pickup[begin:end])
+            drop_offs = tuple(compiled.st_drop_off[begin:end])
+            key = (stops, pickups, drop_offs)
+            pattern = pattern_index.get(key)
+            if pattern is None:
+                pattern = pattern_index[key] = len(self.pattern_stops)
+                self.pattern_stops.append(stops)
+                self.pattern_drop_offs.append(tuple(
+                    drop_off != schedule_spec.NOT_AVAILABLE for drop_off in drop_offs))
+                self.pattern_queues.append(self._Boarding(stops, pickups, drop_offs))
+            capacity = compiled.routes[compiled.trip_route[trip]].get('capacity',
+                                                                      default_capacity)
+            first = compiled.st_time[begin]
+            for start in starts.get(trip, [first]):
+                self.run_trip.append(trip)
+                self.run_pattern.append(pattern)
+                self.run_shift.append(start - first)
+                self.run_capacity.append(int(capacity))
+
+    def _Reset(self):
+        "Put every passenger back at their stop and clear the counters."
+        self.cohort_waiting = array('i', self.cohort_size)
+        self.queue_head = array('i', [0]) * len(self.queue_cohorts)
+        runs = len(self.run_trip)
+        self.run_boardings = array('i', [0]) * runs
+        self.run_peak_load = array('i', [0]) * runs
+        self.run_left_behind = array('i', [0]) * runs
+        stops = len(self.compiled.stops)
+        self.stop_boarded = array('i', [0]) * stops
+        self.stop_left_behind = array('i', [0]) * stops
+        # Stop -> [(wait in seconds, passengers)], one entry per boarding cohort.
+        self.stop_waits = collections.defaultdict(list)
+
+    def Unserved(self):
+        """Return (stop, to_stop, passengers) for the demand that no trip
+        on the date serves at all."""
+        served = set()
+        for queues in self.pattern_queues:
+            for position_queues in queues:
+                served.update(position_queues)
+        return [(stop, to_stop, sum(self.cohort_size[cohort]
+                                    for cohort in self.queue_cohorts[queue]))
+                for (stop, to_stop), queue in sorted(self.queue_index.items())
+                if queue not in served]
+
+    def Run(self):
+        "Simulate the day; return the number of vehicle stop events."
+        self._Reset()
+        compiled = self.compiled
+        st_time, trip_offsets = compiled.st_time, compiled.trip_offsets
+        cohort_time, cohort_waiting = self.cohort_time, self.cohort_waiting
+        queue_cohorts, queue_head, queue_to_stop = (self.queue_cohorts, self.queue_head,
+                                                    self.queue_to_stop)
+        run_trip, run_pattern, run_shift = self.run_trip, self.run_pattern, self.run_shift
+        run_load = array('i', [0]) * len(run_trip)
+        # Run -> {to_stop: passengers on board}.
+        run_drops = collections.defaultdict(lambda: collections.defaultdict(int))
+        heap = [(st_time[trip_offsets[run_trip[run]]] + run_shift[run], run, 0)
+                for run in range(len(run_trip))]
+        heapq.heapify(heap)
+        events = 0
+        while heap:
+            now, run, position = heap[0]
+            events += 1
+            pattern = run_pattern[run]
+            stops = self.pattern_stops[pattern]
+            stop = stops[position]
+            if self.pattern_drop_offs[pattern][position] and run in run_drops:
+                run_load[run] -= run_drops[run].pop(stop, 0)
+            queues = self.pattern_queues[pattern][position]
+            if queues:
+                space = self.run_capacity[run] - run_load[run]
+                boarded = 0
+                while space > 0:
+                    # The queue whose first cohort has waited longest.
+                    best = None
+                    for queue in queues:
+                        head = queue_head[queue]
+                        if head < len(queue_cohorts[queue]):
+                            cohort = queue_cohorts[queue][head]
+                            if cohort_time[cohort] <= now and (
+                                    best is None or cohort_time[cohort] < cohort_time[best]):
+                                best, best_queue = cohort, queue
+                    if best is None:
+                        break
+                    count = min(space, cohort_waiting[best])
+                    cohort_waiting[best] -= count
+                    if not cohort_waiting[best]:
+                        queue_head[best_queue] += 1
+                    space -= count
+                    boarded += count
+                    run_drops[run][queue_to_stop[best_queue]] += count
+                    self.stop_waits[stop].append((now - cohort_time[best], count))
+                if not space:
+                    left = 0
+                    for queue in queues:
+                        cohorts = queue_cohorts[queue]
+                        for i in range(queue_head[queue], len(cohorts)):
+                            if cohort_time[cohorts[i]] > now:
+                                break
+                            left += cohort_waiting[cohorts[i]]
+                    self.run_left_behind[run] += left
+                    self.stop_left_behind[stop] += left
+                run_load[run] += boarded
+                self.run_boardings[run] += boarded
+                self.stop_boarded[stop] += boarded
+                if run_load[run] > self.run_peak_load[run]:
+                    self.run_peak_load[run] = run_load[run]
+            position += 1
+            if position < len(stops):
+                heapq.heapreplace(heap, (st_time[trip_offsets[run_trip[run]] + position] +
+                                         run_shift[run], run, position))
+            else:
+                heapq.heappop(heap)
+        return events
+
+    def TripRows(self):
+        """Return (trip id, start time, route id, capacity, boardings, peak
+        load, load factor, passengers left behind) for every vehicle run,
+        by start time. Left behind are the passengers waiting for the run
+        at a stop it leaves full."""
+        compiled = self.compiled
+        rows = []
+        for run, trip in enumerate(self.run_trip):
+            capacity = self.run_capacity[run]
+            peak = self.run_peak_load[run]
+            rows.append((compiled.trip_ids[trip],
+                         compiled.st_time[compiled.trip_offsets[trip]] + self.run_shift[run],
+                         compiled.routes[compiled.trip_route[trip]]['id'], capacity,
+                         self.run_boardings[run], peak,
+                         float(peak) / capacity if capacity > 0 else 0.0,
+                         self.run_left_behind[run]))
+        rows.sort(key=lambda row: (row[1], row[0]))
+        return rows
+
+    def StopRows(self):
+        """Return (stop id, passengers, boarded, stranded, mean, 95th
+        percentile and longest wait in seconds, passengers left behind) for
+        every stop with demand, in spec order. Stranded passengers never
+        boarded and are not counted in the waits; a passenger left behind
+        by several full vehicles counts once for each."""
+        passengers = collections.Counter()
+        stranded = collections.Counter()
+        for stop, size, waiting in zip(self.cohort_stop, self.cohort_size, self.cohort_waiting):
+            passengers[stop] += size
+            stranded[stop] += waiting
+        rows = []
+        for stop in sorted(passengers):
+            waits = self.stop_waits.get(stop, [])
+            boarded = self.stop_boarded[stop]
+            rows.append((self.compiled.stops[stop]['id'], passengers[stop], boarded,
+                         stranded[stop],
+                         float(sum(seconds * count for seconds, count in waits)) / boarded
+                         if boarded else 0.0,
+                         _Percentile(waits, 0.95), max([seconds for seconds, _ in waits] or [0]),
+                         self.stop_left_behind[stop]))
+        return rows
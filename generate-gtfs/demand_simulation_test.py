@@ -0,0 +1,80 @@
+# coding=UTF8
+"""Tests of demand_simulation: passengers are conserved and Run() can be repeated."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import demand_simulation
+import schedule_spec
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DATE = '20170517'
+
+class DemandSimulationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.compiled = schedule_spec.CompileSpec(
+            schedule_spec.LoadSpec(os.path.join(DIRECTORY, 'io2017.json')), frequencies=True)
+        cls.demand = demand_simulation.ReadDemand(os.path.join(DIRECTORY, 'io2017_demand.csv'),
+                                                  cls.compiled.stop_index)
+
+    def _Simulation(self, capacity):
+        simulation = demand_simulation.DemandSimulation(self.compiled, DATE, self.demand,
+                                                        capacity=capacity)
+        simulation.Run()
+        return simulation
+
+    def testConservation(self):
+        # A small capacity leaves passengers stranded.
+        for capacity in (10, demand_simulation.DEFAULT_CAPACITY):
+            simulation = self._Simulation(capacity)
+            rows = simulation.StopRows()
+            self.assertEqual(sum(row[1] for row in rows),
+                             int(round(sum(row.passengers for row in self.demand))))
+            for stop_id, passengers, boarded, stranded, _, _, _, _ in rows:
+                self.assertEqual(boarded + stranded, passengers, stop_id)
+            trips = simulation.TripRows()
+            self.assertEqual(sum(row[4] for row in trips), sum(row[2] for row in rows))
+            for row in trips:
+                self.assertLessEqual(row[5], row[3])
+        self.assertTrue(any(row[3] for row in self._Simulation(10).StopRows()))
+
+    def testRunTwice(self):
+        simulation = self._Simulation(10)
+        trips, stops = simulation.TripRows(), simulation.StopRows()
+        simulation.Run()
+        self.assertEqual(simulation.TripRows(), trips)
+        self.assertEqual(simulation.StopRows(), stops)
+
+class ReadDemandTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='demand-simulation-test-')
+        self.stop_index = {'a': 0, 'b': 1}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _Read(self, *rows):
+        path = os.path.join(self.directory, 'demand.csv')
+        with open(path, 'w') as csv_file:
+            csv_file.write('stop_id,to_stop_id,start_time,end_time,passengers\n')
+            for row in rows:
+                csv_file.write(row + '\n')
+        return demand_simulation.ReadDemand(path, self.stop_index)
+
+    def testRows(self):
+        self.assertEqual(self._Read('a,b,07:00:00,08:00:00,30', 'b,a,09:00:00,09:00:00,5'),
+                         [(0, 1, 7 * 3600, 8 * 3600, 30.0), (1, 0, 9 * 3600, 9 * 3600, 5.0)])
+
+    def testEndBeforeStart(self):
+        self.assertRaises(ValueError, self._Read, 'a,b,08:00:00,07:00:00,30')
+
+    def testUnknownStop(self):
+        self.assertRaises(ValueError, self._Read, 'a,c,07:00:00,08:00:00,30')
+
+if __name__ == '__main__':
+    unittest.main()
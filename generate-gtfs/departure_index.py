@@ -0,0 +1,199 @@
+# coding=UTF8
+"""Precomputed departure boards.
+
+"Next departures from stop X on date D" needs, per stop and service
+period, the departures sorted by time; with those precomputed a lookup is
+a binary search rather than a scan of stop_times. DepartureIndexWriter
+collects them block by block while the feed is generated and writes them
+in the columnar format of feed_columnar.py, so a DepartureIndex opens the
+file with a memory map and copies nothing. Columns:
+
+  departures.time (i4)      seconds since service-day midnight
+  departures.trip (i4)      trip index
+  departures.offsets (i4)   the departures of stop s in service period p are
+                            rows [offsets[k], offsets[k + 1]) with
+                            k = s * number of service periods + p, sorted by time
+  calendar_dates.date, calendar_dates.service (i4)   sorted by date
+  stops.key, stops.name, service_periods.key, headsigns (str)
+  routes.short_name, routes.long_name (str)
+  trips.id (str), trips.route, trips.headsign (i4 indexes)
+
+A departure is a stop time other than the last of its trip that allows
+pickup. Trips with frequencies depart at every start of their frequencies.
+"""
+
+import bisect
+import collections
+import datetime
+import shutil
+from array import array
+
+import feed_columnar
+
+Departure = collections.namedtuple('Departure', ['time', 'trip_id', 'route', 'headsign', 'trip'])
+
+# pickup_type of stop times where passengers cannot board.
+NO_PICKUP = 1
+
+class DepartureIndexWriter(feed_columnar.ColumnarFeedWriter):
+    """Writes the departure index of a CompiledSchedule.
+
+    Call WriteBlock() with each block of trips and Close() with the final
+    schedule, as for a ColumnarFeedWriter. The departures are held in int arrays
+    until Close() sorts them.
+    """
+
+    def __init__(self, path):
+        feed_columnar.ColumnarFeedWriter.__init__(self, path)
+        self._times = array('i')
+        self._trips = array('i')
+        # stop * number of services + service, filled in on Close().
+        self._stops = array('i')
+        self._services = array('i')
+        self._num_trips = 0
+
+    def _Add(self, stop, service, time, trip):
+        self._stops.append(stop)
+        self._services.append(service)
+        self._times.append(time)
+        self._trips.append(trip)
+
+    def WriteBlock(self, compiled):
+        "Collect the departures of the trips currently held by `compiled`."
+        starts = collections.defaultdict(list)
+        for trip, start, end, headway in zip(compiled.freq_trip, compiled.freq_start,
+                                             compiled.freq_end, compiled.freq_headway):
+            starts[trip].extend(range(start, end, headway))
+        offsets = compiled.trip_offsets
+        for trip in range(compiled.NumTrips()):
+            begin, end = offsets[trip], offsets[trip + 1]
+            service = compiled.trip_service[trip]
+            first = compiled.st_time[begin]
+            shifts = [start - first for start in starts[trip]] if trip in starts else [0]
+            for row in range(begin, end - 1):
+                if compiled.st_pickup[row] == NO_PICKUP:
+                    continue
+                for shift in shifts:
+                    self._Add(compiled.st_stop[row], service, compiled.st_time[row] + shift,
+                              self._num_trips + trip)
+        self._AppendStrings('trips.id', compiled.trip_ids)
+        self._Append('trips.route', 'i4', compiled.trip_route)
+        self._Append('trips.headsign', 'i4', compiled.trip_headsign)
+        self._num_trips += compiled.NumTrips()
+
+    def Close(self, compiled):
+        "Sort the departures and write them with the lookup tables of `compiled`."
+        try:
+            num_services = len(compiled.service_periods)
+            keys = [stop * num_services + service
+                    for stop, service in zip(self._stops, self._services)]
+            order = sorted(range(len(keys)), key=lambda i: (keys[i], self._times[i]))
+            self._Append('departures.time', 'i4', [self._times[i] for i in order])
+            self._Append('departures.trip', 'i4', [self._trips[i] for i in order])
+            counts = collections.Counter(keys)
+            offsets, total = [0], 0
+            for key in range(len(compiled.stops) * num_services):
+                total += counts[key]
+                offsets.append(total)
+            self._Append('departures.offsets', 'i4', offsets)
+            dates = sorted((int(date), i) for i, period in enumerate(compiled.service_periods)
+                           for date in period['dates'])
+            self._Append('calendar_dates.date', 'i4', [date for date, _ in dates])
+            self._Append('calendar_dates.service', 'i4', [service for _, service in dates])
+            self._AppendStrings('stops.key', [stop['id'] for stop in compiled.stops])
+            self._AppendStrings('stops.name', [stop['name'] for stop in compiled.stops])
+            self._AppendStrings('service_periods.key',
+                                [period['id'] for period in compiled.service_periods])
+            self._AppendStrings('headsigns', compiled.headsigns)
+            self._AppendStrings('routes.short_name',
+                                [route.get('short_name', '') for route in compiled.routes])
+            self._AppendStrings('routes.long_name',
+                                [route.get('long_name', '') for route in compiled.routes])
+            if 'trips.route' not in self._files:
+                self.WriteBlock(compiled)
+            for column_file in self._files.values():
+                column_file.close()
+            self._Assemble(compiled.agency)
+        finally:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+def _DateNumber(date):
+    "Return YYYYMMDD as an int for a date, a 'YYYYMMDD' string or an int."
+    if isinstance(date, datetime.date):
+        return int(date.strftime('%Y%m%d'))
+    return int(date)
+
+def _PreviousDay(date):
+    day = datetime.datetime.strptime(str(date), '%Y%m%d') - datetime.timedelta(days=1)
+    return int(day.strftime('%Y%m%d'))
+
+class DepartureIndex(object):
+    "A memory-mapped departure index written by DepartureIndexWriter."
+
+    def __init__(self, path):
+        self.feed = feed_columnar.ColumnarFeed(path)
+        column = self.feed.Column
+        self.times = column('departures.time')
+        self.trips = column('departures.trip')
+        self.offsets = column('departures.offsets')
+        self.dates = column('calendar_dates.date')
+        self.date_services = column('calendar_dates.service')
+        self.num_services = len(column('service_periods.key'))
+        self._stops = None
+
+    def Stop(self, key):
+        "Return the index of the stop with spec id `key`, or None."
+        if self._stops is None:
+            self._stops = dict((stop, i) for i, stop in enumerate(self.feed.Column('stops.key')))
+        return self._stops.get(key)
+
+    def Services(self, date):
+        "Return the indexes of the service periods running on `date`."
+        date = _DateNumber(date)
+        first = bisect.bisect_left(self.dates, date)
+        last = bisect.bisect_right(self.dates, date)
+        return [self.date_services[i] for i in range(first, last)]
+
+    def _Range(self, stop, service, after):
+        "Return the rows of the departures of (stop, service) at or after `after`."
+        key = stop * self.num_services + service
+        begin, end = self.offsets[key], self.offsets[key + 1]
+        return range(bisect.bisect_left(self.times, after, begin, end), end)
+
+    def Departures(self, stop, date, after=0, limit=10):
+        """Return up to `limit` Departures from stop index `stop` on `date` at
+        or after `after` seconds since midnight, in time order.
+
+        Departures after midnight of the previous day's service periods
+        are included, with times relative to `date`.
+        """
+        date = _DateNumber(date)
+        rows = []
+        for day, shift in ((date, 0), (_PreviousDay(date), 24 * 3600)):
+            for service in self.Services(day):
+                found = self._Range(stop, service, after + shift)
+                if limit is not None:
+                    found = found[:limit]
+                rows.extend((self.times[row] - shift, self.trips[row]) for row in found)
+        rows.sort()
+        if limit is not None:
+            rows = rows[:limit]
+        return [self._Departure(time, trip) for time, trip in rows]
+
+    def _Departure(self, time, trip):
+        column = self.feed.Column
+        route = column('trips.route')[trip]
+        return Departure(time, column('trips.id')[trip],
+                         column('routes.short_name')[route] or column('routes.long_name')[route],
+                         column('headsigns')[column('trips.headsign')[trip]], trip)
+
+    def Close(self):
+        "Unmap the file; columns returned before must not be used afterwards."
+        self.times = self.trips = self.offsets = self.dates = self.date_services = None
+        self.feed.Close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
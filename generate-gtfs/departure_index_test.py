@@ -0,0 +1,104 @@
+# coding=UTF8
+"""Tests of departure_index: departure boards against a scan of the CSV feed."""
+
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+
+import departure_index
+import feed_reader
+import feed_writer
+import gtfs_time
+import schedule_spec
+
+SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'io2017.json')
+
+class DepartureIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp(prefix='departure-index-test-')
+        zip_path = os.path.join(cls.directory, 'feed.zip')
+        cls.index_path = os.path.join(cls.directory, 'departures.col')
+        departures = departure_index.DepartureIndexWriter(cls.index_path)
+        with feed_writer.FeedWriter(zip_path) as writer:
+            def WriteBlock(block):
+                feed_writer.WriteTrips(writer, block)
+                departures.WriteBlock(block)
+            compiled = schedule_spec.CompileSpec(schedule_spec.LoadSpec(SPEC),
+                                                 on_block=WriteBlock, frequencies=True)
+            feed_writer.WriteMetadata(writer, compiled)
+        departures.Close(compiled)
+        cls.stop_ids = [stop['id'] for stop in compiled.stops]
+        cls.expected = cls._ScanFeed(zip_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    @staticmethod
+    def _ScanFeed(path):
+        "Return {(stop index, date): sorted [(time, trip index, trip id)]} from the CSV feed."
+        with feed_reader.Feed(path) as feed:
+            trips = list(feed.ReadDicts('trips.txt'))
+            trip_index = dict((trip['trip_id'], i) for i, trip in enumerate(trips))
+            dates = collections.defaultdict(list)
+            for row in feed.ReadDicts('calendar_dates.txt'):
+                dates[row['service_id']].append(row['date'])
+            starts = collections.defaultdict(list)
+            for row in feed.ReadDicts('frequencies.txt'):
+                starts[row['trip_id']].extend(range(
+                    gtfs_time.ParseTime(row['start_time']), gtfs_time.ParseTime(row['end_time']),
+                    int(row['headway_secs'])))
+            stop_times = collections.defaultdict(list)
+            for row in feed.ReadDicts('stop_times.txt'):
+                stop_times[row['trip_id']].append(
+                    (int(row['stop_sequence']), int(row['stop_id']),
+                     gtfs_time.ParseTime(row['departure_time']), row['pickup_type']))
+        expected = collections.defaultdict(list)
+        for trip in trips:
+            rows = sorted(stop_times[trip['trip_id']])
+            first = rows[0][2]
+            for _, stop, time, pickup in rows[:-1]:
+                if pickup == '1':
+                    continue
+                for start in starts.get(trip['trip_id'], [first]):
+                    for date in dates[trip['service_id']]:
+                        expected[stop, date].append(
+                            (time - first + start, trip_index[trip['trip_id']], trip['trip_id']))
+        for departures in expected.values():
+            departures.sort()
+        return expected
+
+    def setUp(self):
+        self.index = departure_index.DepartureIndex(self.index_path)
+
+    def tearDown(self):
+        self.index.Close()
+
+    def testEveryBoard(self):
+        for stop, date in self.expected:
+            self.assertEqual(
+                [(departure.time, departure.trip, departure.trip_id)
+                 for departure in self.index.Departures(stop, date, limit=None)],
+                self.expected[stop, date])
+
+    def testAfterAndLimit(self):
+        stop = self.index.Stop('shorelineAmphitheatre')
+        expected = [row for row in self.expected[stop, '20170518'] if row[0] >= 17 * 3600][:5]
+        self.assertEqual(len(expected), 5)
+        self.assertEqual(
+            [(departure.time, departure.trip, departure.trip_id)
+             for departure in self.index.Departures(stop, '20170518', 17 * 3600, 5)],
+            expected)
+
+    def testNoService(self):
+        stop = self.index.Stop('shorelineAmphitheatre')
+        self.assertEqual(self.index.Services('20170601'), [])
+        self.assertEqual(self.index.Departures(stop, '20170601'), [])
+        self.assertEqual(self.index.Stop('nowhere'), None)
+
+if __name__ == '__main__':
+    unittest.main()
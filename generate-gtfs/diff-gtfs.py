@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# coding=UTF8
+
+import sys
+from optparse import OptionParser
+
+import feed_diff
+
+parser = OptionParser(usage='%prog diff OLD_FEED NEW_FEED --output DELTA.json\n'
+                            '       %prog apply DELTA.json FEED_DIRECTORY')
+parser.add_option('--output', dest='output',
+                  help='Path of the delta written by diff')
+parser.set_defaults(output='gtfs_delta.json')
+(options, args) = parser.parse_args()
+
+if len(args) != 3 or args[0] not in ('diff', 'apply'):
+    parser.error('expected "diff OLD_FEED NEW_FEED" or "apply DELTA FEED_DIRECTORY"')
+
+if args[0] == 'diff':
+    delta = feed_diff.DiffFeeds(args[1], args[2])
+    feed_diff.WriteDelta(delta, options.output)
+else:
+    delta = feed_diff.ReadDelta(args[1])
+    try:
+        feed_diff.ApplyDelta(delta, args[2])
+    except feed_diff.DeltaError as e:
+        parser.error('cannot apply %s: %s' % (args[1], e))
+
+for line in feed_diff.Summary(delta):
+    sys.stderr.write(line + '\n')
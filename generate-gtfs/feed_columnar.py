@@ -0,0 +1,282 @@
+# coding=UTF8
+"""Columnar binary feed format.
+
+The CSV feed spends most of its bytes on stop_times.txt, which is small
+integers and 'HH:MM:SS' strings. This format stores every column as one
+little-endian typed array, times as int32 seconds since service-day
+midnight, and repeated strings such as headsigns dictionary-encoded.
+
+File layout:
+
+  magic       8 bytes, 'GTFSCOL1'
+  length      uint32, length of the header
+  header      UTF-8 JSON: {"agency": {...}, "columns": {name: [type, offset, count]}}
+  arrays      each column, 8-byte aligned, at its offset from the file start
+
+String columns are stored as two arrays, "<name>.offsets" (int32, one more
+than the number of strings) and "<name>.data" (UTF-8 bytes). Columns:
+
+  stops.name (str), stops.lat, stops.lon (f8), stops.key (str, spec id)
+  routes.short_name, routes.long_name (str), routes.type (i4)
+  calendar_dates.service, calendar_dates.date (i4, YYYYMMDD)
+  service_periods.key (str)
+  headsigns (str)
+  trips.id (str), trips.route, trips.service, trips.headsign (i4 indexes),
+  trips.stop_times (i4, trip i's stop times are rows [stop_times[i], stop_times[i + 1]))
+  stop_times.stop, stop_times.time (i4), stop_times.pickup, stop_times.drop_off (u1)
+  frequencies.trip, frequencies.start, frequencies.end, frequencies.headway (i4)
+
+ColumnarFeed memory-maps a file and exposes its columns as memoryviews
+over the map, so opening a feed copies nothing (Python 3; Python 2 falls
+back to reading each column into an array).
+"""
+
+import io
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+
+import feed_writer
+
+MAGIC = b'GTFSCOL1'
+
+# Column types and their array typecodes.
+TYPECODES = {'i4': 'i', 'f4': 'f', 'f8': 'd', 'u1': 'B'}
+ITEM_SIZES = {'i4': 4, 'f4': 4, 'f8': 8, 'u1': 1}
+
+_SWAP = sys.byteorder != 'little'
+
+def _Bytes(values):
+    if _SWAP:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+
+def _Utf8(text):
+    if isinstance(text, bytes):
+        return text
+    return text.encode('utf-8')
+
+class ColumnarFeedWriter(object):
+    """Writes a CompiledSchedule to the columnar format.
+
+    Call WriteBlock() with each block of trips (it can be the on_block of
+    schedule_spec.CompileSpec) and Close() with the final schedule. Block
+    columns are spooled to temporary files, so memory stays flat.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._directory = tempfile.mkdtemp(prefix='gtfscol-')
+        self._files = {}
+        self._types = {}
+        self._counts = {}
+        self._string_sizes = {}
+
+    def _Append(self, name, column_type, values):
+        if name not in self._files:
+            self._files[name] = open(os.path.join(self._directory, name), 'wb')
+            self._types[name] = column_type
+            self._counts[name] = 0
+        if not isinstance(values, array) or values.typecode != TYPECODES[column_type]:
+            values = array(TYPECODES[column_type], values)
+        self._files[name].write(_Bytes(values))
+        self._counts[name] += len(values)
+
+    def _AppendStrings(self, name, strings):
+        encoded = [_Utf8(string) for string in strings]
+        size = self._string_sizes.get(name)
+        if size is None:
+            size = 0
+            self._Append(name + '.offsets', 'i4', [0])
+        offsets = []
+        for value in encoded:
+            size += len(value)
+            offsets.append(size)
+        self._string_sizes[name] = size
+        self._Append(name + '.offsets', 'i4', offsets)
+        self._Append(name + '.data', 'u1', array('B', b''.join(encoded)))
+
+    def WriteBlock(self, compiled):
+        "Append the trips and stop times currently held by `compiled`."
+        base = self._counts.get('stop_times.stop', 0)
+        trip_base = self._counts.get('trips.route', 0)
+        if 'trips.stop_times' not in self._files:
+            self._Append('trips.stop_times', 'i4', [0])
+        self._AppendStrings('trips.id', compiled.trip_ids)
+        self._Append('trips.route', 'i4', compiled.trip_route)
+        self._Append('trips.service', 'i4', compiled.trip_service)
+        self._Append('trips.headsign', 'i4', compiled.trip_headsign)
+        self._Append('trips.stop_times', 'i4', [base + offset for offset in compiled.trip_offsets[1:]])
+        self._Append('stop_times.stop', 'i4', compiled.st_stop)
+        self._Append('stop_times.time', 'i4', compiled.st_time)
+        self._Append('stop_times.pickup', 'u1', compiled.st_pickup)
+        self._Append('stop_times.drop_off', 'u1', compiled.st_drop_off)
+        self._Append('frequencies.trip', 'i4', [trip_base + trip for trip in compiled.freq_trip])
+        self._Append('frequencies.start', 'i4', compiled.freq_start)
+        self._Append('frequencies.end', 'i4', compiled.freq_end)
+        self._Append('frequencies.headway', 'i4', compiled.freq_headway)
+
+    def Close(self, compiled):
+        "Write the stops, routes and calendar of `compiled` and assemble the file."
+        try:
+            self._AppendStrings('stops.name', [stop['name'] for stop in compiled.stops])
+            self._AppendStrings('stops.key', [stop['id'] for stop in compiled.stops])
+            self._Append('stops.lat', 'f8', [float(stop['lat']) for stop in compiled.stops])
+            self._Append('stops.lon', 'f8', [float(stop['lng']) for stop in compiled.stops])
+            self._AppendStrings('routes.short_name',
+                                [route.get('short_name', '') for route in compiled.routes])
+            self._AppendStrings('routes.long_name',
+                                [route.get('long_name', '') for route in compiled.routes])
+            self._Append('routes.type', 'i4', [
+                int(feed_writer.ROUTE_TYPES.get(route['route_type'], route['route_type']))
+                for route in compiled.routes])
+            self._AppendStrings('service_periods.key', [period['id'] for period in compiled.service_periods])
+            dates = [(i, int(date)) for i, period in enumerate(compiled.service_periods)
+                     for date in period['dates']]
+            self._Append('calendar_dates.service', 'i4', [service for service, _ in dates])
+            self._Append('calendar_dates.date', 'i4', [date for _, date in dates])
+            self._AppendStrings('headsigns', compiled.headsigns)
+            if 'trips.stop_times' not in self._files:
+                # No trips at all; write empty trip and stop time columns.
+                self.WriteBlock(compiled)
+            for column_file in self._files.values():
+                column_file.close()
+            self._Assemble(compiled.agency)
+        finally:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+    def _Assemble(self, agency):
+        names = sorted(self._files)
+        # The header holds the column offsets, which depend on the header
+        # size; grow the reserved size until the header fits, then pad it.
+        header_size, header = 0, None
+        while header is None or len(header) > header_size:
+            header_size = len(header or b'') + 64
+            columns = {}
+            offset = len(MAGIC) + 4 + header_size
+            for name in names:
+                offset = (offset + 7) // 8 * 8
+                columns[name] = [self._types[name], offset, self._counts[name]]
+                offset += self._counts[name] * ITEM_SIZES[self._types[name]]
+            header = json.dumps({'agency': agency, 'columns': columns}, sort_keys=True).encode('utf-8')
+        header += b' ' * (header_size - len(header))
+        with open(self.path, 'wb') as out:
+            out.write(MAGIC)
+            out.write(struct.pack('<I', header_size))
+            out.write(header)
+            for name in names:
+                _, column_offset, _ = columns[name]
+                out.write(b'\0' * (column_offset - out.tell()))
+                with open(os.path.join(self._directory, name), 'rb') as column_file:
+                    shutil.copyfileobj(column_file, out)
+
+class StringColumn(object):
+    "A read-only sequence of strings stored as offsets and UTF-8 data."
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+class ColumnarFeed(object):
+    "A memory-mapped columnar feed; columns are looked up with Column(name)."
+
+    def __init__(self, path):
+        self.path = path
+        self._file = io.open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not a columnar feed' % path)
+        (header_size,) = struct.unpack('<I', self._map[len(MAGIC):len(MAGIC) + 4])
+        start = len(MAGIC) + 4
+        header = json.loads(self._map[start:start + header_size].decode('utf-8'))
+        self.agency = header['agency']
+        self.columns = header['columns']
+        self._view = memoryview(self._map) if hasattr(memoryview, 'cast') else None
+        self._cache = {}
+
+    def _Array(self, name):
+        column_type, offset, count = self.columns[name]
+        end = offset + count * ITEM_SIZES[column_type]
+        if self._view is not None and not _SWAP:
+            return self._view[offset:end].cast(TYPECODES[column_type])
+        values = array(TYPECODES[column_type])
+        data = self._map[offset:end]
+        if hasattr(values, 'frombytes'):
+            values.frombytes(data)
+        else:
+            values.fromstring(data)
+        if _SWAP:
+            values.byteswap()
+        return values
+
+    def Column(self, name):
+        "Return the column `name`: a memoryview/array of numbers, or a StringColumn."
+        column = self._cache.get(name)
+        if column is None:
+            if name in self.columns:
+                column = self._Array(name)
+            else:
+                data = self._Array(name + '.data')
+                if isinstance(data, array):
+                    data = _Bytes(data)
+                column = StringColumn(self._Array(name + '.offsets'), data)
+            self._cache[name] = column
+        return column
+
+    def NumTrips(self):
+        return self.columns['trips.route'][2]
+
+    def NumStopTimes(self):
+        return self.columns['stop_times.stop'][2]
+
+    def StopTimes(self, trip):
+        "Return the (stop, time, pickup, drop_off) rows of `trip`."
+        offsets = self.Column('trips.stop_times')
+        begin, end = offsets[trip], offsets[trip + 1]
+        return list(zip(self.Column('stop_times.stop')[begin:end],
+                        self.Column('stop_times.time')[begin:end],
+                        self.Column('stop_times.pickup')[begin:end],
+                        self.Column('stop_times.drop_off')[begin:end]))
+
+    def Close(self):
+        """Close the file and unmap it.
+
+        Columns returned by Column(), and slices of them, are views of the
+        map: while the caller still holds any, the map cannot be closed and
+        is left for the garbage collector to unmap once the last one goes.
+        """
+        self._cache = {}
+        if self._view is not None:
+            self._view.release()
+        mapped, self._map = self._map, None
+        try:
+            mapped.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
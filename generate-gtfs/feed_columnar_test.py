@@ -0,0 +1,112 @@
+# coding=UTF8
+"""Tests of feed_columnar: the columnar feed read back against the CSV feed."""
+
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+
+import feed_columnar
+import feed_reader
+import feed_writer
+import gtfs_time
+import schedule_spec
+
+SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'io2017.json')
+
+class ColumnarFeedTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp(prefix='feed-columnar-test-')
+        cls.zip_path = os.path.join(cls.directory, 'feed.zip')
+        cls.columnar_path = os.path.join(cls.directory, 'feed.col')
+        columnar = feed_columnar.ColumnarFeedWriter(cls.columnar_path)
+        with feed_writer.FeedWriter(cls.zip_path) as writer:
+            def WriteBlock(block):
+                feed_writer.WriteTrips(writer, block)
+                columnar.WriteBlock(block)
+            # Frequencies, so that the frequencies.* columns are not empty.
+            compiled = schedule_spec.CompileSpec(schedule_spec.LoadSpec(SPEC),
+                                                 on_block=WriteBlock, frequencies=True)
+            feed_writer.WriteMetadata(writer, compiled)
+        columnar.Close(compiled)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        self.feed = feed_columnar.ColumnarFeed(self.columnar_path)
+        self.csv = feed_reader.Feed(self.zip_path)
+
+    def tearDown(self):
+        self.feed.Close()
+        self.csv.Close()
+
+    def testStops(self):
+        stops = list(self.csv.ReadDicts('stops.txt'))
+        self.assertEqual([int(stop['stop_id']) for stop in stops], list(range(len(stops))))
+        self.assertEqual(list(self.feed.Column('stops.name')),
+                         [stop['stop_name'] for stop in stops])
+        self.assertEqual(list(self.feed.Column('stops.lat')),
+                         [float(stop['stop_lat']) for stop in stops])
+        self.assertEqual(list(self.feed.Column('stops.lon')),
+                         [float(stop['stop_lon']) for stop in stops])
+
+    def testTrips(self):
+        trips = list(self.csv.ReadDicts('trips.txt'))
+        self.assertEqual(self.feed.NumTrips(), len(trips))
+        headsigns = self.feed.Column('headsigns')
+        self.assertEqual(
+            [(trip_id, route, service, headsigns[headsign])
+             for trip_id, route, service, headsign in zip(
+                 self.feed.Column('trips.id'), self.feed.Column('trips.route'),
+                 self.feed.Column('trips.service'), self.feed.Column('trips.headsign'))],
+            [(trip['trip_id'], int(trip['route_id']), int(trip['service_id']),
+              trip['trip_headsign']) for trip in trips])
+
+    def testStopTimes(self):
+        stop_times = collections.defaultdict(list)
+        for row in self.csv.ReadDicts('stop_times.txt'):
+            stop_times[row['trip_id']].append((
+                int(row['stop_sequence']), int(row['stop_id']),
+                gtfs_time.ParseTime(row['arrival_time']), int(row['pickup_type'] or 0),
+                int(row['drop_off_type'] or 0)))
+        trip_ids = self.feed.Column('trips.id')
+        self.assertEqual(self.feed.NumStopTimes(), sum(len(rows) for rows in stop_times.values()))
+        for trip in range(self.feed.NumTrips()):
+            self.assertEqual([tuple(row) for row in self.feed.StopTimes(trip)],
+                             [row[1:] for row in sorted(stop_times[trip_ids[trip]])])
+
+    def testFrequencies(self):
+        trip_ids = self.feed.Column('trips.id')
+        columns = [self.feed.Column('frequencies.' + name)
+                   for name in ('trip', 'start', 'end', 'headway')]
+        self.assertTrue(len(columns[0]))
+        self.assertEqual(
+            sorted((trip_ids[trip], start, end, headway)
+                   for trip, start, end, headway in zip(*columns)),
+            sorted((row['trip_id'], gtfs_time.ParseTime(row['start_time']),
+                    gtfs_time.ParseTime(row['end_time']), int(row['headway_secs']))
+                   for row in self.csv.ReadDicts('frequencies.txt')))
+
+    def testCalendar(self):
+        self.assertEqual(
+            sorted(zip(self.feed.Column('calendar_dates.service'),
+                       self.feed.Column('calendar_dates.date'))),
+            sorted((int(row['service_id']), int(row['date']))
+                   for row in self.csv.ReadDicts('calendar_dates.txt')))
+
+    def testCloseWithColumnsHeld(self):
+        feed = feed_columnar.ColumnarFeed(self.columnar_path)
+        times = feed.Column('stop_times.time')
+        first_times = times[:3]
+        trip_ids = feed.Column('trips.id')
+        expected = ([times[i] for i in range(3)], trip_ids[0])
+        feed.Close()
+        self.assertEqual(([first_times[i] for i in range(3)], trip_ids[0]), expected)
+
+if __name__ == '__main__':
+    unittest.main()
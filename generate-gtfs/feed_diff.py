@@ -0,0 +1,191 @@
+# coding=UTF8
+"""Minimal deltas between two GTFS feeds.
+
+Tables are compared row by row on their primary keys. A delta lists, per
+table, the rows inserted, the rows updated (whole new rows) and the keys
+deleted, and can be applied to a feed directory to bring it from the old
+feed to the new one without rewriting unchanged data. Combined with stable
+trip ids (see schedule_spec.TripId), regenerating a schedule after a small
+edit produces a delta of only the rows that really changed.
+
+A delta is a JSON document:
+
+  {"version": 1,
+   "tables": {"trips.txt": {"columns": [...], "key": [...],
+                            "insert": [row, ...], "update": [row, ...],
+                            "delete": [key, ...]},
+              "shapes.txt": {"remove": true}}}
+"""
+
+import collections
+import io
+import json
+import os
+
+import feed_reader
+import feed_writer
+
+DELTA_VERSION = 1
+
+# Primary key columns of the GTFS tables; other tables are keyed on the
+# whole row.
+PRIMARY_KEYS = {
+    'agency.txt': ('agency_id',),
+    'stops.txt': ('stop_id',),
+    'routes.txt': ('route_id',),
+    'trips.txt': ('trip_id',),
+    'stop_times.txt': ('trip_id', 'stop_sequence'),
+    'calendar.txt': ('service_id',),
+    'calendar_dates.txt': ('service_id', 'date'),
+    'frequencies.txt': ('trip_id', 'start_time'),
+    'shapes.txt': ('shape_id', 'shape_pt_sequence'),
+    'fare_attributes.txt': ('fare_id',),
+    'transfers.txt': ('from_stop_id', 'to_stop_id'),
+}
+
+class DeltaError(ValueError):
+    "Raised when a delta cannot be applied."
+
+def _KeyColumns(table, columns):
+    key = PRIMARY_KEYS.get(table)
+    if key is None or not set(key) <= set(columns):
+        return tuple(columns)
+    return key
+
+def _Project(columns, target):
+    "Return a function mapping rows with `columns` onto the `target` columns."
+    if list(columns) == list(target):
+        return tuple
+    positions = dict((column, i) for i, column in enumerate(columns))
+    indexes = [positions.get(column) for column in target]
+    return lambda row: tuple(row[i] if i is not None else '' for i in indexes)
+
+def _Keyer(columns, key):
+    positions = [list(columns).index(column) for column in key]
+    return lambda row: tuple(row[i] for i in positions)
+
+def LoadTable(feed, table, columns=None):
+    """Return (columns, OrderedDict of key -> row) for `table` of `feed`.
+
+    Rows are projected onto `columns` if given.
+    """
+    file_columns, rows = feed.Read(table)
+    columns = list(columns or file_columns)
+    project = _Project(file_columns, columns)
+    keyer = _Keyer(columns, _KeyColumns(table, columns))
+    keyed = collections.OrderedDict()
+    for row in rows:
+        row = project(row)
+        keyed[keyer(row)] = row
+    return columns, keyed
+
+def DiffTable(table, old_feed, new_feed):
+    "Return the delta of one table present in `new_feed`."
+    columns, new_rows = LoadTable(new_feed, table)
+    key = _KeyColumns(table, columns)
+    delta = {'columns': columns, 'key': list(key), 'insert': [], 'update': [], 'delete': []}
+    if old_feed.Has(table):
+        _, old_rows = LoadTable(old_feed, table, columns)
+    else:
+        old_rows = {}
+    for row_key, row in new_rows.items():
+        old_row = old_rows.pop(row_key, None)
+        if old_row is None:
+            delta['insert'].append(list(row))
+        elif old_row != row:
+            delta['update'].append(list(row))
+    delta['delete'] = [list(row_key) for row_key in old_rows]
+    return delta
+
+def DiffFeeds(old_path, new_path):
+    "Return the delta that turns the feed at `old_path` into the one at `new_path`."
+    with feed_reader.Feed(old_path) as old_feed, feed_reader.Feed(new_path) as new_feed:
+        tables = collections.OrderedDict()
+        for table in new_feed.tables:
+            delta = DiffTable(table, old_feed, new_feed)
+            if delta['insert'] or delta['update'] or delta['delete'] or not old_feed.Has(table):
+                tables[table] = delta
+        for table in old_feed.tables:
+            if not new_feed.Has(table):
+                tables[table] = {'remove': True}
+    return {'version': DELTA_VERSION, 'tables': tables}
+
+def Summary(delta):
+    "Return one 'table: +inserted ~updated -deleted' line per table."
+    lines = []
+    for table, changes in delta['tables'].items():
+        if changes.get('remove'):
+            lines.append('%s: removed' % table)
+        else:
+            lines.append('%s: +%d ~%d -%d' % (table, len(changes['insert']),
+                                              len(changes['update']), len(changes['delete'])))
+    return lines
+
+# Suffix of the rewritten tables of ApplyDelta() until they replace the originals.
+PENDING_SUFFIX = '.delta'
+
+def _ApplyTable(feed, table, changes):
+    "Return the columns and rows of `table` of `feed` with `changes` applied."
+    columns = changes['columns']
+    if feed.Has(table):
+        _, rows = LoadTable(feed, table, columns)
+    else:
+        rows = collections.OrderedDict()
+    keyer = _Keyer(columns, changes['key'])
+    for row_key in changes['delete']:
+        if rows.pop(tuple(row_key), None) is None:
+            raise DeltaError('%s: cannot delete missing row %r' % (table, row_key))
+    for row in changes['update']:
+        row_key = keyer(row)
+        if row_key not in rows:
+            raise DeltaError('%s: cannot update missing row %r' % (table, row_key))
+        rows[row_key] = row
+    for row in changes['insert']:
+        row_key = keyer(row)
+        if row_key in rows:
+            raise DeltaError('%s: cannot insert existing row %r' % (table, row_key))
+        rows[row_key] = row
+    return columns, rows.values()
+
+def ApplyDelta(delta, directory):
+    """Apply `delta` to the feed in `directory`, rewriting only the tables it changes.
+
+    Every changed table is written next to its original first, and they
+    only replace the originals once the whole delta has applied, so a
+    DeltaError leaves the directory as it was.
+    """
+    if delta.get('version') != DELTA_VERSION:
+        raise DeltaError('Unsupported delta version %r' % delta.get('version'))
+    pending = []
+    try:
+        with feed_reader.Feed(directory) as feed:
+            for table, changes in delta['tables'].items():
+                filename = os.path.join(directory, table)
+                if changes.get('remove'):
+                    if feed.Has(table):
+                        pending.append((None, filename))
+                    continue
+                columns, rows = _ApplyTable(feed, table, changes)
+                feed_writer.WriteTable(filename + PENDING_SUFFIX, columns, rows)
+                pending.append((filename + PENDING_SUFFIX, filename))
+    except BaseException:
+        for written, _ in pending:
+            if written is not None:
+                os.remove(written)
+        raise
+    for written, filename in pending:
+        if written is None:
+            os.remove(filename)
+        else:
+            os.rename(written, filename)
+
+def WriteDelta(delta, path):
+    text = json.dumps(delta, ensure_ascii=False, separators=(',', ':'))
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    with io.open(path, 'w', encoding='utf-8') as delta_file:
+        delta_file.write(text)
+
+def ReadDelta(path):
+    with io.open(path, encoding='utf-8') as delta_file:
+        return json.load(delta_file, object_pairs_hook=collections.OrderedDict)
@@ -0,0 +1,96 @@
+# coding=UTF8
+"""Tests of feed_diff: deltas between feed directories and their application."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import feed_diff
+import feed_reader
+import feed_writer
+
+TRIPS = ('route_id', 'service_id', 'trip_id', 'trip_headsign')
+STOP_TIMES = ('trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence')
+
+def _Tables(directory):
+    "Return {table: (columns, sorted rows)} of the feed in `directory`."
+    tables = {}
+    with feed_reader.Feed(directory) as feed:
+        for table in feed.tables:
+            columns, rows = feed.Read(table)
+            tables[table] = (columns, sorted(rows))
+    return tables
+
+class FeedDiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='feed-diff-test-')
+        self.old = os.path.join(self.directory, 'old')
+        self.new = os.path.join(self.directory, 'new')
+        os.mkdir(self.old)
+        os.mkdir(self.new)
+        feed_writer.WriteTable(os.path.join(self.old, 'trips.txt'), TRIPS, [
+            ('lime', 'day1', 'lime_0700', 'To Shoreline'),
+            ('lime', 'day1', 'lime_0800', 'To Shoreline'),
+            ('teal', 'day1', 'teal_0700', 'To Shoreline')])
+        feed_writer.WriteTable(os.path.join(self.old, 'stop_times.txt'), STOP_TIMES, [
+            ('lime_0700', '07:00:00', '07:00:00', 'avatar', '1'),
+            ('lime_0700', '07:30:00', '07:30:00', 'shoreline', '2'),
+            ('lime_0800', '08:00:00', '08:00:00', 'avatar', '1'),
+            ('lime_0800', '08:30:00', '08:30:00', 'shoreline', '2'),
+            ('teal_0700', '07:00:00', '07:00:00', 'aloft', '1'),
+            ('teal_0700', '07:20:00', '07:20:00', 'shoreline', '2')])
+        feed_writer.WriteTable(os.path.join(self.old, 'shapes.txt'),
+                               ('shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence'),
+                               [('0', '37.4', '-122.0', '1')])
+        # lime_0700 moves to 07:05, teal_0700 changes headsign, shapes go
+        # and calendar_dates.txt is new.
+        feed_writer.WriteTable(os.path.join(self.new, 'trips.txt'), TRIPS, [
+            ('lime', 'day1', 'lime_0705', 'To Shoreline'),
+            ('lime', 'day1', 'lime_0800', 'To Shoreline'),
+            ('teal', 'day1', 'teal_0700', 'To Shoreline Amphitheatre')])
+        feed_writer.WriteTable(os.path.join(self.new, 'stop_times.txt'), STOP_TIMES, [
+            ('lime_0705', '07:05:00', '07:05:00', 'avatar', '1'),
+            ('lime_0705', '07:35:00', '07:35:00', 'shoreline', '2'),
+            ('lime_0800', '08:00:00', '08:00:00', 'avatar', '1'),
+            ('lime_0800', '08:30:00', '08:30:00', 'shoreline', '2'),
+            ('teal_0700', '07:00:00', '07:00:00', 'aloft', '1'),
+            ('teal_0700', '07:20:00', '07:20:00', 'shoreline', '2')])
+        feed_writer.WriteTable(os.path.join(self.new, 'calendar_dates.txt'),
+                               ('service_id', 'date', 'exception_type'),
+                               [('day1', '20170517', '1')])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testDiffIsMinimal(self):
+        delta = feed_diff.DiffFeeds(self.old, self.new)
+        self.assertEqual(sorted(feed_diff.Summary(delta)), [
+            'calendar_dates.txt: +1 ~0 -0',
+            'shapes.txt: removed',
+            'stop_times.txt: +2 ~0 -2',
+            'trips.txt: +1 ~1 -1'])
+
+    def testApplyRoundTrip(self):
+        delta_path = os.path.join(self.directory, 'delta.json')
+        feed_diff.WriteDelta(feed_diff.DiffFeeds(self.old, self.new), delta_path)
+        feed_diff.ApplyDelta(feed_diff.ReadDelta(delta_path), self.old)
+        self.assertEqual(_Tables(self.old), _Tables(self.new))
+        self.assertEqual(sorted(os.listdir(self.old)), sorted(os.listdir(self.new)))
+
+    def testFailedApplyChangesNothing(self):
+        delta = feed_diff.DiffFeeds(self.old, self.new)
+        before = _Tables(self.old)
+        # A delete of a missing row fails in the last table applied, after
+        # the others have been rewritten.
+        last = list(delta['tables'])[-1]
+        delta['tables'][last] = {'columns': list(STOP_TIMES), 'key': ['trip_id', 'stop_sequence'],
+                                 'insert': [], 'update': [], 'delete': [['nope', '1']]}
+        self.assertRaises(feed_diff.DeltaError, feed_diff.ApplyDelta, delta, self.old)
+        self.assertEqual(_Tables(self.old), before)
+        self.assertEqual(sorted(os.listdir(self.old)),
+                         ['shapes.txt', 'stop_times.txt', 'trips.txt'])
+
+if __name__ == '__main__':
+    unittest.main()
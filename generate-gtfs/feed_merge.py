@@ -0,0 +1,260 @@
+# coding=UTF8
+"""Merge of existing GTFS feeds into a generated one.
+
+MergeFeed() streams the tables of an external feed (e.g. Caltrain or BART)
+into the writer of the generated feed, row by row and in chunks of
+CHUNK_ROWS, so only the small lookup tables below are held in memory:
+
+  - every id is namespaced as 'prefix:id', so it cannot clash with the
+    numeric ids of the generated feed or with another merged feed;
+  - stops within `stop_meters` of a generated stop are replaced by it, so
+    that trips of both feeds share the stop;
+  - calendar.txt and calendar_dates.txt are clipped to the dates of the
+    generated feed's service periods, and trips (with their stop times,
+    frequencies and shapes) of services left without any day are dropped.
+
+Rows are projected onto the columns of feed_writer.TABLES; other columns
+and tables are not merged. Features() tells which optional columns and
+tables of feed_writer.FEATURE_COLUMNS a feed has, so the output keeps its
+shapes, blocks and stations. The agencies must share the generated feed's
+timezone, as GTFS times are local to a single one.
+"""
+
+import collections
+import datetime
+import itertools
+import os
+import zipfile
+
+import feed_reader
+import feed_writer
+import stop_index
+
+# Rows handed to the writer at a time.
+CHUNK_ROWS = 10000
+
+# Columns holding ids that are namespaced by the feed prefix.
+ID_COLUMNS = {
+    'agency.txt': ('agency_id',),
+    'stops.txt': ('stop_id', 'parent_station'),
+    'routes.txt': ('route_id', 'agency_id'),
+    'trips.txt': ('route_id', 'service_id', 'trip_id', 'shape_id', 'block_id'),
+    'stop_times.txt': ('trip_id', 'stop_id'),
+    'calendar.txt': ('service_id',),
+    'calendar_dates.txt': ('service_id',),
+    'frequencies.txt': ('trip_id',),
+    'shapes.txt': ('shape_id',),
+}
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+class MergeError(ValueError):
+    "Raised when a feed cannot be merged."
+
+def _Date(text):
+    return datetime.datetime.strptime(text.strip(), '%Y%m%d').date()
+
+def _Namespace(prefix, value):
+    value = value.strip()
+    return '%s:%s' % (prefix, value) if value else ''
+
+def _Open(path):
+    "Return the feed_reader.Feed at `path`, or raise MergeError."
+    if not os.path.exists(path):
+        raise MergeError('No feed at %s' % path)
+    try:
+        return feed_reader.Feed(path)
+    except (IOError, zipfile.BadZipfile) as e:
+        raise MergeError('Cannot read feed %s: %s' % (path, e))
+
+def _WriteChunks(writer, table, rows):
+    "Write `rows` CHUNK_ROWS at a time; return how many were written."
+    rows, count = iter(rows), 0
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_ROWS))
+        if not chunk:
+            return count
+        writer.WriteRows(table, chunk)
+        count += len(chunk)
+
+class _Merge(object):
+    "The state of merging one feed: the id maps and the services, trips and shapes kept."
+
+    def __init__(self, feed, prefix, compiled, stop_meters, clip):
+        self.feed = feed
+        self.prefix = prefix
+        self.compiled = compiled
+        self.stop_meters = stop_meters
+        self.window = None
+        if clip:
+            dates = [_Date(date) for period in compiled.service_periods for date in period['dates']]
+            if dates:
+                self.window = (min(dates), max(dates))
+        # External stop id -> generated stop index.
+        self.shared_stops = {}
+        self.dropped_services = set()
+        self.dropped_trips = set()
+        self.used_shapes = set()
+        self.counts = collections.Counter()
+
+    def Rows(self, table):
+        "Iterate over the rows of `table` as dicts with namespaced ids."
+        if not self.feed.Has(table):
+            return
+        id_columns = ID_COLUMNS.get(table, ())
+        for row in self.feed.ReadDicts(table):
+            for column in id_columns:
+                if column in row:
+                    row[column] = _Namespace(self.prefix, row[column])
+            yield row
+
+    def Write(self, writer, table, rows):
+        columns = feed_writer.TABLES[table]
+        self.counts[table] += _WriteChunks(
+            writer, table, (tuple(row.get(column, '') for column in columns) for row in rows))
+
+    def Agencies(self):
+        timezone = self.compiled.agency['timezone']
+        for row in self.Rows('agency.txt'):
+            if row['agency_timezone'].strip() != timezone:
+                raise MergeError('%s: agency %s is in timezone %s, not %s' % (
+                    self.feed.path, row['agency_name'], row['agency_timezone'], timezone))
+            # Single agency feeds may leave agency_id blank.
+            row['agency_id'] = row.get('agency_id') or self.prefix
+            yield row
+
+    def Calendars(self):
+        """Return the calendar and calendar_dates rows clipped to the window,
+        and set the services left without any day."""
+        calendars = list(self.Rows('calendar.txt'))
+        calendar_dates = list(self.Rows('calendar_dates.txt'))
+        if self.window is None:
+            return calendars, calendar_dates
+        first, last = self.window
+        days = collections.defaultdict(set)
+        kept_calendars = []
+        for row in calendars:
+            start, end = max(_Date(row['start_date']), first), min(_Date(row['end_date']), last)
+            if start > end:
+                continue
+            row['start_date'], row['end_date'] = start.strftime('%Y%m%d'), end.strftime('%Y%m%d')
+            kept_calendars.append(row)
+            weekdays = [row[day].strip() == '1' for day in WEEKDAYS]
+            for offset in range((end - start).days + 1):
+                day = start + datetime.timedelta(days=offset)
+                if weekdays[day.weekday()]:
+                    days[row['service_id']].add(day)
+        kept_dates = []
+        for row in calendar_dates:
+            day = _Date(row['date'])
+            if not first <= day <= last:
+                continue
+            kept_dates.append(row)
+            if row['exception_type'].strip() == '1':
+                days[row['service_id']].add(day)
+            else:
+                days[row['service_id']].discard(day)
+        services = set(row['service_id'] for row in calendars + calendar_dates)
+        self.dropped_services = set(service for service in services if not days[service])
+        return ([row for row in kept_calendars if row['service_id'] not in self.dropped_services],
+                [row for row in kept_dates if row['service_id'] not in self.dropped_services])
+
+    def Stops(self):
+        if self.stop_meters > 0:
+            index = stop_index.StopIndexFor(self.compiled.stops, self.stop_meters)
+        for row in self.Rows('stops.txt'):
+            if self.stop_meters > 0 and row.get('location_type', '').strip() in ('', '0'):
+                nearest = index.Nearest(float(row['stop_lat']), float(row['stop_lon']),
+                                        self.stop_meters)
+                if nearest is not None:
+                    self.shared_stops[row['stop_id']] = nearest[0]
+                    self.counts['shared stops'] += 1
+                    continue
+            yield row
+
+    def Routes(self):
+        for row in self.Rows('routes.txt'):
+            row['agency_id'] = row.get('agency_id') or self.prefix
+            yield row
+
+    def Trips(self):
+        for row in self.Rows('trips.txt'):
+            if row['service_id'] in self.dropped_services:
+                self.dropped_trips.add(row['trip_id'])
+                continue
+            if row.get('shape_id'):
+                self.used_shapes.add(row['shape_id'])
+            yield row
+
+    def StopTimes(self):
+        shared_stops, dropped_trips = self.shared_stops, self.dropped_trips
+        for row in self.Rows('stop_times.txt'):
+            if row['trip_id'] in dropped_trips:
+                continue
+            row['stop_id'] = shared_stops.get(row['stop_id'], row['stop_id'])
+            yield row
+
+    def Frequencies(self):
+        return (row for row in self.Rows('frequencies.txt')
+                if row['trip_id'] not in self.dropped_trips)
+
+    def Shapes(self):
+        return (row for row in self.Rows('shapes.txt') if row['shape_id'] in self.used_shapes)
+
+def MergeFeed(writer, path, prefix, compiled, stop_meters=0, clip=True):
+    """Stream the feed zip or directory at `path` into `writer`.
+
+    `compiled` is the CompiledSchedule of the generated feed, for its
+    agency, stops and service dates. Stops closer than `stop_meters` to a
+    generated stop are merged into it, and with `clip` the calendars are
+    clipped to the generated service dates. Returns a Counter of the rows
+    written per table, plus 'shared stops' and 'dropped trips'.
+    """
+    with _Open(path) as feed:
+        merge = _Merge(feed, prefix, compiled, stop_meters, clip)
+        merge.Write(writer, 'agency.txt', merge.Agencies())
+        calendars, calendar_dates = merge.Calendars()
+        merge.Write(writer, 'calendar.txt', calendars)
+        merge.Write(writer, 'calendar_dates.txt', calendar_dates)
+        merge.Write(writer, 'stops.txt', merge.Stops())
+        merge.Write(writer, 'routes.txt', merge.Routes())
+        merge.Write(writer, 'trips.txt', merge.Trips())
+        merge.Write(writer, 'stop_times.txt', merge.StopTimes())
+        merge.Write(writer, 'frequencies.txt', merge.Frequencies())
+        merge.Write(writer, 'shapes.txt', merge.Shapes())
+        merge.counts['dropped trips'] = len(merge.dropped_trips)
+    return merge.counts
+
+def Features(path):
+    """Return the set of feed_writer.FEATURE_COLUMNS features whose columns
+    or tables the feed at `path` has, which the output needs to keep them."""
+    features = set()
+    with _Open(path) as feed:
+        for feature, columns in feed_writer.FEATURE_COLUMNS.items():
+            for table, column in columns:
+                if feed.Has(table) and (column is None or column in feed.Columns(table)):
+                    features.add(feature)
+    return features
+
+def ParseMerge(argument):
+    "Return (prefix, path) for a --merge argument, 'PREFIX=PATH' or a path named after its prefix."
+    if '=' in argument:
+        prefix, path = argument.split('=', 1)
+    else:
+        path = argument
+        prefix = os.path.splitext(os.path.basename(path.rstrip('/\\')))[0]
+    if not prefix or ':' in prefix:
+        raise MergeError('Bad feed prefix %r in %r' % (prefix, argument))
+    return prefix, path
+
+def ParseMerges(arguments):
+    """Return (prefix, path) for every --merge argument; raise MergeError for
+    a prefix used twice or a path that is not a feed zip or directory."""
+    merges = [ParseMerge(argument) for argument in arguments]
+    prefixes = collections.Counter(prefix for prefix, _ in merges)
+    for prefix, path in merges:
+        if prefixes[prefix] > 1:
+            raise MergeError('Feed prefix %r is used more than once; every merged feed needs '
+                             'its own' % prefix)
+        _Open(path).Close()
+    return merges
@@ -0,0 +1,170 @@
+# coding=UTF8
+"""Tests of feed_merge: ids, shared stops, clipped calendars and optional tables of merged feeds."""
+
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+
+import feed_merge
+import feed_pipeline
+import feed_reader
+import feed_writer
+import schedule_spec
+
+SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'io2017.json')
+
+def WriteExternal(directory, timezone='America/Los_Angeles'):
+    """Write a small external feed to `directory`: a weekday route through a
+    stop 30 m from millbraeBart, with a shape, a block and a station, and a
+    summer service outside the generated dates."""
+    os.mkdir(directory)
+    feed_writer.WriteTable(os.path.join(directory, 'agency.txt'),
+                           ('agency_name', 'agency_url', 'agency_timezone'),
+                           [('SamTrans', 'https://www.samtrans.com', timezone)])
+    feed_writer.WriteTable(os.path.join(directory, 'stops.txt'),
+                           ('stop_id', 'stop_name', 'stop_lat', 'stop_lon', 'location_type',
+                            'parent_station'),
+                           [('MLBR', 'Millbrae', '37.600695', '-122.385861', '', ''),
+                            ('SMTC', 'San Mateo Caltrain', '37.568209', '-122.323933', '1', ''),
+                            ('SMTC1', 'San Mateo Caltrain Bay 1', '37.568100', '-122.324000',
+                             '0', 'SMTC')])
+    feed_writer.WriteTable(os.path.join(directory, 'routes.txt'),
+                           ('route_id', 'route_short_name', 'route_type'), [('ECR', 'ECR', '3')])
+    feed_writer.WriteTable(os.path.join(directory, 'calendar.txt'),
+                           ('service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+                            'saturday', 'sunday', 'start_date', 'end_date'),
+                           [('weekday', '1', '1', '1', '1', '1', '0', '0', '20170501',
+                             '20170531'),
+                            ('summer', '1', '1', '1', '1', '1', '1', '1', '20170601',
+                             '20170831')])
+    feed_writer.WriteTable(os.path.join(directory, 'calendar_dates.txt'),
+                           ('service_id', 'date', 'exception_type'),
+                           [('weekday', '20170518', '2'), ('weekday', '20170529', '2')])
+    feed_writer.WriteTable(os.path.join(directory, 'trips.txt'),
+                           ('route_id', 'service_id', 'trip_id', 'shape_id', 'block_id'),
+                           [('ECR', 'weekday', 'ECR1', 'north', 'bus1'),
+                            ('ECR', 'weekday', 'ECR2', 'south', 'bus1'),
+                            ('ECR', 'summer', 'ECR3', 'beach', 'bus2')])
+    stop_times = []
+    for trip_id, stops in (('ECR1', ('SMTC1', 'MLBR')), ('ECR2', ('MLBR', 'SMTC1')),
+                           ('ECR3', ('SMTC1', 'MLBR'))):
+        for sequence, (stop_id, time) in enumerate(zip(stops, ('08:00:00', '08:20:00'))):
+            stop_times.append((trip_id, time, time, stop_id, str(sequence + 1)))
+    feed_writer.WriteTable(os.path.join(directory, 'stop_times.txt'),
+                           ('trip_id', 'arrival_time', 'departure_time', 'stop_id',
+                            'stop_sequence'), stop_times)
+    feed_writer.WriteTable(os.path.join(directory, 'frequencies.txt'),
+                           ('trip_id', 'start_time', 'end_time', 'headway_secs'),
+                           [('ECR1', '08:00:00', '10:00:00', '1800'),
+                            ('ECR3', '08:00:00', '10:00:00', '1800')])
+    feed_writer.WriteTable(os.path.join(directory, 'shapes.txt'),
+                           ('shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence'),
+                           [(shape_id, lat, lon, str(sequence))
+                            for shape_id in ('north', 'south', 'beach')
+                            for sequence, (lat, lon) in enumerate(
+                                (('37.568100', '-122.324000'), ('37.600695', '-122.385861')))])
+
+class FeedMergeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp(prefix='feed-merge-test-')
+        cls.external = os.path.join(cls.directory, 'samtrans')
+        WriteExternal(cls.external)
+        spec = schedule_spec.LoadSpec(SPEC)
+        cls.millbrae = str([stop['id'] for stop in spec['stops']].index('millbraeBart'))
+        cls.merged = cls._Merge(merge_stop_meters=100)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    @classmethod
+    def _Merge(cls, **options):
+        "Return {table: rows as dicts} of the generated feed with the external one merged."
+        path = tempfile.mktemp(suffix='.zip', dir=cls.directory)
+        feed_pipeline.StreamFeed(schedule_spec.LoadSpec(SPEC), path,
+                                 merges=[('sam', cls.external)], **options)
+        with feed_reader.Feed(path) as feed:
+            return dict((table, list(feed.ReadDicts(table))) for table in feed.tables)
+
+    def _Rows(self, table, column, merged=None):
+        "Return the rows of `table` whose `column` has the 'sam:' prefix, by that value."
+        rows = collections.defaultdict(list)
+        for row in (merged or self.merged)[table]:
+            if row.get(column, '').startswith('sam:'):
+                rows[row[column]].append(row)
+        return rows
+
+    def testPrefixes(self):
+        # The feed leaves agency_id blank, so its agency is named by the prefix.
+        self.assertEqual([row['agency_id'] for row in self.merged['agency.txt']], ['1', 'sam'])
+        self.assertEqual(sorted(self._Rows('routes.txt', 'route_id')), ['sam:ECR'])
+        self.assertEqual(self._Rows('routes.txt', 'route_id')['sam:ECR'][0]['agency_id'], 'sam')
+        self.assertEqual(sorted(self._Rows('trips.txt', 'trip_id')), ['sam:ECR1', 'sam:ECR2'])
+        self.assertEqual(sorted(row['service_id'] for row in self._Rows('trips.txt', 'trip_id')
+                                ['sam:ECR1']), ['sam:weekday'])
+        # The generated ids keep no prefix.
+        self.assertTrue(all(':' not in row['trip_id'] for row in self.merged['trips.txt']
+                            if not row['trip_id'].startswith('sam:')))
+
+    def testSharedStops(self):
+        self.assertEqual(sorted(self._Rows('stops.txt', 'stop_id')), ['sam:SMTC', 'sam:SMTC1'])
+        stops = dict((row['stop_sequence'], row['stop_id'])
+                     for row in self._Rows('stop_times.txt', 'trip_id')['sam:ECR1'])
+        self.assertEqual(stops, {'1': 'sam:SMTC1', '2': self.millbrae})
+        # Without a radius no stop is shared.
+        merged = self._Merge()
+        self.assertEqual(sorted(self._Rows('stops.txt', 'stop_id', merged)),
+                         ['sam:MLBR', 'sam:SMTC', 'sam:SMTC1'])
+
+    def testCalendarsClipped(self):
+        (weekday,) = self._Rows('calendar.txt', 'service_id')['sam:weekday']
+        self.assertEqual((weekday['start_date'], weekday['end_date']), ('20170516', '20170519'))
+        self.assertEqual([row['date'] for row in self.merged['calendar_dates.txt']
+                          if row['service_id'] == 'sam:weekday'], ['20170518'])
+        merged = self._Merge(merge_clip=False)
+        self.assertEqual(sorted(self._Rows('calendar.txt', 'service_id', merged)),
+                         ['sam:summer', 'sam:weekday'])
+        self.assertEqual(sorted(self._Rows('trips.txt', 'trip_id', merged)),
+                         ['sam:ECR1', 'sam:ECR2', 'sam:ECR3'])
+
+    def testDroppedTrips(self):
+        self.assertNotIn('sam:summer', self._Rows('calendar.txt', 'service_id'))
+        self.assertNotIn('sam:ECR3', self._Rows('stop_times.txt', 'trip_id'))
+        self.assertEqual(sorted(self._Rows('frequencies.txt', 'trip_id')), ['sam:ECR1'])
+        self.assertEqual(sorted(self._Rows('shapes.txt', 'shape_id')), ['sam:north', 'sam:south'])
+
+    def testOptionalTablesKept(self):
+        # Neither --shapes, --blocks nor --parent-stations is on: the merged
+        # feed alone turns its shapes, blocks and stations on in the output.
+        self.assertEqual(len(self._Rows('shapes.txt', 'shape_id')['sam:north']), 2)
+        trips = self._Rows('trips.txt', 'trip_id')
+        self.assertEqual([(trips[trip_id][0]['shape_id'], trips[trip_id][0]['block_id'])
+                          for trip_id in ('sam:ECR1', 'sam:ECR2')],
+                         [('sam:north', 'sam:bus1'), ('sam:south', 'sam:bus1')])
+        self.assertEqual(self._Rows('stops.txt', 'stop_id')['sam:SMTC1'][0]['parent_station'],
+                         'sam:SMTC')
+        self.assertEqual(feed_merge.Features(self.external), set(['shapes', 'blocks', 'stations']))
+
+    def testErrors(self):
+        self.assertRaises(feed_merge.MergeError, feed_merge.ParseMerges,
+                          ['sam=%s' % self.external, os.path.join(self.directory, 'sam.zip')])
+        self.assertRaises(feed_merge.MergeError, feed_merge.ParseMerges,
+                          [os.path.join(self.directory, 'missing.zip')])
+        not_a_zip = os.path.join(self.directory, 'notes.zip')
+        with open(not_a_zip, 'w') as notes:
+            notes.write('not a feed\n')
+        self.assertRaises(feed_merge.MergeError, feed_merge.ParseMerges, [not_a_zip])
+        self.assertRaises(feed_merge.MergeError, feed_merge.ParseMerge, 'a:b=%s' % self.external)
+        self.assertEqual(feed_merge.ParseMerges([self.external]), [('samtrans', self.external)])
+        eastern = os.path.join(self.directory, 'eastern')
+        WriteExternal(eastern, timezone='America/New_York')
+        self.assertRaises(feed_merge.MergeError, feed_pipeline.StreamFeed,
+                          schedule_spec.LoadSpec(SPEC), os.path.join(self.directory, 'e.zip'),
+                          merges=[('east', eastern)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+# coding=UTF8
+"""The streaming feed generation pipeline of generate-gtfs.py.
+
+StreamFeed() compiles a spec block by block and hands every block to the
+enabled stages (shapes, vehicle blocks, validation, the zip and the other
+outputs) as it is expanded. generate-gtfs.py and bench-gtfs.py both run
+it, so the benchmark measures the same path a build takes.
+"""
+
+import sys
+
+import feed_merge
+import feed_shapes
+import feed_validator
+import feed_writer
+import schedule_spec
+import stop_index
+
+# Default radius of --check-nearby-stops: wide enough to flag a hotel stop
+# and a station stop across the street from each other, such as
+# sheratonPaloAlto and paloAltoCaltrain, 182 m apart.
+NEARBY_STOP_METERS = 200.0
+
+def StreamFeed(spec, output, writers=(), cache=None, columnar=None, jobs=1, frequencies=False,
+               shapes=None, model=None, nearby_stops=0, parent_stations=0, merges=(),
+               merge_stop_meters=0, merge_clip=True, departures=None, blocks=None,
+               positions=None, calendar_patterns=False):
+    """Write the feed for `spec` to the zip `output`, one block of trips at a time.
+
+    `writers` take the same rows as the zip, e.g. a feed_sqlite.
+    SqliteFeedWriter. `columnar`, a feed_columnar.ColumnarFeedWriter,
+    receives the blocks as columns rather than rows, and `departures`, a
+    departure_index.DepartureIndexWriter, their departures. `shapes`, if not
+    None, are the polylines of feed_shapes.LoadPolylines() to draw the trip
+    shapes along, and `model` the travel_times.TravelTimeModel to use. Stops
+    closer than `nearby_stops` meters are reported, and stops closer than
+    `parent_stations` meters are grouped into stations. `merges` are the
+    (prefix, path) of existing feeds to merge into the output with
+    feed_merge.MergeFeed(). `blocks`, a vehicle_blocks.BlockBuilder, chains
+    the trips into vehicle blocks, and `positions`, a trip_positions.
+    TripPositionWriter, samples their positions along their shapes.
+    `calendar_patterns` is passed on to feed_writer.WriteMetadata(). The
+    zip only has the optional columns of the stages that run and of the
+    merged feeds.
+    Returns the FeedValidator that checked each block as it was written.
+    """
+    validator = feed_validator.FeedValidator(nearby_stop_meters=nearby_stops)
+    shape_builder = feed_shapes.ShapeBuilder(shapes) if shapes is not None else None
+    if positions is not None:
+        positions.shapes = shape_builder
+    features = set(feature for feature, used in (('shapes', shape_builder is not None),
+                                                 ('blocks', blocks is not None),
+                                                 ('stations', parent_stations > 0))
+                   if used)
+    for _, path in merges:
+        features.update(feed_merge.Features(path))
+    writers = [feed_writer.FeedWriter(output, feed_writer.Tables(features))] + list(writers)
+    def WriteBlock(block):
+        if shape_builder is not None:
+            shape_builder.AddBlock(block)
+        if blocks is not None:
+            blocks.AddBlock(block)
+        validator.ValidateBlock(block)
+        feed_writer.WriteTrips(writer, block)
+        if columnar is not None:
+            columnar.WriteBlock(block)
+        if departures is not None:
+            departures.WriteBlock(block)
+        if positions is not None:
+            positions.WriteBlock(block)
+    with feed_writer.MultiWriter(writers) as writer:
+        compiled = schedule_spec.CompileSpec(spec, on_block=WriteBlock, cache=cache, jobs=jobs,
+                                             check_shard=feed_validator.CheckShard,
+                                             frequencies=frequencies, travel_times=model)
+        stations = ()
+        if parent_stations:
+            stations = stop_index.ParentStations(compiled.stops, parent_stations)
+        feed_writer.WriteMetadata(writer, compiled, stations, calendar_patterns)
+        if shape_builder is not None:
+            feed_shapes.WriteShapes(writer, shape_builder)
+        for prefix, path in merges:
+            counts = feed_merge.MergeFeed(writer, path, prefix, compiled, merge_stop_meters,
+                                          merge_clip)
+            sys.stderr.write('Merged %s as %s: %d stops (%d shared), %d trips (%d dropped), '
+                             '%d stop times, %d shape points\n' % (
+                                 path, prefix, counts['stops.txt'], counts['shared stops'],
+                                 counts['trips.txt'], counts['dropped trips'],
+                                 counts['stop_times.txt'], counts['shapes.txt']))
+    if columnar is not None:
+        columnar.Close(compiled)
+    if departures is not None:
+        departures.Close(compiled)
+    if positions is not None:
+        positions.Close(compiled)
+    if blocks is not None:
+        for line in blocks.Report(compiled):
+            sys.stderr.write('Vehicles: %s\n' % line)
+    validator.Finish(compiled)
+    return validator
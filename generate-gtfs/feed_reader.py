@@ -0,0 +1,101 @@
+# coding=UTF8
+"""Streaming access to the tables of a GTFS feed.
+
+A feed is either a zip file or a directory of .txt files. Tables are read
+one CSV row at a time, so even a large stop_times.txt is never held in
+memory unless the caller collects it.
+"""
+
+import csv
+import io
+import os
+import sys
+import zipfile
+
+PY2 = sys.version_info[0] == 2
+
+def _Header(reader):
+    "Return the column names of the header row of the csv `reader`, or []."
+    try:
+        columns = next(reader)
+    except StopIteration:
+        return []
+    if PY2:
+        columns = [column.decode('utf-8-sig') for column in columns]
+    return [column.strip() for column in columns]
+
+class Feed(object):
+    "The tables of a feed zip or directory."
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.isdir(path):
+            self._zip = None
+            names = os.listdir(path)
+        else:
+            self._zip = zipfile.ZipFile(path)
+            names = [os.path.basename(name) for name in self._zip.namelist()]
+            self._members = dict((os.path.basename(name), name) for name in self._zip.namelist())
+        self.tables = sorted(name for name in names if name.endswith('.txt'))
+
+    def Has(self, table):
+        return table in self.tables
+
+    def _Open(self, table):
+        if self._zip is None:
+            raw = io.open(os.path.join(self.path, table), 'rb')
+        else:
+            raw = self._zip.open(self._members[table])
+        if PY2:
+            return raw
+        return io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+
+    def Read(self, table):
+        """Return (columns, rows) for `table`; rows is an iterator of lists.
+
+        Values are text, with short rows padded with '' to the header width.
+        """
+        table_file = self._Open(table)
+        reader = csv.reader(table_file)
+        columns = _Header(reader)
+        if not columns:
+            table_file.close()
+            return [], iter(())
+        return columns, self._Rows(table_file, reader, len(columns))
+
+    def Columns(self, table):
+        "Return the column names of `table`, without reading its rows."
+        table_file = self._Open(table)
+        try:
+            return _Header(csv.reader(table_file))
+        finally:
+            table_file.close()
+
+    def _Rows(self, table_file, reader, width):
+        try:
+            for row in reader:
+                if not row:
+                    continue
+                if PY2:
+                    row = [value.decode('utf-8') for value in row]
+                if len(row) < width:
+                    row += [''] * (width - len(row))
+                yield row
+        finally:
+            table_file.close()
+
+    def ReadDicts(self, table):
+        "Iterate over the rows of `table` as dicts keyed by column name."
+        columns, rows = self.Read(table)
+        for row in rows:
+            yield dict(zip(columns, row))
+
+    def Close(self):
+        if self._zip is not None:
+            self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
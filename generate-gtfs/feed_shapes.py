@@ -0,0 +1,196 @@
+# coding=UTF8
+"""Trip shapes and shape_dist_traveled.
+
+Every distinct (route, stop sequence) of a compiled schedule gets a shape.
+If the polyline file has a path for the route and the stops lie along it in
+order (in either direction), the shape is the part of that path between the
+first and last stop. Otherwise the shape is the straight line through the
+stops. Identical shapes are written once and shared by their trips.
+
+The polyline file is JSON mapping route ids (as in the spec) to either an
+encoded polyline string, as returned by the Directions API, or a list of
+[lat, lng] pairs.
+
+Distances are in meters along the shape, computed with the haversine
+formula over whole point lists at a time.
+"""
+
+import io
+import json
+import math
+from array import array
+
+EARTH_RADIUS_METERS = 6371008.8
+
+# How far a stop may be from a route's path for the path to be used.
+MAX_STOP_DISTANCE_METERS = 200.0
+
+def DecodePolyline(encoded):
+    "Decode a Google encoded polyline into a list of (lat, lng)."
+    points, index, lat, lng = [], 0, 0, 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift, result = 0, 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / 1e5, lng / 1e5))
+    return points
+
+def LoadPolylines(path):
+    "Return {route id: [(lat, lng), ...]} from the polyline file at `path`."
+    with io.open(path, encoding='utf-8') as polyline_file:
+        paths = json.load(polyline_file)
+    polylines = {}
+    for route, path in paths.items():
+        if isinstance(path, list):
+            polylines[route] = [(float(lat), float(lng)) for lat, lng in path]
+        else:
+            polylines[route] = DecodePolyline(path)
+    return polylines
+
+def Haversine(lats1, lngs1, lats2, lngs2):
+    "Return the distances in meters between the points of four parallel coordinate lists."
+    radians, sin, cos, asin, sqrt = math.radians, math.sin, math.cos, math.asin, math.sqrt
+    distances = []
+    for lat1, lng1, lat2, lng2 in zip(lats1, lngs1, lats2, lngs2):
+        lat1, lat2 = radians(lat1), radians(lat2)
+        half_dlat = (lat2 - lat1) / 2
+        half_dlng = radians(lng2 - lng1) / 2
+        a = sin(half_dlat) ** 2 + cos(lat1) * cos(lat2) * sin(half_dlng) ** 2
+        distances.append(2 * EARTH_RADIUS_METERS * asin(min(1.0, sqrt(a))))
+    return distances
+
+def Cumulative(points):
+    "Return the distance along `points` at each of them, starting at 0."
+    lats = [lat for lat, _ in points]
+    lngs = [lng for _, lng in points]
+    total, distances = 0.0, [0.0]
+    for step in Haversine(lats[:-1], lngs[:-1], lats[1:], lngs[1:]):
+        total += step
+        distances.append(total)
+    return distances
+
+def _Project(point, start, end):
+    "Return the fraction along the segment start-end closest to `point`."
+    scale = math.cos(math.radians(point[0]))
+    dx, dy = (end[1] - start[1]) * scale, end[0] - start[0]
+    length = dx * dx + dy * dy
+    if length == 0:
+        return 0.0
+    fraction = ((point[1] - start[1]) * scale * dx + (point[0] - start[0]) * dy) / length
+    return min(1.0, max(0.0, fraction))
+
+def _Interpolate(start, end, fraction):
+    return (start[0] + (end[0] - start[0]) * fraction, start[1] + (end[1] - start[1]) * fraction)
+
+def _Along(path, distances, stops):
+    """Match `stops` to positions along `path`, in order.
+
+    Returns a list of (segment, point, distance along the path) per stop,
+    or None if a stop is too far from the rest of the path.
+    """
+    matches, first_segment = [], 0
+    for stop in stops:
+        best = None
+        for segment in range(first_segment, len(path) - 1):
+            point = _Interpolate(path[segment], path[segment + 1],
+                                 _Project(stop, path[segment], path[segment + 1]))
+            (offset,) = Haversine([stop[0]], [stop[1]], [point[0]], [point[1]])
+            if best is None or offset < best[0]:
+                best = (offset, segment, point)
+        if best is None or best[0] > MAX_STOP_DISTANCE_METERS:
+            return None
+        _, segment, point = best
+        (into,) = Haversine([path[segment][0]], [path[segment][1]], [point[0]], [point[1]])
+        distance = distances[segment] + into
+        if matches and distance < matches[-1][2]:
+            return None
+        matches.append((segment, point, distance))
+        first_segment = segment
+    return matches
+
+def ShapeAlongPath(path, stops):
+    """Return (shape points, stop distances) for `stops` following `path`.
+
+    Returns None if the stops do not lie along `path` in either direction.
+    """
+    for candidate in (path, path[::-1]):
+        distances = Cumulative(candidate)
+        matches = _Along(candidate, distances, stops)
+        if matches is None:
+            continue
+        (first_segment, first_point, start), (last_segment, last_point, _) = matches[0], matches[-1]
+        points = [first_point] + candidate[first_segment + 1:last_segment + 1] + [last_point]
+        return points, [distance - start for _, _, distance in matches]
+    return None
+
+class ShapeBuilder(object):
+    """Assigns shapes to the trips of a CompiledSchedule, block by block.
+
+    AddBlock() fills the `trip_shape` and `st_dist` columns of the rows
+    held; Shapes() returns the distinct shapes seen so far.
+    """
+
+    def __init__(self, polylines=None):
+        self.polylines = polylines or {}
+        # (route, stop sequence) -> (shape, stop distances)
+        self._patterns = {}
+        # shape points -> shape index
+        self._shape_index = {}
+        self.shapes = []
+
+    def _Pattern(self, compiled, route, stops):
+        key = (route, stops)
+        pattern = self._patterns.get(key)
+        if pattern is None:
+            coordinates = [(float(compiled.stops[stop]['lat']), float(compiled.stops[stop]['lng']))
+                           for stop in stops]
+            path = self.polylines.get(compiled.routes[route]['id'])
+            shaped = ShapeAlongPath(path, coordinates) if path and len(path) > 1 else None
+            if shaped is None:
+                points = coordinates
+                stop_distances = Cumulative(points)
+            else:
+                points, stop_distances = shaped
+            rounded = [(round(lat, 6), round(lng, 6)) for lat, lng in points]
+            # Stops on a vertex of the path would repeat it.
+            points = tuple(point for i, point in enumerate(rounded)
+                           if i == 0 or point != rounded[i - 1])
+            shape = self._shape_index.get(points)
+            if shape is None:
+                shape = self._shape_index[points] = len(self.shapes)
+                self.shapes.append(points)
+            pattern = self._patterns[key] = (shape, stop_distances)
+        return pattern
+
+    def AddBlock(self, compiled):
+        "Set `trip_shape` and `st_dist` for the trips currently held by `compiled`."
+        compiled.trip_shape = array('i')
+        compiled.st_dist = array('d')
+        offsets = compiled.trip_offsets
+        for trip in range(compiled.NumTrips()):
+            stops = tuple(compiled.st_stop[offsets[trip]:offsets[trip + 1]])
+            shape, stop_distances = self._Pattern(compiled, compiled.trip_route[trip], stops)
+            compiled.trip_shape.append(shape)
+            compiled.st_dist.extend(stop_distances)
+
+    def Shapes(self):
+        "Yield (shape index, points, distances) for every shape."
+        for shape, points in enumerate(self.shapes):
+            yield shape, points, Cumulative(points)
+
+def WriteShapes(writer, builder):
+    "Write shapes.txt for the shapes assigned by a ShapeBuilder."
+    for shape, points, distances in builder.Shapes():
+        writer.WriteRows('shapes.txt', (
+            (shape, repr(lat), repr(lng), sequence + 1, '%.1f' % distance)
+            for sequence, ((lat, lng), distance) in enumerate(zip(points, distances))))
@@ -0,0 +1,93 @@
+# coding=UTF8
+"""Precompiled SQLite feed artifact.
+
+SqliteFeedWriter takes the same rows as feed_writer.FeedWriter and stores
+them in a SQLite database laid out like the one backend/gtfs.js builds in
+memory from the CSV files, plus the indexes its queries need. The backend
+can then open the file directly instead of parsing and inserting every row
+on startup.
+"""
+
+import os
+import sqlite3
+
+import feed_writer
+
+# Tables and column types as created by backend/gtfs.js.
+BACKEND_SCHEMA = {
+    'agency': [('agency_id', 'TEXT'), ('agency_name', 'TEXT'), ('agency_url', 'TEXT'),
+               ('agency_timezone', 'TEXT'), ('agency_lang', 'TEXT')],
+    'calendar_dates': [('service_id', 'TEXT'), ('date', 'INTEGER'), ('exception_type', 'INTEGER')],
+    'routes': [('route_type', 'INTEGER'), ('route_id', 'INTEGER'), ('route_short_name', 'TEXT'),
+               ('route_long_name', 'TEXT'), ('agency_id', 'TEXT'), ('route_color', 'TEXT'),
+               ('route_text_color', 'TEXT')],
+    'stop_times': [('trip_id', 'TEXT'), ('arrival_time', 'TEXT'), ('departure_time', 'TEXT'),
+                   ('stop_id', 'INTEGER'), ('stop_sequence', 'INTEGER'), ('stop_headsign', 'TEXT'),
+                   ('pickup_type', 'INTEGER'), ('drop_off_type', 'INTEGER'),
+                   ('shape_dist_traveled', 'TEXT')],
+    'stops': [('stop_lat', 'REAL'), ('stop_lon', 'REAL'), ('stop_name', 'TEXT'),
+              ('stop_id', 'INTEGER'), ('location_type', 'INTEGER')],
+    'trips': [('route_id', 'INTEGER'), ('trip_id', 'TEXT'), ('trip_headsign', 'TEXT'),
+              ('service_id', 'TEXT')],
+}
+
+INDEXES = [
+    ('stop_times_trip', 'stop_times', ('trip_id', 'stop_sequence')),
+    ('stop_times_stop', 'stop_times', ('stop_id',)),
+    ('trips_route', 'trips', ('route_id',)),
+    ('trips_service', 'trips', ('service_id',)),
+    ('calendar_dates_date', 'calendar_dates', ('date',)),
+]
+
+def _TableName(table):
+    return os.path.splitext(table)[0]
+
+class SqliteFeedWriter(object):
+    "Writes GTFS rows into a SQLite database at `path`, replacing it on Close()."
+
+    def __init__(self, path, tables=feed_writer.TABLES):
+        self.path = path
+        self.tables = tables
+        self._temporary = path + '.tmp'
+        if os.path.exists(self._temporary):
+            os.remove(self._temporary)
+        self._db = sqlite3.connect(self._temporary)
+        self._db.execute('PRAGMA journal_mode = OFF')
+        self._db.execute('PRAGMA synchronous = OFF')
+        self._inserts = {}
+        self.row_counts = dict((table, 0) for table in tables)
+        for table, columns in tables.items():
+            name = _TableName(table)
+            schema = list(BACKEND_SCHEMA.get(name, []))
+            known = set(column for column, _ in schema)
+            schema += [(column, 'TEXT') for column in columns if column not in known]
+            self._db.execute('CREATE TABLE %s (%s)' % (
+                name, ', '.join('%s %s' % column for column in schema)))
+            self._inserts[table] = 'INSERT INTO %s (%s) VALUES (%s)' % (
+                name, ', '.join(columns), ', '.join('?' * len(columns)))
+
+    def WriteRow(self, table, row):
+        self.WriteRows(table, [row])
+
+    def WriteRows(self, table, rows):
+        cursor = self._db.executemany(self._inserts[table], rows)
+        self.row_counts[table] += cursor.rowcount
+
+    def Close(self):
+        "Create the indexes and move the database into place."
+        for name, table, columns in INDEXES:
+            self._db.execute('CREATE INDEX %s ON %s (%s)' % (name, table, ', '.join(columns)))
+        self._db.execute('ANALYZE')
+        self._db.commit()
+        self._db.close()
+        os.rename(self._temporary, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.Close()
+        else:
+            self._db.close()
+            os.remove(self._temporary)
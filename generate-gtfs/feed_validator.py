@@ -0,0 +1,187 @@
+# coding=UTF8
+"""Fast validation of generated feeds.
+
+transitfeed's Schedule.Validate() checks every object of a generic feed one
+at a time. The feeds built from a CompiledSchedule can only go wrong in a few
+ways, and those are checked here column-wise over the compiled arrays, one
+trip group at a time so it works with the streaming writer too:
+
+  - stop times decrease within a trip, or a trip has fewer than two stops;
+  - a trip's first stop does not allow pickup or its last stop does not allow
+    drop off;
+  - a frequency has no departures or a headway that is not positive;
+  - a trip references an unknown stop or service period;
+  - a service period or stop is never used;
+  - two stops share the same coordinates, or are closer than a given radius.
+
+Run generate-gtfs.py with --full-validate to use transitfeed instead.
+"""
+
+import bisect
+import collections
+import sys
+
+import gtfs_time
+import schedule_spec
+import stop_index
+
+ERROR = 'error'
+WARNING = 'warning'
+
+Problem = collections.namedtuple('Problem', ['check', 'severity', 'message'])
+
+class FeedValidator(object):
+    """Validates a CompiledSchedule block by block.
+
+    Call ValidateBlock() with the rows of each trip group (or once with the
+    whole schedule), then Finish() for the checks that need every trip.
+    """
+
+    def __init__(self, max_problems_per_check=20, nearby_stop_meters=0):
+        """`max_problems_per_check` may be None to keep every problem. Stops
+        closer than `nearby_stop_meters` are reported as likely duplicates."""
+        self.problems = []
+        self.max_problems_per_check = max_problems_per_check
+        self.nearby_stop_meters = nearby_stop_meters
+        self._used_stops = set()
+        self._used_services = set()
+        self._counts = collections.Counter()
+
+    def _Report(self, check, severity, message):
+        self._counts[check] += 1
+        limit = self.max_problems_per_check
+        if limit is None or self._counts[check] <= limit:
+            self.problems.append(Problem(check, severity, message))
+        elif self._counts[check] == limit + 1:
+            self.problems.append(Problem(check, severity, '... more %s problems omitted' % check))
+
+    def _TripName(self, compiled, trip):
+        return 'trip %s (%s, %s)' % (
+            compiled.trip_ids[trip],
+            compiled.routes[compiled.trip_route[trip]]['id'],
+            compiled.headsigns[compiled.trip_headsign[trip]])
+
+    def ValidateBlock(self, compiled):
+        """Check the trips and stop times currently held by `compiled`.
+
+        Blocks spliced in from the build cache passed these checks when they
+        were cached, so only their references are recorded. Blocks expanded
+        in a worker process were checked there by CheckShard(), and only its
+        problems are added.
+        """
+        if compiled.shard_check is not None:
+            for problem in compiled.shard_check:
+                self._Report(*problem)
+        elif not compiled.from_cache:
+            self._CheckTrips(compiled)
+        self._CheckReferences(compiled)
+
+    def _CheckTrips(self, compiled):
+        offsets = compiled.trip_offsets
+        times = compiled.st_time
+        num_trips = compiled.NumTrips()
+
+        # Trip starts, trip ends and short trips, from the offsets column.
+        firsts = offsets[:-1]
+        lasts = [end - 1 for end in offsets[1:]]
+        for trip in range(num_trips):
+            if lasts[trip] - firsts[trip] < 1:
+                self._Report('short_trip', ERROR, '%s has fewer than two stop times'
+                             % self._TripName(compiled, trip))
+
+        # Decreasing times: compare every row with the next, ignoring pairs
+        # that straddle a trip boundary.
+        boundaries = set(firsts)
+        for row in [row for row in range(1, len(times))
+                    if times[row] < times[row - 1] and row not in boundaries]:
+            trip = bisect.bisect_right(offsets, row) - 1
+            self._Report('decreasing_time', ERROR, '%s: stop time %s at stop %d is before %s' % (
+                self._TripName(compiled, trip), gtfs_time.FormatTime(times[row]),
+                row - offsets[trip] + 1, gtfs_time.FormatTime(times[row - 1])))
+
+        # Trip ends must let passengers on and off.
+        pickups = compiled.st_pickup
+        drop_offs = compiled.st_drop_off
+        for trip in range(num_trips):
+            if firsts[trip] > lasts[trip]:
+                continue
+            if pickups[firsts[trip]] == schedule_spec.NOT_AVAILABLE:
+                self._Report('trip_ends', ERROR, '%s: no pickup at its first stop'
+                             % self._TripName(compiled, trip))
+            if drop_offs[lasts[trip]] == schedule_spec.NOT_AVAILABLE:
+                self._Report('trip_ends', ERROR, '%s: no drop off at its last stop'
+                             % self._TripName(compiled, trip))
+
+        # Frequencies must describe at least one departure.
+        for trip, start, end, headway in zip(compiled.freq_trip, compiled.freq_start,
+                                             compiled.freq_end, compiled.freq_headway):
+            if headway <= 0 or end <= start:
+                self._Report('bad_frequency', ERROR, '%s: frequency %s-%s every %ds has no '
+                             'departures' % (self._TripName(compiled, trip), gtfs_time.FormatTime(start),
+                                             gtfs_time.FormatTime(end), headway))
+
+    def _CheckReferences(self, compiled):
+        num_stops = len(compiled.stops)
+        num_services = len(compiled.service_periods)
+        stops = set(compiled.st_stop)
+        services = set(compiled.trip_service)
+        for stop in stops:
+            if not 0 <= stop < num_stops:
+                self._Report('unknown_stop', ERROR, 'stop_times reference unknown stop %d' % stop)
+        for service in services:
+            if not 0 <= service < num_services:
+                self._Report('unknown_service', ERROR,
+                             'trips reference unknown service period %d' % service)
+        self._used_stops |= stops
+        self._used_services |= services
+
+    def Finish(self, compiled):
+        "Run the checks over stops and service periods; return the problems found."
+        for i, period in enumerate(compiled.service_periods):
+            if i not in self._used_services:
+                self._Report('unused_service', WARNING,
+                             'service period %s has no trips' % period['id'])
+            if not period['dates']:
+                self._Report('empty_service', ERROR,
+                             'service period %s has no dates' % period['id'])
+        by_location = {}
+        for i, stop in enumerate(compiled.stops):
+            if i not in self._used_stops:
+                self._Report('unused_stop', WARNING, 'stop %s is not used by any trip' % stop['id'])
+            location = (round(stop['lat'], 6), round(stop['lng'], 6))
+            if location in by_location:
+                self._Report('duplicate_stop', WARNING, 'stops %s and %s have the same coordinates' % (
+                    compiled.stops[by_location[location]]['id'], stop['id']))
+            else:
+                by_location[location] = i
+        if self.nearby_stop_meters > 0:
+            index = stop_index.StopIndexFor(compiled.stops, self.nearby_stop_meters)
+            for i, j, distance in index.Pairs(self.nearby_stop_meters):
+                if distance > 0:
+                    self._Report('nearby_stops', WARNING, 'stops %s and %s are only %.0f m apart' % (
+                        compiled.stops[i]['id'], compiled.stops[j]['id'], distance))
+        return self.problems
+
+    def HasErrors(self):
+        return any(problem.severity == ERROR for problem in self.problems)
+
+    def PrintProblems(self, out=sys.stderr):
+        for problem in self.problems:
+            out.write('%s: %s\n' % (problem.severity.capitalize(), problem.message))
+
+def CheckShard(compiled):
+    """Return the problems found in the trips of one block, uncapped.
+
+    Pass it as the `check_shard` of schedule_spec.CompileSpec() to run the
+    per-trip checks in the worker processes.
+    """
+    validator = FeedValidator(max_problems_per_check=None)
+    validator._CheckTrips(compiled)
+    return validator.problems
+
+def ValidateSchedule(compiled):
+    "Validate a fully compiled schedule; return the FeedValidator."
+    validator = FeedValidator()
+    validator.ValidateBlock(compiled)
+    validator.Finish(compiled)
+    return validator
@@ -0,0 +1,258 @@
+# coding=UTF8
+"""Streaming GTFS feed writer.
+
+Rows are plain tuples written straight to one CSV file per table as they are
+generated, so nothing proportional to the number of trips or stop times is
+kept in memory. The table files are spooled to a temporary directory and
+copied into the zip in chunks when the writer is closed; zip entries cannot
+be interleaved, and trips.txt and stop_times.txt are written side by side.
+"""
+
+import collections
+import csv
+import io
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+import gtfs_time
+import service_calendar
+
+PY2 = sys.version_info[0] == 2
+
+# Columns of each table, in the order they are written.
+TABLES = collections.OrderedDict([
+    ('agency.txt', ('agency_id', 'agency_name', 'agency_url', 'agency_timezone', 'agency_lang')),
+    ('stops.txt', ('stop_id', 'stop_name', 'stop_lat', 'stop_lon', 'location_type',
+                   'parent_station')),
+    ('routes.txt', ('route_id', 'agency_id', 'route_short_name', 'route_long_name', 'route_type',
+                    'route_color', 'route_text_color')),
+    ('trips.txt', ('route_id', 'service_id', 'trip_id', 'trip_headsign', 'shape_id',
+                   'block_id')),
+    ('stop_times.txt', ('trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence',
+                        'pickup_type', 'drop_off_type', 'shape_dist_traveled')),
+    ('calendar.txt', ('service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+                      'saturday', 'sunday', 'start_date', 'end_date')),
+    ('calendar_dates.txt', ('service_id', 'date', 'exception_type')),
+    ('frequencies.txt', ('trip_id', 'start_time', 'end_time', 'headway_secs', 'exact_times')),
+    ('shapes.txt', ('shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence',
+                    'shape_dist_traveled')),
+])
+
+# Optional columns and tables of TABLES, by the feature that fills them in.
+FEATURE_COLUMNS = {
+    'shapes': (('trips.txt', 'shape_id'), ('stop_times.txt', 'shape_dist_traveled'),
+               ('shapes.txt', None)),
+    'blocks': (('trips.txt', 'block_id'),),
+    'stations': (('stops.txt', 'parent_station'),),
+}
+
+def Tables(features):
+    """Return TABLES without the columns and tables of the FEATURE_COLUMNS
+    not in `features`, for a FeedWriter that leaves them out."""
+    left_out = set()
+    for feature, columns in FEATURE_COLUMNS.items():
+        if feature not in features:
+            left_out.update(columns)
+    return collections.OrderedDict(
+        (table, tuple(column for column in columns if (table, column) not in left_out))
+        for table, columns in TABLES.items() if (table, None) not in left_out)
+
+# GTFS route_type values for the names transitfeed accepts.
+ROUTE_TYPES = {
+    'Tram': 0, 'Subway': 1, 'Rail': 2, 'Bus': 3, 'Ferry': 4,
+    'Cable Car': 5, 'Gondola': 6, 'Funicular': 7,
+}
+
+# Agency id used when the spec does not set one.
+DEFAULT_AGENCY_ID = '1'
+
+def _Text(value):
+    if value is None:
+        return ''
+    if PY2 and isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+def _Float(value):
+    return repr(float(value))
+
+def _OpenCsv(filename):
+    "Return (file, csv writer) for writing `filename`."
+    if PY2:
+        table_file = open(filename, 'wb')
+    else:
+        table_file = io.open(filename, 'w', encoding='utf-8', newline='')
+    return table_file, csv.writer(table_file, lineterminator='\n')
+
+def WriteTable(filename, columns, rows):
+    "Write a whole table to `filename`, replacing it atomically."
+    temporary = filename + '.tmp'
+    table_file, writer = _OpenCsv(temporary)
+    with table_file:
+        writer.writerow([_Text(column) for column in columns])
+        for row in rows:
+            writer.writerow([_Text(value) for value in row])
+    os.rename(temporary, filename)
+
+class FeedWriter(object):
+    """Writes GTFS tables row by row and zips them up on Close().
+
+    Rows are always in the column order of TABLES; `tables` may leave
+    columns and tables out (see Tables()), and their values are dropped.
+    """
+
+    def __init__(self, path, tables=TABLES):
+        self.path = path
+        self.tables = tables
+        self._directory = tempfile.mkdtemp(prefix='gtfs-')
+        self._files = {}
+        self._writers = {}
+        # Table -> indexes of its columns in TABLES, when some are left out.
+        self._kept = {}
+        for table, columns in tables.items():
+            if columns != TABLES[table]:
+                self._kept[table] = [TABLES[table].index(column) for column in columns]
+        self.row_counts = collections.defaultdict(int)
+
+    def _Writer(self, table):
+        writer = self._writers.get(table)
+        if writer is None:
+            table_file, writer = _OpenCsv(os.path.join(self._directory, table))
+            writer.writerow(self.tables[table])
+            self._files[table] = table_file
+            self._writers[table] = writer
+        return writer
+
+    def WriteRow(self, table, row):
+        "Write one row, a tuple in the column order of `table`."
+        self.WriteRows(table, (row,))
+
+    def WriteRows(self, table, rows):
+        if table not in self.tables:
+            return
+        writer = self._Writer(table)
+        kept = self._kept.get(table)
+        count = 0
+        for row in rows:
+            if kept is not None:
+                row = [row[i] for i in kept]
+            writer.writerow([_Text(value) for value in row])
+            count += 1
+        self.row_counts[table] += count
+
+    def Close(self):
+        "Finish every table and write them into the zip at `path`."
+        try:
+            for table_file in self._files.values():
+                table_file.close()
+            with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED) as feed:
+                for table in self.tables:
+                    if table in self._files:
+                        feed.write(os.path.join(self._directory, table), table)
+        finally:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.Close()
+        else:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+class MultiWriter(object):
+    "Passes every row on to several writers, e.g. the zip and a SQLite artifact."
+
+    def __init__(self, writers):
+        self.writers = writers
+
+    def WriteRow(self, table, row):
+        for writer in self.writers:
+            writer.WriteRow(table, row)
+
+    def WriteRows(self, table, rows):
+        rows = list(rows)
+        for writer in self.writers:
+            writer.WriteRows(table, rows)
+
+    def Close(self):
+        for writer in self.writers:
+            writer.Close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for writer in self.writers:
+            writer.__exit__(exc_type, exc_value, traceback)
+
+def WriteMetadata(writer, compiled, stations=(), calendar_patterns=False):
+    """Write the agency, stops, routes and calendar of a CompiledSchedule.
+
+    `stations` are the (station, children) of stop_index.ParentStations();
+    they are numbered after the stops. With `calendar_patterns`, service
+    periods are written as weekly calendar.txt patterns plus exceptions
+    when that is shorter than listing their dates in calendar_dates.txt.
+    """
+    agency = compiled.agency
+    agency_id = agency.get('id', DEFAULT_AGENCY_ID)
+    writer.WriteRow('agency.txt', (agency_id, agency['name'], agency['url'],
+                                   agency['timezone'], agency.get('lang')))
+    parents = {}
+    for i, (_, children) in enumerate(stations):
+        for child in children:
+            parents[child] = len(compiled.stops) + i
+    writer.WriteRows('stops.txt', (
+        (i, stop['name'], _Float(stop['lat']), _Float(stop['lng']), 0, parents.get(i))
+        for i, stop in enumerate(compiled.stops)))
+    writer.WriteRows('stops.txt', (
+        (len(compiled.stops) + i, station['name'], _Float(station['lat']), _Float(station['lng']), 1,
+         None)
+        for i, (station, _) in enumerate(stations)))
+    writer.WriteRows('routes.txt', (
+        (i, agency_id, route.get('short_name'), route.get('long_name'),
+         ROUTE_TYPES.get(route['route_type'], route['route_type']),
+         route.get('color'), route.get('text_color'))
+        for i, route in enumerate(compiled.routes)))
+    for i, period in enumerate(compiled.service_periods):
+        pattern = service_calendar.CalendarPattern(period['dates']) if calendar_patterns else None
+        if pattern is None:
+            writer.WriteRows('calendar_dates.txt', ((i, date, 1) for date in period['dates']))
+            continue
+        (flags, start, end), added, removed = pattern
+        writer.WriteRow('calendar.txt', [i] + flags + [start, end])
+        writer.WriteRows('calendar_dates.txt', [(i, date, 1) for date in added] +
+                                               [(i, date, 2) for date in removed])
+
+def WriteTrips(writer, compiled):
+    "Write the trips and stop times currently held by a CompiledSchedule."
+    headsigns = compiled.headsigns
+    shapes = compiled.trip_shape or [None] * compiled.NumTrips()
+    blocks = compiled.block_ids or [None] * compiled.NumTrips()
+    writer.WriteRows('trips.txt', (
+        (compiled.trip_route[i], compiled.trip_service[i], compiled.trip_ids[i],
+         headsigns[compiled.trip_headsign[i]], shapes[i], blocks[i])
+        for i in range(compiled.NumTrips())))
+    format_time = gtfs_time.FormatTime
+    distances = compiled.st_dist
+    for i in range(compiled.NumTrips()):
+        trip_id = compiled.trip_ids[i]
+        begin = compiled.trip_offsets[i]
+        rows = []
+        for sequence, (stop, time, pickup, drop_off) in enumerate(compiled.StopTimes(i)):
+            time = format_time(time)
+            distance = '%.1f' % distances[begin + sequence] if distances else None
+            # Regular (0) pickup and drop off types are left blank.
+            rows.append((trip_id, time, time, stop, sequence + 1, pickup or None, drop_off or None,
+                         distance))
+        writer.WriteRows('stop_times.txt', rows)
+    if compiled.freq_trip:
+        # Frequencies come from fixed headways, so departures are exact.
+        writer.WriteRows('frequencies.txt', (
+            (compiled.trip_ids[trip], format_time(start), format_time(end), headway, 1)
+            for trip, start, end, headway in zip(compiled.freq_trip, compiled.freq_start,
+                                                 compiled.freq_end, compiled.freq_headway)))
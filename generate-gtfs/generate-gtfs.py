@@ -1,622 +1,244 @@
 #!/usr/bin/env python
 # coding=UTF8
 
-import transitfeed
+import os
+import sys
 from optparse import OptionParser
-import datetime
+
+import build_cache
+import departure_index
+import feed_columnar
+import feed_merge
+import feed_pipeline
+import feed_shapes
+import feed_sqlite
+import pipeline_profile
+import schedule_spec
+import service_calendar
+import travel_times
+import trip_positions
+import vehicle_blocks
 
 parser = OptionParser()
 parser.add_option('--output', dest='output',
                   help='Path of output file. Should end in .zip')
-parser.set_defaults(output='google_transit.zip')
+parser.add_option('--spec', dest='spec',
+                  help='Path of the schedule spec (.json, or .yaml with PyYAML installed)')
+parser.add_option('--backend', dest='backend', choices=['transitfeed', 'stream'],
+                  help='transitfeed builds and validates a full transitfeed.Schedule; '
+                       'stream writes rows straight into the zip as trips are expanded')
+parser.add_option('--full-validate', dest='full_validate', action='store_true',
+                  help='Build a transitfeed.Schedule and run its full (slow) validation '
+                       'instead of the native checks in feed_validator.py')
+parser.add_option('--cache-dir', dest='cache_dir',
+                  help='Directory of the build cache; only (route, service period) blocks '
+                       'whose definitions changed since the last build are regenerated')
+parser.add_option('--sqlite', dest='sqlite',
+                  help='Also write the feed as an indexed SQLite database for backend/gtfs.js')
+parser.add_option('--columnar', dest='columnar',
+                  help='Also write the feed in the memory-mappable columnar format of feed_columnar.py')
+parser.add_option('--departures', dest='departures',
+                  help='Also write the per-stop, per-service period departure index of '
+                       'departure_index.py')
+parser.add_option('--positions', dest='positions',
+                  help='Also write the bus positions of every trip, sampled at a fixed interval, '
+                       'in the format of trip_positions.py')
+parser.add_option('--position-step', dest='position_step', type='int',
+                  help='Seconds between the samples of --positions')
+parser.add_option('--compress-calendar', dest='compress_calendar', action='store_true',
+                  help='Write trips that are the same on several service periods once, under a '
+                       'shared service period, and write service periods as weekly calendar.txt '
+                       'patterns where shorter (backend/gtfs.js only reads calendar_dates.txt); '
+                       'not with --blocks')
+parser.add_option('--frequencies', dest='frequencies', action='store_true',
+                  help='Write trip groups with a headway pattern as one trip plus a '
+                       'frequencies.txt entry instead of one trip per departure')
+parser.add_option('--shapes', dest='shapes', action='store_true',
+                  help='Write shapes.txt and the shape_dist_traveled of every stop time')
+parser.add_option('--polylines', dest='polylines',
+                  help='With --shapes, JSON file of route paths (route id to encoded polyline '
+                       'or [lat, lng] list) to draw shapes along; routes without one get '
+                       'straight lines')
+parser.add_option('--travel-times', dest='travel_times',
+                  help='CSV of observed segment times by time of day (see travel_times.py and '
+                       'io2017_travel_times.csv) to use instead of the delta_minutes of the spec')
+parser.add_option('--blocks', dest='blocks', action='store_true',
+                  help='Chain trips into vehicle blocks (block_id) and report the vehicles '
+                       'each route needs')
+parser.add_option('--deadhead-speed', dest='deadhead_speed', type='float',
+                  help='Speed in km/h of buses driving empty between blocked trips')
+parser.add_option('--layover', dest='layover', type='float',
+                  help='Minimum minutes between the end of a trip and the next of its block')
+parser.add_option('--check-nearby-stops', dest='check_nearby_stops', action='store_true',
+                  help='Warn about stops closer than --nearby-stops meters to each other')
+parser.add_option('--nearby-stops', dest='nearby_stops', type='float',
+                  help='Radius in meters of --check-nearby-stops; implies it')
+parser.add_option('--parent-stations', dest='parent_stations', type='float',
+                  help='Group stops within this many meters of each other under a '
+                       'parent_station (location_type 1) in stops.txt')
+parser.add_option('--merge', dest='merges', action='append',
+                  help='Existing GTFS zip or directory to merge into the output, as PATH or '
+                       'PREFIX=PATH; its ids are prefixed with PREFIX: (default: the file name). '
+                       'May be repeated')
+parser.add_option('--merge-stop-meters', dest='merge_stop_meters', type='float',
+                  help='Replace stops of merged feeds by generated stops within this many meters')
+parser.add_option('--merge-all-dates', dest='merge_clip', action='store_false',
+                  help='Keep the whole calendars of merged feeds rather than only the dates '
+                       'of the generated service periods')
+parser.add_option('--jobs', dest='jobs', type='int',
+                  help='Number of worker processes expanding and checking the '
+                       '(route, service period) blocks; the output does not depend on it')
+parser.add_option('--profile', dest='profile', action='store_true',
+                  help='Report the wall time, calls and allocations of each step of the '
+                       'pipeline and the rows per second of each route on stderr')
+parser.add_option('--profile-stats', dest='profile_stats',
+                  help='With --profile, also write a cProfile (pstats) dump of the run')
+parser.add_option('--flamegraph', dest='flamegraph',
+                  help='With --profile, also write the step times as folded stacks for '
+                       'flamegraph.pl or speedscope')
+parser.add_option('--profile-memory', dest='profile_memory', action='store_true',
+                  help='With --profile, also trace the net allocations of each step (Python 3); '
+                       'this slows every step down several times')
+parser.set_defaults(output='google_transit.zip', backend='stream', full_validate=False,
+                    frequencies=False, compress_calendar=False, shapes=False, blocks=False,
+                    deadhead_speed=30.0, layover=5.0, check_nearby_stops=False,
+                    nearby_stops=None, parent_stations=0.0,
+                    merges=[], merge_stop_meters=0.0, merge_clip=True, position_step=5, jobs=1,
+                    profile=False, profile_memory=False,
+                    spec=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'io2017.json'))
 (options, args) = parser.parse_args()
 
-schedule = transitfeed.Schedule()
-agency = transitfeed.Agency(name="I/O Buses",
-    url="https://events.google.com/io/",
-    timezone="America/Los_Angeles",
-    lang="EN")
-schedule.AddAgencyObject(agency)
-
-# Service Periods (1 day each)
-day0 = schedule.NewDefaultServicePeriod()
-day0.SetDateHasService('20170516')
-day1 = schedule.NewDefaultServicePeriod()
-day1.SetDateHasService('20170517')
-day2 = schedule.NewDefaultServicePeriod()
-day2.SetDateHasService('20170518')
-day3 = schedule.NewDefaultServicePeriod()
-day3.SetDateHasService('20170519')
-
-# Stops
-shorelineAmphitheatre = schedule.AddStop(lat=37.426300, lng=-122.078634, name="Shoreline Amphitheatre")
-
-sheratonPaloAlto = schedule.AddStop(lat=37.441290, lng=-122.163991, name="Sheraton Palo Alto")
-hiltonGardenInnPaloAlto = schedule.AddStop(lat=37.409352, lng=-122.122660, name="Hilton Garden Inn Palo Alto")
-paloAltoCaltrain = schedule.AddStop(lat=37.442909, lng=-122.164275, name="Palo Alto Caltrain")
-avatarHotel = schedule.AddStop(lat=37.392028, lng=-121.977778, name="Avatar Hotel")
-plazaSuites = schedule.AddStop(lat=37.387002, lng=-121.983223, name="Plaza Suites")
-aloftSunnyvale = schedule.AddStop(lat=37.376305,lng=-122.029151, name="Aloft Sunnyvale")
-wildPalmsHotel = schedule.AddStop(lat=37.352014, lng=-122.013180, name="Wild Palms Hotel")
-towneplace = schedule.AddStop(lat=37.372713, lng=-122.056580, name="TownePlace Suites")
-hotelAvante = schedule.AddStop(lat=37.376128, lng=-122.061057, name="Hotel Avante")
-countryInnAndSuites = schedule.AddStop(lat=37.409883, lng=-122.002131, name="Country Inn & Suites By Carlson")
-millbraeBart = schedule.AddStop(lat=37.600425, lng=-122.385861, name="Millbrae BART Station")
-hyattRegencyEmbarcaderoSF = schedule.AddStop(lat=37.794075, lng=-122.395455, name="Hyatt Regency SF")
-sfoAirport = schedule.AddStop(lat=37.616763, lng=-122.383949, name="San Francisco Airport (SFO)")
-sjcAirport = schedule.AddStop(lat=37.367254, lng=-121.926683, name="San José Airport (SJC)")
-mtvCaltrain = schedule.AddStop(lat=37.394109, lng=-122.076628, name="Mountain View Caltrain Station")
-
-# Routes
-yellowRoute = schedule.AddRoute(short_name="Yellow", long_name="Hilton Garden Inn Palo Alto, Sheraton Palo Alto, Westin, Palo Alto Caltrain", route_type="Bus")
-limeRoute = schedule.AddRoute(short_name="Lime", long_name="Avatar Hotel, Plaza Suites", route_type="Bus")
-tealRoute = schedule.AddRoute(short_name="Teal", long_name="Aloft Sunnyvale, Wild Palms", route_type="Bus")
-orangeRoute = schedule.AddRoute(short_name="Orange", long_name="Towneplace, Hotel Avante", route_type="Bus")
-indigoRoute = schedule.AddRoute(short_name="Indigo", long_name="Country Inn & Suites", route_type="Bus")
-mtvCaltrainRoute = schedule.AddRoute(short_name="", long_name="Mountain View Caltrain", route_type="Bus")
-sfRoute = schedule.AddRoute(short_name="", long_name="San Francisco Shuttle", route_type="Bus") 
-millbraeBartRoute = schedule.AddRoute(short_name="", long_name="Millbrae BART", route_type="Bus")
-sfoRoute = schedule.AddRoute(short_name="", long_name="San Francisco Airport", route_type="Bus")
-sjcRoute = schedule.AddRoute(short_name="", long_name="San José Airport", route_type="Bus")
-
-# Trips
-def TripToShoreline(route, service_period, initial_stop, start_time, delta_minutes):
-    "Create a trip from `initial_stop` to Shoreline."
-    trip = route.AddTrip(schedule, headsign="To Shoreline Amphitheatre", service_period=service_period)
-    end_time = datetime.datetime.strftime(datetime.datetime.strptime(start_time, '%H:%M:%S') +
-                datetime.timedelta(minutes=delta_minutes), '%H:%M:%S')
-    trip.AddStopTime(initial_stop, stop_time=start_time, drop_off_type=1) # Pickup only
-    trip.AddStopTime(shorelineAmphitheatre, stop_time=end_time, pickup_type=1) # Drop off only
-
-def TripsToShoreline(route, initial_stop, trips):
-    "Create a series of trips from `initial_stop` to Shoreline for each of `trips`."
-    for trip in trips:
-        TripToShoreline(route, trip['service_period'], initial_stop, trip['start_time'], trip['delta_minutes'])
-
-def TripsToShorelineAtTimes(route, service_period, initial_stop, start_times, delta_minutes):
-    for start_time in start_times:
-        TripToShoreline(route, service_period, initial_stop, start_time, delta_minutes)
-
-def TripFromShoreline(route, service_period, headsign, start_time, stops):
-    "Create a trip from Shoreline to `stops`."
-    trip = route.AddTrip(schedule, headsign=headsign, service_period=service_period)
-    trip.AddStopTime(shorelineAmphitheatre, stop_time=start_time, drop_off_type=1) # Pickup only
-    last_stop_time = start_time
-    for stop in stops:
-        last_stop_time = datetime.datetime.strftime(datetime.datetime.strptime(last_stop_time, '%H:%M:%S') +
-                            datetime.timedelta(minutes=stop['delta_minutes']), '%H:%M:%S')
-        trip.AddStopTime(stop['stop'], stop_time=last_stop_time, pickup_type=1) # Drop off only
-
-def TripsFromShorelineAtTimes(route, service_period, headsign, start_times, stops):
-    "Create a series of trips from Shoreline to `stops`."
-    for start_time in start_times:
-        TripFromShoreline(route, service_period, headsign, start_time, stops)
-
-def MultistopTripToShoreline(route, service_period, headsign, start_time, stops):
-    trip = route.AddTrip(schedule, headsign=headsign, service_period=service_period)
-    trip.AddStopTime(shorelineAmphitheatre, stop_time=start_time, drop_off_type=1) # Pickup only
-    last_stop_time = start_time
-    for stop in stops:
-        last_stop_time = datetime.datetime.strftime(datetime.datetime.strptime(last_stop_time, '%H:%M:%S') +
-                            datetime.timedelta(minutes=stop['delta_minutes']), '%H:%M:%S')
-        if stop != stops[-1]:
-            trip.AddStopTime(stop['stop'], stop_time=last_stop_time, drop_off_type=1) # Pickup only
+profiler = None
+if options.profile_stats or options.flamegraph or options.profile_memory:
+    options.profile = True
+if options.profile:
+    if options.jobs > 1:
+        parser.error('--profile needs --jobs 1')
+    profiler = pipeline_profile.PipelineProfiler(options.profile_memory, options.profile_stats)
+    profiler.Start()
+
+spec = schedule_spec.LoadSpec(options.spec)
+if options.compress_calendar:
+    spec = service_calendar.CompressSpec(spec)
+model = None
+if options.travel_times:
+    try:
+        model = travel_times.LoadSegmentTimes(options.travel_times)
+    except (IOError, ValueError) as e:
+        parser.error('%s: %s' % (options.travel_times, e))
+
+def BuildSchedule(compiled):
+    "Load a CompiledSchedule into a transitfeed.Schedule."
+    # Only the transitfeed backend needs transitfeed installed.
+    import transitfeed
+    schedule = transitfeed.Schedule()
+    agency = transitfeed.Agency(name=compiled.agency['name'],
+        url=compiled.agency['url'],
+        timezone=compiled.agency['timezone'],
+        lang=compiled.agency['lang'])
+    schedule.AddAgencyObject(agency)
+
+    # Service Periods
+    service_periods = []
+    for period in compiled.service_periods:
+        service_period = schedule.NewDefaultServicePeriod()
+        for date in period['dates']:
+            service_period.SetDateHasService(date)
+        service_periods.append(service_period)
+
+    # Stops
+    stops = [schedule.AddStop(lat=stop['lat'], lng=stop['lng'], name=stop['name'])
+             for stop in compiled.stops]
+
+    # Routes
+    routes = [schedule.AddRoute(short_name=route['short_name'], long_name=route['long_name'],
+                                route_type=route['route_type'])
+              for route in compiled.routes]
+
+    # Trips
+    trips = []
+    for i in range(compiled.NumTrips()):
+        trip = routes[compiled.trip_route[i]].AddTrip(schedule, trip_id=compiled.trip_ids[i],
+            headsign=compiled.headsigns[compiled.trip_headsign[i]],
+            service_period=service_periods[compiled.trip_service[i]])
+        for stop, time, pickup, drop_off in compiled.StopTimes(i):
+            # transitfeed leaves regular (0) pickup and drop off types blank.
+            trip.AddStopTime(stops[stop], arrival_secs=time, departure_secs=time,
+                             pickup_type=pickup or None, drop_off_type=drop_off or None)
+        trips.append(trip)
+    for trip, start, end, headway in zip(compiled.freq_trip, compiled.freq_start,
+                                         compiled.freq_end, compiled.freq_headway):
+        trips[trip].AddFrequency(start, end, headway, exact_times=1)
+    return schedule
+
+if options.full_validate:
+    options.backend = 'transitfeed'
+if ((options.sqlite or options.columnar or options.departures or options.positions
+     or options.merges or options.profile) and options.backend != 'stream'):
+    parser.error('--sqlite, --columnar, --departures, --positions, --merge and --profile need '
+                 'the stream backend')
+if options.blocks and options.compress_calendar:
+    # Blocks chain the trips of one service period, so the trips of a merged
+    # period would get vehicles of their own besides those of its days.
+    parser.error('--blocks cannot be combined with --compress-calendar')
+if options.polylines:
+    options.shapes = True
+if options.nearby_stops is not None:
+    options.check_nearby_stops = True
+nearby_stops = 0.0
+if options.check_nearby_stops:
+    nearby_stops = feed_pipeline.NEARBY_STOP_METERS if options.nearby_stops is None else options.nearby_stops
+    if nearby_stops <= 0:
+        parser.error('--nearby-stops must be positive')
+if options.position_step < 1:
+    parser.error('--position-step must be at least 1')
+try:
+    merges = feed_merge.ParseMerges(options.merges)
+except feed_merge.MergeError as e:
+    parser.error(str(e))
+
+if options.backend == 'stream':
+    cache = build_cache.BuildCache(options.cache_dir) if options.cache_dir else None
+    writers = []
+    if options.sqlite:
+        writers.append(feed_sqlite.SqliteFeedWriter(options.sqlite))
+    columnar = feed_columnar.ColumnarFeedWriter(options.columnar) if options.columnar else None
+    blocks = None
+    if options.blocks:
+        blocks = vehicle_blocks.BlockBuilder(options.deadhead_speed, int(options.layover * 60))
+    positions = None
+    if options.positions:
+        positions = trip_positions.TripPositionWriter(options.positions, options.position_step)
+    departures = None
+    if options.departures:
+        departures = departure_index.DepartureIndexWriter(options.departures)
+    if options.shapes:
+        polylines = feed_shapes.LoadPolylines(options.polylines) if options.polylines else {}
+    else:
+        polylines = None
+    validator = feed_pipeline.StreamFeed(
+        spec, options.output, writers, cache, columnar, options.jobs, options.frequencies,
+        polylines, model, nearby_stops, options.parent_stations, merges,
+        options.merge_stop_meters, options.merge_clip, departures, blocks, positions,
+        options.compress_calendar)
+    validator.PrintProblems()
+    if profiler is not None:
+        profiler.Stop()
+        for line in profiler.Report([route['id'] for route in spec['routes']]):
+            sys.stderr.write('Profile: %s\n' % line)
+        if options.flamegraph:
+            profiler.WriteFolded(options.flamegraph)
+    if cache is not None:
+        if validator.HasErrors():
+            cache.Discard()
         else:
-            trip.AddStopTime(stop['stop'], stop_time=last_stop_time, pickup_type=1) # Drop off only
-
-def MultistopTripsToShorelineAtTimes(route, service_period, headsign, start_times, stops):
-    for start_time in start_times:
-        MultistopTripToShoreline(route, service_period, headsign, start_time, stops)
-
-TripsToShoreline(yellowRoute, sheratonPaloAlto, [
-    {'service_period': day1, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '07:30:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '08:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '08:30:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '09:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '09:30:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '07:30:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '08:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '08:30:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '09:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '09:30:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '10:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '10:30:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '11:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '11:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '07:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '08:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '08:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '09:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '09:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '10:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '10:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '11:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '11:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '12:00:00', 'delta_minutes': 30},
-])
-
-TripsToShoreline(yellowRoute, hiltonGardenInnPaloAlto, [
-    {'service_period': day1, 'start_time': '07:00:00', 'delta_minutes': 20},
-    {'service_period': day1, 'start_time': '08:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '09:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '08:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '09:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '10:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '08:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '09:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '10:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '11:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '12:00:00', 'delta_minutes': 30},
-])
-
-TripsToShoreline(limeRoute, avatarHotel, [
-    {'service_period': day1, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day1, 'start_time': '09:30:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '09:30:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '09:30:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '11:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '12:00:00', 'delta_minutes': 30},
-])
-
-TripsToShoreline(limeRoute, plazaSuites, [
-    {'service_period': day1, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day1, 'start_time': '09:00:00', 'delta_minutes': 45},
-    {'service_period': day1, 'start_time': '09:30:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '09:00:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '10:00:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '09:00:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '10:00:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '11:00:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '12:00:00', 'delta_minutes': 45},
-])
-
-TripsToShoreline(tealRoute, aloftSunnyvale, [
-    {'service_period': day1, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day1, 'start_time': '09:30:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '09:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '09:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '11:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '12:00:00', 'delta_minutes': 30},
-])
-
-TripsToShoreline(tealRoute, wildPalmsHotel, [
-    {'service_period': day1, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day1, 'start_time': '09:15:00', 'delta_minutes': 60},
-    {'service_period': day2, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '09:15:00', 'delta_minutes': 60},
-    {'service_period': day3, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '08:00:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '09:15:00', 'delta_minutes': 60},
-    {'service_period': day3, 'start_time': '11:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '12:00:00', 'delta_minutes': 60},
-])
-
-TripsToShoreline(orangeRoute, towneplace, [
-    {'service_period': day1, 'start_time': '07:00:00', 'delta_minutes': 20},
-    {'service_period': day1, 'start_time': '08:00:00', 'delta_minutes': 20},
-    {'service_period': day1, 'start_time': '09:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '07:00:00', 'delta_minutes': 20},
-    {'service_period': day2, 'start_time': '08:00:00', 'delta_minutes': 20},
-    {'service_period': day2, 'start_time': '09:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '10:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '07:00:00', 'delta_minutes': 20},
-    {'service_period': day3, 'start_time': '08:00:00', 'delta_minutes': 20},
-    {'service_period': day3, 'start_time': '09:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '10:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '12:00:00', 'delta_minutes': 30},
-])
-
-TripsToShoreline(orangeRoute, hotelAvante, [
-    {'service_period': day1, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '08:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '09:00:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '08:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '09:00:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '10:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '08:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '09:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '10:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '11:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '12:00:00', 'delta_minutes': 30},
-])
-
-TripsToShoreline(indigoRoute, countryInnAndSuites, [
-    {'service_period': day1, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day1, 'start_time': '08:00:00', 'delta_minutes': 40},
-    {'service_period': day1, 'start_time': '09:15:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day2, 'start_time': '08:00:00', 'delta_minutes': 40},
-    {'service_period': day2, 'start_time': '09:15:00', 'delta_minutes': 45},
-    {'service_period': day2, 'start_time': '10:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '07:00:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '08:00:00', 'delta_minutes': 40},
-    {'service_period': day3, 'start_time': '09:15:00', 'delta_minutes': 45},
-    {'service_period': day3, 'start_time': '10:30:00', 'delta_minutes': 30},
-    {'service_period': day3, 'start_time': '12:00:00', 'delta_minutes': 30},
-])
-
-TripsToShoreline(millbraeBartRoute, millbraeBart, [
-    {'service_period': day1, 'start_time': '06:30:00', 'delta_minutes': 60},
-    {'service_period': day1, 'start_time': '07:30:00', 'delta_minutes': 80},
-    {'service_period': day2, 'start_time': '06:30:00', 'delta_minutes': 60},
-    {'service_period': day2, 'start_time': '07:30:00', 'delta_minutes': 80},
-    {'service_period': day3, 'start_time': '06:30:00', 'delta_minutes': 60},
-    {'service_period': day3, 'start_time': '07:30:00', 'delta_minutes': 80},
-])
-
-TripsToShoreline(sfRoute, hyattRegencyEmbarcaderoSF, [
-    {'service_period': day1, 'start_time': '06:20:00', 'delta_minutes': 85},
-    {'service_period': day1, 'start_time': '06:40:00', 'delta_minutes': 95},
-    {'service_period': day1, 'start_time': '07:00:00', 'delta_minutes': 120},
-    {'service_period': day2, 'start_time': '06:20:00', 'delta_minutes': 85},
-    {'service_period': day2, 'start_time': '06:40:00', 'delta_minutes': 95},
-    {'service_period': day2, 'start_time': '07:00:00', 'delta_minutes': 120},
-    {'service_period': day3, 'start_time': '06:20:00', 'delta_minutes': 85},
-    {'service_period': day3, 'start_time': '06:40:00', 'delta_minutes': 95},
-    {'service_period': day3, 'start_time': '07:00:00', 'delta_minutes': 120},
-])
-
-# MTV Caltrain Loop
-# We are putting the CalTrain loop frequency at every half hour, even though the schedule says "Every 20-30 minutes"
-
-for day in [day1, day2]:
-    # Morning route MTV Caltrain => Shoreline
-    TripsToShorelineAtTimes(mtvCaltrainRoute, day, mtvCaltrain, [
-        '07:15:00', '07:45:00', '08:15:00', '08:45:00', '09:15:00', '09:45:00',
-        '10:15:00', '10:45:00', '11:15:00', '11:45:00', '12:15:00', '12:45:00',
-        '13:15:00', '13:45:00', '14:15:00', '14:45:00', '15:15:00', '15:45:00',
-        '16:15:00',
-    ], 15)
-
-    # Afternoon route Shoreline => MTV Caltrain
-    TripsFromShorelineAtTimes(mtvCaltrainRoute, day, 'To Mountain View Caltrain', [
-        '16:45:00', '17:15:00', '17:45:00', '18:15:00', '18:45:00', '19:15:00',
-        '19:45:00', '20:15:00', '20:45:00', '21:15:00', '21:45:00', '22:15:00',
-        '22:45:00',
-    ], [{'stop': mtvCaltrain, 'delta_minutes': 15}])
-
-# Morning route MTV Caltrain => Shoreline
-TripsToShorelineAtTimes(mtvCaltrainRoute, day3, mtvCaltrain, [
-    '07:15:00', '07:45:00', '08:15:00', '08:45:00', '09:15:00', '09:45:00',
-    '10:15:00', '10:45:00', '11:15:00', '11:45:00', '12:15:00', '12:45:00',
-], 15)
-
-# Afternoon route Shoreline => MTV Caltrain
-TripsFromShorelineAtTimes(mtvCaltrainRoute, day3, 'To Mountain View Caltrain', [
-    '13:15:00', '13:45:00', '14:15:00', '14:45:00', '15:15:00', '15:45:00',
-    '16:15:00', '16:45:00',
-], [{'stop': mtvCaltrain, 'delta_minutes': 15}])
-
-# Times for coloured routes
-elevenToFiveOnceAnHour = [
-    '11:00:00', '12:00:00', '13:00:00', '14:00:00', '15:00:00', '16:00:00', '17:00:00',
-]
-twelveToFiveOnceAnHour = [
-    '12:00:00', '13:00:00', '14:00:00', '15:00:00', '16:00:00', '17:00:00',
-]
-fiveThirtyToTenThirtyEveryHalfHour = [
-    '17:30:00', '18:00:00', '18:30:00', '19:00:00', '19:30:00', '20:00:00',
-    '20:30:00', '21:00:00', '21:30:00', '22:00:00', '22:30:00',
-]
-oneThirtyToFourThirtyOnceAnHour = [
-    '13:30:00', '14:30:00', '15:30:00', '16:30:00',
-]
-
-# Yellow route: Shoreline -> Hilton Garden Inn Palo Alto -> Sheraton Palo Alto -> Westin -> Palo Alto Caltrain
-yellowHeadsign = 'To Hilton Garden Inn Palo Alto, Sheraton Palo Alto, Westin, and Palo Alto Caltrain'
-yellowStops = [
-    {'stop': hiltonGardenInnPaloAlto, 'delta_minutes': 15},
-    {'stop': sheratonPaloAlto, 'delta_minutes': 10},
-    #TODO(brettmorgan): Westin?
-    {'stop': paloAltoCaltrain, 'delta_minutes': 10}
-]
-
-TripsFromShorelineAtTimes(yellowRoute, day1, yellowHeadsign, elevenToFiveOnceAnHour, yellowStops)
-TripsFromShorelineAtTimes(yellowRoute, day1, yellowHeadsign, fiveThirtyToTenThirtyEveryHalfHour, yellowStops)
-TripsFromShorelineAtTimes(yellowRoute, day2, yellowHeadsign, twelveToFiveOnceAnHour, yellowStops)
-TripsFromShorelineAtTimes(yellowRoute, day2, yellowHeadsign, fiveThirtyToTenThirtyEveryHalfHour, yellowStops)
-TripsFromShorelineAtTimes(yellowRoute, day3, yellowHeadsign, oneThirtyToFourThirtyOnceAnHour, yellowStops)
-
-# Lime route: Shoreline -> Avatar Hotel -> Plaza Suites
-limeHeadsign = 'To Avatar Hotel, Plaza Suites'
-limeStops = [
-    {'stop': avatarHotel, 'delta_minutes': 25},
-    {'stop': plazaSuites, 'delta_minutes': 10},
-]
-
-TripsFromShorelineAtTimes(limeRoute, day1, limeHeadsign, elevenToFiveOnceAnHour, limeStops)
-TripsFromShorelineAtTimes(limeRoute, day1, limeHeadsign, fiveThirtyToTenThirtyEveryHalfHour, limeStops)
-TripsFromShorelineAtTimes(limeRoute, day2, limeHeadsign, twelveToFiveOnceAnHour, limeStops)
-TripsFromShorelineAtTimes(limeRoute, day2, limeHeadsign, fiveThirtyToTenThirtyEveryHalfHour, limeStops)
-TripsFromShorelineAtTimes(limeRoute, day3, limeHeadsign, oneThirtyToFourThirtyOnceAnHour, limeStops)
-
-# Teal route: Shoreline -> Aloft Sunnyvale -> Wild Palms
-tealHeadsign = 'To The Aloft Sunnyvale, Wild Palms Hotel'
-tealStops = [
-    {'stop': aloftSunnyvale, 'delta_minutes': 30},
-    {'stop': wildPalmsHotel, 'delta_minutes': 20},
-]
-
-TripsFromShorelineAtTimes(tealRoute, day1, tealHeadsign, elevenToFiveOnceAnHour, tealStops)
-TripsFromShorelineAtTimes(tealRoute, day1, tealHeadsign, fiveThirtyToTenThirtyEveryHalfHour, tealStops)
-TripsFromShorelineAtTimes(tealRoute, day2, tealHeadsign, twelveToFiveOnceAnHour, tealStops)
-TripsFromShorelineAtTimes(tealRoute, day2, tealHeadsign, fiveThirtyToTenThirtyEveryHalfHour, tealStops)
-TripsFromShorelineAtTimes(tealRoute, day3, tealHeadsign, oneThirtyToFourThirtyOnceAnHour, tealStops)
-
-
-# Orange route: Shoreline -> Towneplace -> Hotel Avante
-orangeHeadsign = 'To Hotel Avante & Grand Hotel'
-orangeStops = [
-    {'stop': towneplace, 'delta_minutes': 20},
-    {'stop': hotelAvante, 'delta_minutes': 10}
-]
-
-TripsFromShorelineAtTimes(orangeRoute, day1, orangeHeadsign, elevenToFiveOnceAnHour, orangeStops)
-TripsFromShorelineAtTimes(orangeRoute, day1, orangeHeadsign, fiveThirtyToTenThirtyEveryHalfHour, orangeStops)
-TripsFromShorelineAtTimes(orangeRoute, day2, orangeHeadsign, twelveToFiveOnceAnHour, orangeStops)
-TripsFromShorelineAtTimes(orangeRoute, day2, orangeHeadsign, fiveThirtyToTenThirtyEveryHalfHour, orangeStops)
-TripsFromShorelineAtTimes(orangeRoute, day3, orangeHeadsign, oneThirtyToFourThirtyOnceAnHour, orangeStops)
-
-# Indigo route: Shoreline -> Country Inn & Suites by Carlson
-indigoHeadsign = 'To Country Inn & Suites by Carlson'
-indigoStops = [
-    {'stop': countryInnAndSuites, 'delta_minutes': 20}
-]
-
-TripsFromShorelineAtTimes(indigoRoute, day1, indigoHeadsign, elevenToFiveOnceAnHour, indigoStops)
-TripsFromShorelineAtTimes(indigoRoute, day1, indigoHeadsign, fiveThirtyToTenThirtyEveryHalfHour, indigoStops)
-TripsFromShorelineAtTimes(indigoRoute, day2, indigoHeadsign, twelveToFiveOnceAnHour, indigoStops)
-TripsFromShorelineAtTimes(indigoRoute, day2, indigoHeadsign, fiveThirtyToTenThirtyEveryHalfHour, indigoStops)
-TripsFromShorelineAtTimes(indigoRoute, day3, indigoHeadsign, oneThirtyToFourThirtyOnceAnHour, indigoStops)
-
-# San Francisco and Millbrae BART
-hyattRegencyEmbarcaderoHeadsign = 'Hyatt Regency Embarcadero, via Millbrae BART'
-
-TripFromShoreline(sfRoute, day1, hyattRegencyEmbarcaderoHeadsign, '18:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day1, hyattRegencyEmbarcaderoHeadsign, '18:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day1, hyattRegencyEmbarcaderoHeadsign, '19:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day1, hyattRegencyEmbarcaderoHeadsign, '19:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day1, hyattRegencyEmbarcaderoHeadsign, '20:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-TripFromShoreline(sfRoute, day1, hyattRegencyEmbarcaderoHeadsign, '20:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-TripFromShoreline(sfRoute, day1, hyattRegencyEmbarcaderoHeadsign, '21:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-TripFromShoreline(sfRoute, day1, hyattRegencyEmbarcaderoHeadsign, '21:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-TripFromShoreline(sfRoute, day1, hyattRegencyEmbarcaderoHeadsign, '22:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-TripFromShoreline(sfRoute, day1, hyattRegencyEmbarcaderoHeadsign, '22:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-
-TripFromShoreline(sfRoute, day2, hyattRegencyEmbarcaderoHeadsign, '18:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day2, hyattRegencyEmbarcaderoHeadsign, '18:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day2, hyattRegencyEmbarcaderoHeadsign, '19:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day2, hyattRegencyEmbarcaderoHeadsign, '19:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day2, hyattRegencyEmbarcaderoHeadsign, '20:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-TripFromShoreline(sfRoute, day2, hyattRegencyEmbarcaderoHeadsign, '20:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-TripFromShoreline(sfRoute, day2, hyattRegencyEmbarcaderoHeadsign, '21:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-TripFromShoreline(sfRoute, day2, hyattRegencyEmbarcaderoHeadsign, '21:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-TripFromShoreline(sfRoute, day2, hyattRegencyEmbarcaderoHeadsign, '22:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-TripFromShoreline(sfRoute, day2, hyattRegencyEmbarcaderoHeadsign, '22:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 45},
-    {'stop': hyattRegencyEmbarcaderoSF, 'delta_minutes': 30}
-])
-
-TripFromShoreline(sfRoute, day3, hyattRegencyEmbarcaderoHeadsign, '12:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day3, hyattRegencyEmbarcaderoHeadsign, '13:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day3, hyattRegencyEmbarcaderoHeadsign, '14:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day3, hyattRegencyEmbarcaderoHeadsign, '14:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day3, hyattRegencyEmbarcaderoHeadsign, '15:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day3, hyattRegencyEmbarcaderoHeadsign, '15:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day3, hyattRegencyEmbarcaderoHeadsign, '16:00:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-TripFromShoreline(sfRoute, day3, hyattRegencyEmbarcaderoHeadsign, '16:30:00', [
-    {'stop':millbraeBart, 'delta_minutes': 80},
-    {'stop':hyattRegencyEmbarcaderoSF, 'delta_minutes': 40}
-])
-
-
-# Day 3 Airport Shuttles
-sfoHeadsign = 'San Francisco International Airport'
-sjcHeadsign = 'Mineta San José International Airport'
-
-TripFromShoreline(sfoRoute, day3, sfoHeadsign, '12:30:00', [
-    {'stop': sfoAirport, 'delta_minutes': 60}
-])
-TripFromShoreline(sfoRoute, day3, sfoHeadsign, '13:30:00', [
-    {'stop': sfoAirport, 'delta_minutes': 60}
-])
-TripFromShoreline(sfoRoute, day3, sfoHeadsign, '14:00:00', [
-    {'stop': sfoAirport, 'delta_minutes': 60}
-])
-TripFromShoreline(sfoRoute, day3, sfoHeadsign, '14:30:00', [
-    {'stop': sfoAirport, 'delta_minutes': 60}
-])
-TripFromShoreline(sfoRoute, day3, sfoHeadsign, '15:00:00', [
-    {'stop': sfoAirport, 'delta_minutes': 60}
-])
-TripFromShoreline(sfoRoute, day3, sfoHeadsign, '15:30:00', [
-    {'stop': sfoAirport, 'delta_minutes': 60}
-])
-TripFromShoreline(sfoRoute, day3, sfoHeadsign, '16:00:00', [
-    {'stop': sfoAirport, 'delta_minutes': 60}
-])
-TripFromShoreline(sfoRoute, day3, sfoHeadsign, '16:30:00', [
-    {'stop': sfoAirport, 'delta_minutes': 60}
-])
-
-TripFromShoreline(sjcRoute, day3, sjcHeadsign, '12:30:00', [
-    {'stop': sjcAirport, 'delta_minutes': 30}
-])
-TripFromShoreline(sjcRoute, day3, sjcHeadsign, '13:30:00', [
-    {'stop': sjcAirport, 'delta_minutes': 30}
-])
-TripFromShoreline(sjcRoute, day3, sjcHeadsign, '14:00:00', [
-    {'stop': sjcAirport, 'delta_minutes': 30}
-])
-TripFromShoreline(sjcRoute, day3, sjcHeadsign, '14:30:00', [
-    {'stop': sjcAirport, 'delta_minutes': 30}
-])
-TripFromShoreline(sjcRoute, day3, sjcHeadsign, '15:00:00', [
-    {'stop': sjcAirport, 'delta_minutes': 30}
-])
-TripFromShoreline(sjcRoute, day3, sjcHeadsign, '15:30:00', [
-    {'stop': sjcAirport, 'delta_minutes': 30}
-])
-TripFromShoreline(sjcRoute, day3, sjcHeadsign, '16:00:00', [
-    {'stop': sjcAirport, 'delta_minutes': 30}
-])
-TripFromShoreline(sjcRoute, day3, sjcHeadsign, '16:30:00', [
-    {'stop': sjcAirport, 'delta_minutes': 30}
-])
-
-# Day 0 Loop services.
-# TODO(brettmorgan): Confirm if this is appropriate
-
-day0LoopTimes = [
-    '06:30:00', '07:00:00', '07:30:00', '08:00:00', '08:30:00', '09:00:00',
-    '09:30:00', '10:00:00', '10:30:00', '11:00:00', '11:30:00', '12:00:00',
-    '12:30:00', '13:00:00', '13:30:00', '14:00:00', '14:30:00', '15:00:00',
-    '15:30:00', '16:00:00', '16:30:00', '17:00:00', '17:30:00', '18:00:00',
-    '18:30:00', '19:00:00'
-]
-
-# Day 0 loop for MTV Caltrain <=> Shoreline Amphitheatre
-MultistopTripsToShorelineAtTimes(mtvCaltrainRoute, day0, 'Mountain View Caltrain Loop', day0LoopTimes, [
-    {'stop': mtvCaltrain, 'delta_minutes': 15},
-    {'stop': shorelineAmphitheatre, 'delta_minutes': 15}
-])
-
-# Day 0 loop for Yellow Route
-MultistopTripsToShorelineAtTimes(yellowRoute, day0, 'Hilton Garden Inn Palo Alto, Sheraton Palo Alto, Westin, and Palo Alto Caltrain Loop', day0LoopTimes, [
-    {'stop': hiltonGardenInnPaloAlto, 'delta_minutes': 15},
-    {'stop': sheratonPaloAlto, 'delta_minutes': 10},
-    {'stop': paloAltoCaltrain, 'delta_minutes': 10},
-    {'stop': shorelineAmphitheatre, 'delta_minutes': 25},
-])
-
-# Day 0 loop for Lime Route
-MultistopTripsToShorelineAtTimes(limeRoute, day0, 'Avatar Hotel & Plaza Suites Loop', day0LoopTimes, [
-    {'stop': avatarHotel, 'delta_minutes': 25},
-    {'stop': plazaSuites, 'delta_minutes': 10},
-    {'stop': shorelineAmphitheatre, 'delta_minutes': 25}
-])
-
-# Day 0 loop for Teal Route
-MultistopTripsToShorelineAtTimes(tealRoute, day0, 'Aloft Sunnyvale & Wild Palms Hotel Loop', day0LoopTimes, [
-    {'stop': aloftSunnyvale, 'delta_minutes': 30},
-    {'stop': wildPalmsHotel, 'delta_minutes': 20},
-    {'stop': shorelineAmphitheatre, 'delta_minutes': 30}
-])
-
-# Day 0 loop for Orange Route
-MultistopTripsToShorelineAtTimes(orangeRoute, day0, 'Hotel Avante & Grand Hotel Loop', day0LoopTimes, [
-    {'stop': towneplace, 'delta_minutes': 15},
-    {'stop': hotelAvante, 'delta_minutes': 15},
-    {'stop': shorelineAmphitheatre, 'delta_minutes': 25}
-])
-
-# Day 0 loop for Indigo Route
-MultistopTripsToShorelineAtTimes(indigoRoute, day0, 'Country Inn & Suites by Carlson Loop', day0LoopTimes, [
-    {'stop': countryInnAndSuites, 'delta_minutes': 20},
-    {'stop': shorelineAmphitheatre, 'delta_minutes': 20}
-])
-
-schedule.Validate()
-schedule.WriteGoogleTransitFeed(options.output)
+            cache.Commit()
+        sys.stderr.write('Build cache: %d blocks reused, %d regenerated\n' % (cache.hits, cache.misses))
+    if validator.HasErrors():
+        sys.exit(1)
+else:
+    schedule = BuildSchedule(schedule_spec.CompileSpec(spec, jobs=options.jobs,
+                                                       frequencies=options.frequencies,
+                                                       travel_times=model))
+    schedule.Validate()
+    schedule.WriteGoogleTransitFeed(options.output)
@@ -0,0 +1,480 @@
+# coding=UTF8
+"""Synthetic GTFS-Realtime replay of a generated feed, for load tests.
+
+RealtimeReplay reads a feed zip or directory (see feed_reader.py) and
+simulates every run of its trips on one service date. A run is a trip, or
+one departure of a trip with frequencies, and each run is simulated
+`copies` times with vehicles of their own. Each vehicle follows its trip's
+shape, or straight lines between its stops, running `delay` seconds behind
+its stop times. The delay starts from a normal draw and then drifts as a
+random walk.
+
+Snapshot() encodes a VehiclePosition and a TripUpdate FeedMessage of every
+vehicle under way, as FULL_DATASET feeds. The protobuf wire format is
+written by hand, so no protobuf package is needed; the field numbers are
+those of gtfs-realtime.proto. The parts of a message that do not change
+between snapshots (trip and vehicle descriptors, stop ids and sequences)
+are encoded once per run, so a snapshot mostly joins byte strings.
+RealtimeServer replays the snapshots on an accelerated clock over HTTP.
+"""
+
+import bisect
+import calendar
+import collections
+import datetime
+import math
+import random
+import struct
+import threading
+import time
+
+import feed_reader
+import feed_shapes
+import gtfs_time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+GTFS_REALTIME_VERSION = '2.0'
+
+# Seconds in a service day.
+DAY = 24 * 3600
+
+# VehiclePosition.VehicleStopStatus values.
+STOPPED_AT = 1
+IN_TRANSIT_TO = 2
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# Protobuf wire types.
+_VARINT = 0
+_FIXED32 = 5
+_LENGTH_DELIMITED = 2
+
+def _Varint(value):
+    "Encode an unsigned varint; negative values as 64-bit two's complement."
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+def _Key(field, wire_type):
+    return _Varint(field << 3 | wire_type)
+
+def _Int(field, value):
+    "Encode an int32, int64, uint32, uint64 or enum field."
+    return _Key(field, _VARINT) + _Varint(int(value))
+
+def _Float(field, value):
+    return _Key(field, _FIXED32) + struct.pack('<f', value)
+
+def _Message(field, encoded):
+    "Encode a submessage, string or bytes field from its encoded bytes."
+    return _Key(field, _LENGTH_DELIMITED) + _Varint(len(encoded)) + encoded
+
+def _String(field, text):
+    return _Message(field, text.encode('utf-8'))
+
+def FeedMessage(timestamp, entities):
+    "Encode a FULL_DATASET FeedMessage from its encoded FeedEntity messages."
+    header = _String(1, GTFS_REALTIME_VERSION) + _Int(2, 0) + _Int(3, timestamp)
+    entity_key = _Key(2, _LENGTH_DELIMITED)
+    return b''.join([_Message(1, header)] +
+                    [entity_key + _Varint(len(entity)) + entity for entity in entities])
+
+def ServiceDayStart(date, timezone):
+    """Return the POSIX time of the times of `date` (YYYYMMDD): noon minus 12
+    hours in `timezone`. Without zoneinfo (before Python 3.9) or its data
+    for `timezone`, times are taken as UTC."""
+    noon = datetime.datetime.strptime(date, '%Y%m%d').replace(hour=12)
+    if ZoneInfo is not None and timezone:
+        try:
+            return int(noon.replace(tzinfo=ZoneInfo(timezone)).timestamp()) - DAY // 2
+        except KeyError:
+            pass
+    return calendar.timegm(noon.timetuple()) - DAY // 2
+
+def _Date(text):
+    return datetime.datetime.strptime(text.strip(), '%Y%m%d').date()
+
+def _Services(feed, date):
+    "Return the service ids of `feed` running on `date` (YYYYMMDD), from either calendar table."
+    day = _Date(date)
+    services = set()
+    if feed.Has('calendar.txt'):
+        for row in feed.ReadDicts('calendar.txt'):
+            if (_Date(row['start_date']) <= day <= _Date(row['end_date'])
+                    and row[WEEKDAYS[day.weekday()]].strip() == '1'):
+                services.add(row['service_id'])
+    if feed.Has('calendar_dates.txt'):
+        for row in feed.ReadDicts('calendar_dates.txt'):
+            if row['date'].strip() == date:
+                if row['exception_type'].strip() == '1':
+                    services.add(row['service_id'])
+                else:
+                    services.discard(row['service_id'])
+    return services
+
+def FirstServiceDate(path):
+    "Return the first date (YYYYMMDD) listed in the calendar of the feed at `path`."
+    with feed_reader.Feed(path) as feed:
+        dates = []
+        if feed.Has('calendar.txt'):
+            dates.extend(row['start_date'].strip() for row in feed.ReadDicts('calendar.txt'))
+        if feed.Has('calendar_dates.txt'):
+            dates.extend(row['date'].strip() for row in feed.ReadDicts('calendar_dates.txt')
+                         if row['exception_type'].strip() == '1')
+    return min(dates) if dates else None
+
+class _Trip(object):
+    "The stop times and path of a trip, shared by its runs."
+
+    def __init__(self, trip_id, route_id, sequences, stop_ids, times, stop_distances, points,
+                 cumulative):
+        self.trip_id = trip_id
+        self.route_id = route_id
+        self.times = times
+        self.stop_distances = stop_distances
+        self.points = points
+        self.cumulative = cumulative
+        # The stop_sequence of each stop in stop_times.txt, increasing but
+        # not necessarily consecutive.
+        self.sequences = sequences
+        self.stop_ids = stop_ids
+        # Per stop, the encoded current_stop_sequence and stop_id of a
+        # VehiclePosition, and the stop_sequence and stop_id of a StopTimeUpdate.
+        self.position_stops = [_Int(3, sequence) + _String(7, stop)
+                               for sequence, stop in zip(sequences, stop_ids)]
+        self.update_stops = [_Int(1, sequence) + _String(4, stop)
+                             for sequence, stop in zip(sequences, stop_ids)]
+
+class _Run(object):
+    """One vehicle running a trip from `start` on `start_date`, with its
+    stop times `shift` seconds from the date's: its encoded fixed parts and
+    its state."""
+
+    def __init__(self, trip, shift, start, start_date, entity_id, vehicle_id, label, delay):
+        self.trip = trip
+        # Seconds to add to the trip's stop times.
+        self.shift = shift
+        self.start = trip.times[0] + shift
+        self.end = trip.times[-1] + shift
+        self.delay = delay
+        self.stop = 0
+        self.segment = 0
+        descriptor = (_String(1, trip.trip_id) +
+                      _String(2, gtfs_time.FormatTime(start)) +
+                      _String(3, start_date) + _String(5, trip.route_id))
+        vehicle = _String(1, vehicle_id) + _String(2, label)
+        self.position_entity_id = _String(1, 'vehicle:' + entity_id)
+        self.update_entity_id = _String(1, 'trip:' + entity_id)
+        self.trip_descriptor = _Message(1, descriptor)
+        self.position_vehicle = _Message(8, vehicle)
+        self.update_vehicle = _Message(3, vehicle)
+
+class RealtimeReplay(object):
+    """Simulates the vehicles of the feed at `path` on `date` (YYYYMMDD).
+
+    Every run is simulated `copies` times. Delays start from a normal draw
+    of mean `delay_mean` and deviation `delay_sigma` seconds, and drift by
+    `delay_sigma` seconds per simulated hour.
+    """
+
+    def __init__(self, path, date, copies=1, delay_mean=0.0, delay_sigma=0.0, seed=0):
+        self.date = date
+        self.delay_mean = delay_mean
+        self.delay_sigma = delay_sigma
+        self._random = random.Random(seed)
+        self.runs = []
+        with feed_reader.Feed(path) as feed:
+            self._Load(feed, date, copies)
+        self.runs.sort(key=lambda run: run.start + run.delay)
+        self._starts = [run.start + run.delay for run in self.runs]
+        self._next = 0
+        self._active = []
+        self._time = None
+
+    def _Load(self, feed, date, copies):
+        agency = next(iter(feed.ReadDicts('agency.txt')), {})
+        self.day_start = ServiceDayStart(date, agency.get('agency_timezone', '').strip())
+        previous = (_Date(date) - datetime.timedelta(days=1)).strftime('%Y%m%d')
+        shifts_by_service = collections.defaultdict(list)
+        for service in _Services(feed, date):
+            shifts_by_service[service].append((0, date))
+        for service in _Services(feed, previous):
+            shifts_by_service[service].append((-DAY, previous))
+        trips = {}
+        for row in feed.ReadDicts('trips.txt'):
+            if row['service_id'] in shifts_by_service:
+                trips[row['trip_id']] = row
+        stops = dict((row['stop_id'], (float(row['stop_lat']), float(row['stop_lon'])))
+                     for row in feed.ReadDicts('stops.txt'))
+        routes = dict((row['route_id'], row.get('route_short_name') or row.get('route_long_name')
+                       or row['route_id']) for row in feed.ReadDicts('routes.txt'))
+        frequencies = collections.defaultdict(list)
+        if feed.Has('frequencies.txt'):
+            for row in feed.ReadDicts('frequencies.txt'):
+                if row['trip_id'] in trips:
+                    frequencies[row['trip_id']].extend(range(
+                        gtfs_time.ParseTime(row['start_time']),
+                        gtfs_time.ParseTime(row['end_time']), int(row['headway_secs'])))
+        stop_times = collections.defaultdict(list)
+        for row in feed.ReadDicts('stop_times.txt'):
+            if row['trip_id'] in trips:
+                distance = row.get('shape_dist_traveled', '').strip()
+                stop_times[row['trip_id']].append((
+                    int(row['stop_sequence']), gtfs_time.ParseTime(row['arrival_time']),
+                    row['stop_id'], float(distance) if distance else None))
+        shape_ids = set(row.get('shape_id') for row in trips.values()) - set([None, ''])
+        shapes = collections.defaultdict(list)
+        if shape_ids and feed.Has('shapes.txt'):
+            for row in feed.ReadDicts('shapes.txt'):
+                if row['shape_id'] in shape_ids:
+                    distance = row.get('shape_dist_traveled', '').strip()
+                    shapes[row['shape_id']].append((
+                        int(row['shape_pt_sequence']), float(row['shape_pt_lat']),
+                        float(row['shape_pt_lon']), float(distance) if distance else None))
+        for trip_id, row in trips.items():
+            rows = sorted(stop_times.get(trip_id, []))
+            if len(rows) < 2:
+                continue
+            sequences = [sequence for sequence, _, _, _ in rows]
+            stop_ids = [stop for _, _, stop, _ in rows]
+            times = [time for _, time, _, _ in rows]
+            shape = sorted(shapes.get(row.get('shape_id'), []))
+            if len(shape) > 1 and all(distance is not None for _, _, _, distance in rows) and \
+                    all(distance is not None for _, _, _, distance in shape):
+                points = [(lat, lng) for _, lat, lng, _ in shape]
+                cumulative = [distance for _, _, _, distance in shape]
+                stop_distances = [distance for _, _, _, distance in rows]
+            else:
+                points = [stops[stop] for stop in stop_ids]
+                cumulative = stop_distances = feed_shapes.Cumulative(points)
+            trip = _Trip(trip_id, row['route_id'], sequences, stop_ids, times, stop_distances,
+                         points, cumulative)
+            label = routes.get(row['route_id'], row['route_id'])
+            block = row.get('block_id', '').strip()
+            for shift, start_date in shifts_by_service[row['service_id']]:
+                for start in frequencies.get(trip_id, [times[0]]):
+                    offset = start - times[0] + shift
+                    if times[-1] + offset < 0:
+                        continue
+                    run_id = '%s@%s' % (trip_id, gtfs_time.FormatTime(start))
+                    if shift:
+                        run_id += '-' + start_date
+                    for copy in range(copies):
+                        suffix = '#%d' % (copy + 1) if copies > 1 else ''
+                        vehicle_id = (block or run_id) + suffix
+                        self.runs.append(_Run(trip, offset, start, start_date, run_id + suffix,
+                                              vehicle_id, label, self._InitialDelay()))
+
+    def _InitialDelay(self):
+        if not self.delay_sigma:
+            return self.delay_mean
+        return self._random.gauss(self.delay_mean, self.delay_sigma)
+
+    def FirstDeparture(self):
+        "Return the earliest start of a run, in seconds since midnight of the date."
+        return min([run.start for run in self.runs] or [0])
+
+    def _Advance(self, now):
+        "Bring the active runs and their delays up to `now`."
+        elapsed = now - self._time if self._time is not None else 0
+        self._time = now
+        # A random walk with a deviation of delay_sigma per simulated hour.
+        drift = self.delay_sigma * math.sqrt(abs(elapsed) / 3600.0) if self.delay_sigma else 0
+        if elapsed < 0:
+            self._next = bisect.bisect_right(self._starts, now)
+            self._active = [run for run in self.runs[:self._next]
+                            if run.start + run.delay <= now <= run.end + run.delay]
+            for run in self._active:
+                run.stop = run.segment = 0
+        gauss = self._random.gauss
+        active = []
+        for run in self._active:
+            if drift:
+                run.delay += gauss(0, drift)
+            if now - run.delay <= run.end:
+                active.append(run)
+        while self._next < len(self.runs) and self._starts[self._next] <= now:
+            run = self.runs[self._next]
+            self._next += 1
+            if now - run.delay <= run.end:
+                active.append(run)
+        self._active = active
+
+    def _Locate(self, run, scheduled):
+        """Move `run` to `scheduled` seconds on its trip's timetable; return
+        (status, stop index, lat, lng, bearing, speed)."""
+        trip = run.trip
+        scheduled = min(max(scheduled, run.start), run.end)
+        stop, last = run.stop, len(trip.times) - 1
+        shift = run.shift
+        while stop > 0 and trip.times[stop] + shift > scheduled:
+            stop -= 1
+        while stop < last - 1 and trip.times[stop + 1] + shift <= scheduled:
+            stop += 1
+        run.stop = stop
+        begin, end = trip.times[stop] + shift, trip.times[stop + 1] + shift
+        if scheduled >= end and stop + 1 == last:
+            stop, fraction = last, 1.0
+        else:
+            fraction = float(scheduled - begin) / (end - begin) if end > begin else 0.0
+        low = trip.stop_distances[min(stop, last - 1)]
+        high = trip.stop_distances[min(stop, last - 1) + 1]
+        distance = low + fraction * (high - low)
+        cumulative, points = trip.cumulative, trip.points
+        segment, last_segment = run.segment, len(points) - 2
+        while segment > 0 and cumulative[segment] > distance:
+            segment -= 1
+        while segment < last_segment and cumulative[segment + 1] <= distance:
+            segment += 1
+        run.segment = segment
+        length = cumulative[segment + 1] - cumulative[segment]
+        along = min(1.0, max(0.0, (distance - cumulative[segment]) / length if length > 0 else 0.0))
+        (lat1, lng1), (lat2, lng2) = points[segment], points[segment + 1]
+        lat, lng = lat1 + (lat2 - lat1) * along, lng1 + (lng2 - lng1) * along
+        bearing = math.degrees(math.atan2((lng2 - lng1) * math.cos(math.radians(lat1)),
+                                          lat2 - lat1)) % 360
+        if fraction <= 0.0 or stop == last:
+            return STOPPED_AT, stop, lat, lng, bearing, 0.0
+        speed = (high - low) / (end - begin) if end > begin else 0.0
+        return IN_TRANSIT_TO, stop + 1, lat, lng, bearing, speed
+
+    def Snapshot(self, now):
+        """Return (vehicle positions, trip updates, vehicles) at `now`
+        seconds since midnight of the date: two encoded FeedMessages and
+        the number of vehicles under way in each."""
+        self._Advance(now)
+        timestamp = self.day_start + int(now)
+        timestamp_field = _Int(5, timestamp)
+        update_timestamp = _Int(4, timestamp)
+        positions, updates = [], []
+        for run in self._active:
+            scheduled = now - run.delay
+            status, stop, lat, lng, bearing, speed = self._Locate(run, scheduled)
+            trip = run.trip
+            position = (_Float(1, lat) + _Float(2, lng) + _Float(3, bearing) +
+                        _Float(5, speed))
+            vehicle = b''.join([run.trip_descriptor, _Message(2, position),
+                                trip.position_stops[stop], _Int(4, status), timestamp_field,
+                                run.position_vehicle])
+            positions.append(run.position_entity_id + _Message(4, vehicle))
+            delay = int(round(run.delay))
+            base = self.day_start + run.shift + delay
+            stop_updates = [
+                _Message(2, trip.update_stops[i] +
+                         _Message(2, _Int(1, delay) + _Int(2, base + trip.times[i])))
+                for i in range(stop, len(trip.times))]
+            update = b''.join([run.trip_descriptor] + stop_updates +
+                              [run.update_vehicle, update_timestamp, _Int(5, delay)])
+            updates.append(run.update_entity_id + _Message(3, update))
+        return FeedMessage(timestamp, positions), FeedMessage(timestamp, updates), len(positions)
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+# Paths served, and which of the Snapshot() feeds each returns.
+PATHS = {'/vehicle_positions': 0, '/vehicle_positions.pb': 0,
+         '/trip_updates': 1, '/trip_updates.pb': 1}
+
+class RealtimeServer(object):
+    """Serves the latest snapshot of a RealtimeReplay over HTTP.
+
+    The simulated clock starts at `start` seconds since midnight and runs
+    `speed` times faster than the wall clock; a new snapshot is encoded
+    every `interval` wall seconds, and every request in between gets the
+    same bytes.
+    """
+
+    def __init__(self, replay, start, speed=1.0, interval=1.0, host='127.0.0.1', port=8080):
+        self.replay = replay
+        self.start = start
+        self.speed = speed
+        self.interval = interval
+        # (vehicle positions, trip updates, vehicles) of the latest snapshot.
+        self.feeds = (FeedMessage(replay.day_start + int(start), []),) * 2 + (0,)
+        self.counts = collections.Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                feed = PATHS.get(self.path.split('?')[0])
+                if feed is None:
+                    self.send_error(404)
+                    return
+                feeds = server.feeds
+                body = feeds[feed]
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-protobuf')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.counts['responses'] += 1
+                    server.counts['served bytes'] += len(body)
+                    server.counts['served messages'] += feeds[2]
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http = _Server((host, port), Handler)
+
+    def Now(self, started):
+        "Return the simulated time for a run started at wall time `started`."
+        return self.start + (time.time() - started) * self.speed
+
+    def _Simulate(self, started, end):
+        while not self._stopped.is_set():
+            now = self.Now(started)
+            positions, updates, vehicles = self.replay.Snapshot(now)
+            self.feeds = (positions, updates, vehicles)
+            with self._lock:
+                self.counts['snapshots'] += 1
+                self.counts['encoded messages'] += 2 * vehicles
+                self.counts['encoded bytes'] += len(positions) + len(updates)
+            if end is not None and now >= end:
+                self._stopped.set()
+                break
+            self._stopped.wait(self.interval)
+
+    def Serve(self, end=None, report=None, report_seconds=10.0):
+        """Simulate and serve until the simulated clock passes `end` (or
+        forever). Every `report_seconds` calls `report` with the simulated
+        time and the counts of the period, per second."""
+        started = time.time()
+        threads = [threading.Thread(target=self._Simulate, args=(started, end)),
+                   threading.Thread(target=self.http.serve_forever)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            last, last_counts = time.time(), collections.Counter()
+            while not self._stopped.wait(report_seconds):
+                if report is not None:
+                    with self._lock:
+                        counts = collections.Counter(self.counts)
+                    now = time.time()
+                    report(self.Now(started), self.feeds[2], dict(
+                        (key, (counts[key] - last_counts[key]) / (now - last)) for key in counts))
+                    last, last_counts = now, counts
+        finally:
+            self._stopped.set()
+            self.http.shutdown()
+            self.http.server_close()
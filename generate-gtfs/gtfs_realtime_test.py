@@ -0,0 +1,240 @@
+# coding=UTF8
+"""Tests of gtfs_realtime: snapshots decoded by the field numbers of gtfs-realtime.proto."""
+
+import collections
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import feed_reader
+import feed_writer
+import gtfs_realtime
+import gtfs_time
+import schedule_spec
+
+SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'io2017.json')
+DATE = '20170517'
+
+# The fields of the gtfs-realtime.proto messages written:
+# message -> field number -> (name, type, repeated), where type is a
+# message name or one of 'string', 'varint', 'int' (signed) and 'float'.
+PROTO = {
+    'FeedMessage': {1: ('header', 'FeedHeader', False), 2: ('entity', 'FeedEntity', True)},
+    'FeedHeader': {1: ('gtfs_realtime_version', 'string', False),
+                   2: ('incrementality', 'varint', False), 3: ('timestamp', 'varint', False)},
+    'FeedEntity': {1: ('id', 'string', False), 3: ('trip_update', 'TripUpdate', False),
+                   4: ('vehicle', 'VehiclePosition', False)},
+    'TripUpdate': {1: ('trip', 'TripDescriptor', False),
+                   2: ('stop_time_update', 'StopTimeUpdate', True),
+                   3: ('vehicle', 'VehicleDescriptor', False), 4: ('timestamp', 'varint', False),
+                   5: ('delay', 'int', False)},
+    'StopTimeUpdate': {1: ('stop_sequence', 'varint', False),
+                       2: ('arrival', 'StopTimeEvent', False), 4: ('stop_id', 'string', False)},
+    'StopTimeEvent': {1: ('delay', 'int', False), 2: ('time', 'int', False)},
+    'VehiclePosition': {1: ('trip', 'TripDescriptor', False), 2: ('position', 'Position', False),
+                        3: ('current_stop_sequence', 'varint', False),
+                        4: ('current_status', 'varint', False), 5: ('timestamp', 'varint', False),
+                        7: ('stop_id', 'string', False),
+                        8: ('vehicle', 'VehicleDescriptor', False)},
+    'Position': {1: ('latitude', 'float', False), 2: ('longitude', 'float', False),
+                 3: ('bearing', 'float', False), 5: ('speed', 'float', False)},
+    'TripDescriptor': {1: ('trip_id', 'string', False), 2: ('start_time', 'string', False),
+                       3: ('start_date', 'string', False), 5: ('route_id', 'string', False)},
+    'VehicleDescriptor': {1: ('id', 'string', False), 2: ('label', 'string', False)},
+}
+
+# The wire type each field type must be written with.
+WIRE_TYPES = {'varint': 0, 'int': 0, 'float': 5, 'string': 2}
+
+def _Varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = bytearray(data[offset:offset + 1])[0]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, offset
+
+def Decode(data, message):
+    "Decode the protobuf `data` of `message` (a PROTO name) into a dict by field name."
+    fields = PROTO[message]
+    decoded = collections.defaultdict(list)
+    offset = 0
+    while offset < len(data):
+        key, offset = _Varint(data, offset)
+        number, wire_type = key >> 3, key & 7
+        if number not in fields:
+            raise AssertionError('unexpected field %d of %s' % (number, message))
+        name, field_type, _ = fields[number]
+        if wire_type != WIRE_TYPES.get(field_type, 2):
+            raise AssertionError('%s.%s has wire type %d' % (message, name, wire_type))
+        if wire_type == 0:
+            value, offset = _Varint(data, offset)
+            if field_type == 'int' and value >= 1 << 63:
+                value -= 1 << 64
+        elif wire_type == 5:
+            (value,) = struct.unpack('<f', data[offset:offset + 4])
+            offset += 4
+        else:
+            length, offset = _Varint(data, offset)
+            value = data[offset:offset + length]
+            offset += length
+            if field_type == 'string':
+                value = value.decode('utf-8')
+            else:
+                value = Decode(value, field_type)
+        decoded[name].append(value)
+    return dict((fields[number][0], values if fields[number][2] else values[0])
+                for number in fields for values in [decoded.get(fields[number][0])]
+                if values is not None)
+
+class RealtimeReplayTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp(prefix='gtfs-realtime-test-')
+        cls.zip_path = os.path.join(cls.directory, 'feed.zip')
+        with feed_writer.FeedWriter(cls.zip_path) as writer:
+            compiled = schedule_spec.CompileSpec(
+                schedule_spec.LoadSpec(SPEC),
+                on_block=lambda block: feed_writer.WriteTrips(writer, block))
+            feed_writer.WriteMetadata(writer, compiled)
+        with feed_reader.Feed(cls.zip_path) as feed:
+            services = set(row['service_id'] for row in feed.ReadDicts('calendar_dates.txt')
+                           if row['date'] == DATE)
+            cls.trips = dict((row['trip_id'], row) for row in feed.ReadDicts('trips.txt')
+                             if row['service_id'] in services)
+            cls.stops = dict((row['stop_id'], row) for row in feed.ReadDicts('stops.txt'))
+            cls.stop_times = collections.defaultdict(list)
+            for row in feed.ReadDicts('stop_times.txt'):
+                if row['trip_id'] in cls.trips:
+                    cls.stop_times[row['trip_id']].append(
+                        (int(row['stop_sequence']), gtfs_time.ParseTime(row['arrival_time']),
+                         row['stop_id']))
+        for rows in cls.stop_times.values():
+            rows.sort()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def _Snapshot(self, delay, now):
+        replay = gtfs_realtime.RealtimeReplay(self.zip_path, DATE, delay_mean=delay)
+        positions, updates, vehicles = replay.Snapshot(now)
+        return replay, Decode(positions, 'FeedMessage'), Decode(updates, 'FeedMessage'), vehicles
+
+    def testHeader(self):
+        replay, positions, updates, _ = self._Snapshot(0, 8 * 3600)
+        for message in (positions, updates):
+            self.assertEqual(message['header'], {
+                'gtfs_realtime_version': '2.0', 'incrementality': 0,
+                'timestamp': replay.day_start + 8 * 3600})
+        self.assertEqual(replay.day_start, gtfs_realtime.ServiceDayStart(DATE,
+                                                                         'America/Los_Angeles'))
+
+    def testVehiclesUnderWay(self):
+        for delay in (0, 150, -150):
+            now = 8 * 3600 + 600
+            replay, positions, updates, vehicles = self._Snapshot(delay, now)
+            expected = sorted(trip_id for trip_id, rows in self.stop_times.items()
+                              if rows[0][1] + delay <= now <= rows[-1][1] + delay)
+            self.assertTrue(expected)
+            self.assertEqual(vehicles, len(expected))
+            self.assertEqual(sorted(entity['vehicle']['trip']['trip_id']
+                                    for entity in positions['entity']), expected)
+            self.assertEqual(sorted(entity['trip_update']['trip']['trip_id']
+                                    for entity in updates['entity']), expected)
+
+    def testVehiclePositions(self):
+        replay, positions, _, _ = self._Snapshot(0, 8 * 3600 + 600)
+        for entity in positions['entity']:
+            vehicle = entity['vehicle']
+            trip = vehicle['trip']
+            rows = self.stop_times[trip['trip_id']]
+            self.assertEqual(entity['id'], 'vehicle:%s@%s' % (
+                trip['trip_id'], gtfs_time.FormatTime(rows[0][1])))
+            self.assertEqual(trip['start_date'], DATE)
+            self.assertEqual(trip['start_time'], gtfs_time.FormatTime(rows[0][1]))
+            self.assertEqual(trip['route_id'], self.trips[trip['trip_id']]['route_id'])
+            self.assertEqual(vehicle['timestamp'], replay.day_start + 8 * 3600 + 600)
+            (stop_id,) = [stop for sequence, _, stop in rows
+                          if sequence == vehicle['current_stop_sequence']]
+            self.assertEqual(vehicle['stop_id'], stop_id)
+            self.assertIn(vehicle['current_status'],
+                          (gtfs_realtime.STOPPED_AT, gtfs_realtime.IN_TRANSIT_TO))
+            lats = [float(self.stops[stop]['stop_lat']) for _, _, stop in rows]
+            lngs = [float(self.stops[stop]['stop_lon']) for _, _, stop in rows]
+            position = vehicle['position']
+            self.assertTrue(min(lats) - 1e-4 <= position['latitude'] <= max(lats) + 1e-4)
+            self.assertTrue(min(lngs) - 1e-4 <= position['longitude'] <= max(lngs) + 1e-4)
+            self.assertTrue(0 <= position['bearing'] < 360)
+            self.assertTrue(position['speed'] >= 0)
+
+    def testTripUpdates(self):
+        delay = -150
+        replay, _, updates, _ = self._Snapshot(delay, 8 * 3600 + 600)
+        for entity in updates['entity']:
+            update = entity['trip_update']
+            rows = self.stop_times[update['trip']['trip_id']]
+            self.assertEqual(update['delay'], delay)
+            stop_updates = update['stop_time_update']
+            self.assertEqual([(stop_update['stop_sequence'], stop_update['stop_id'],
+                               stop_update['arrival'])
+                              for stop_update in stop_updates],
+                             [(sequence, stop, {'delay': delay,
+                                                'time': replay.day_start + time + delay})
+                              for sequence, time, stop in rows[-len(stop_updates):]])
+            self.assertEqual(update['vehicle']['id'],
+                             '%s@%s' % (update['trip']['trip_id'],
+                                        gtfs_time.FormatTime(rows[0][1])))
+
+class StopSequenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='gtfs-realtime-test-')
+        feed_writer.WriteTable(os.path.join(self.directory, 'agency.txt'),
+                               ('agency_name', 'agency_url', 'agency_timezone'),
+                               [('Caltrain', 'https://www.caltrain.com', 'America/Los_Angeles')])
+        feed_writer.WriteTable(os.path.join(self.directory, 'stops.txt'),
+                               ('stop_id', 'stop_name', 'stop_lat', 'stop_lon'),
+                               [('pa', 'Palo Alto', '37.443', '-122.165'),
+                                ('mv', 'Mountain View', '37.394', '-122.076'),
+                                ('sj', 'San Jose', '37.330', '-121.903')])
+        feed_writer.WriteTable(os.path.join(self.directory, 'routes.txt'),
+                               ('route_id', 'route_short_name', 'route_type'),
+                               [('local', 'Local', '2')])
+        feed_writer.WriteTable(os.path.join(self.directory, 'calendar_dates.txt'),
+                               ('service_id', 'date', 'exception_type'),
+                               [('weekday', DATE, '1')])
+        feed_writer.WriteTable(os.path.join(self.directory, 'trips.txt'),
+                               ('route_id', 'service_id', 'trip_id'),
+                               [('local', 'weekday', '101')])
+        # Sequences with gaps, listed out of order.
+        feed_writer.WriteTable(os.path.join(self.directory, 'stop_times.txt'),
+                               ('trip_id', 'arrival_time', 'departure_time', 'stop_id',
+                                'stop_sequence'),
+                               [('101', '08:20:00', '08:20:00', 'mv', '20'),
+                                ('101', '08:00:00', '08:00:00', 'pa', '10'),
+                                ('101', '08:45:00', '08:45:00', 'sj', '30')])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testFeedSequences(self):
+        replay = gtfs_realtime.RealtimeReplay(self.directory, DATE)
+        positions, updates, vehicles = replay.Snapshot(8 * 3600 + 600)
+        self.assertEqual(vehicles, 1)
+        (entity,) = Decode(positions, 'FeedMessage')['entity']
+        vehicle = entity['vehicle']
+        self.assertEqual((vehicle['current_stop_sequence'], vehicle['stop_id'],
+                          vehicle['current_status']), (20, 'mv', gtfs_realtime.IN_TRANSIT_TO))
+        (entity,) = Decode(updates, 'FeedMessage')['entity']
+        self.assertEqual([(stop_update['stop_sequence'], stop_update['stop_id'])
+                          for stop_update in entity['trip_update']['stop_time_update']],
+                         [(20, 'mv'), (30, 'sj')])
+
+if __name__ == '__main__':
+    unittest.main()
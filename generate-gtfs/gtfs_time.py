@@ -0,0 +1,41 @@
+# coding=UTF8
+"""Schedule times as integer seconds since service-day midnight.
+
+GTFS times are "noon minus 12h" based and may run past 24:00:00 for trips
+that finish after midnight, so they cannot be modelled with `datetime.time`.
+Times are parsed once into plain ints, all arithmetic is integer addition, and
+they are only formatted back into 'HH:MM:SS' when a feed is written.
+"""
+
+_parse_cache = {}
+
+def ParseTime(value):
+    "Return `value` ('HH:MM:SS' or 'H:MM:SS', possibly >= 24h) as seconds since midnight."
+    if isinstance(value, int):
+        return value
+    seconds = _parse_cache.get(value)
+    if seconds is None:
+        parts = value.strip().split(':')
+        if len(parts) != 3:
+            raise ValueError('Bad GTFS time %r, expected HH:MM:SS' % value)
+        hours, minutes, secs = [int(part) for part in parts]
+        if hours < 0 or not 0 <= minutes < 60 or not 0 <= secs < 60:
+            raise ValueError('Bad GTFS time %r' % value)
+        seconds = _parse_cache[value] = hours * 3600 + minutes * 60 + secs
+    return seconds
+
+def ParseTimes(values):
+    "Parse a list of schedule times, e.g. `fiveThirtyToTenThirtyEveryHalfHour`."
+    return [ParseTime(value) for value in values]
+
+def FormatTime(seconds):
+    "Format `seconds` as 'HH:MM:SS'; hours are not wrapped at 24."
+    if seconds < 0:
+        raise ValueError('Negative GTFS time %d' % seconds)
+    minutes, secs = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%02d:%02d:%02d' % (hours, minutes, secs)
+
+def Minutes(delta_minutes):
+    "Convert a `delta_minutes` offset into seconds."
+    return int(round(delta_minutes * 60))
@@ -0,0 +1,477 @@
+# coding=UTF8
+"""Journey planning with transfers over a CompiledSchedule or a GTFS feed.
+
+The planner is RAPTOR (Delling, Pajor and Werneck, "Round-Based Public
+Transit Routing"): round k finds the earliest arrival at every stop with k
+trips, by scanning each pattern once from the first stop whose arrival
+improved in round k - 1, then walking from the stops reached. There is no
+priority queue and no graph, only arrays.
+
+Timetable lays out the trips running on one date for it:
+
+  - trips with the same stops, pickup and drop off types form a pattern,
+    split further so that no trip of a pattern overtakes another, and each
+    pattern's trips are sorted by departure;
+  - the stop times of pattern p are one trip-major block of `times`: trip
+    t at position i is times[time_offsets[p] + t * width + i], so the first
+    trip to board at position i is a binary search down a column;
+  - stop_patterns and stop_positions list the (pattern, position) pairs
+    serving each stop, and footpath_* the stops within walking distance.
+
+Trips with frequencies have one run per departure, and the previous day's
+trips still running after midnight are included with their times shifted
+back by a day.
+
+JourneyPlanner.EarliestArrival() runs RAPTOR once from a departure time.
+Journeys leave as late as they can: a walk to the first trip ends when
+that trip departs.
+JourneyPlanner.Profile() finds every journey over a window of departure times
+that no other journey beats, leaving no earlier and arriving no later
+with no more transfers. It does this with rRAPTOR: one run per departure
+from the origin, latest first, each run starting from the labels of the
+previous one.
+
+LoadFeed() reads a GTFS feed into a CompiledSchedule to plan over, such as
+the output of generate-gtfs.py with feeds merged in by --merge, so that
+journeys can change to their trips at shared stops.
+"""
+
+import collections
+import datetime
+from array import array
+
+import feed_merge
+import feed_reader
+import gtfs_time
+import schedule_spec
+import stop_index
+
+# Seconds in a service day.
+DAY = 24 * 3600
+
+# Walking speed for footpaths, in meters per second.
+WALK_SPEED = 1.25
+
+# Walking distance over straight-line distance.
+WALK_DETOUR_FACTOR = 1.3
+
+INFINITY = float('inf')
+
+Leg = collections.namedtuple('Leg', ['from_stop', 'to_stop', 'departure', 'arrival',
+                                     'trip_id', 'route'])
+Journey = collections.namedtuple('Journey', ['departure', 'arrival', 'transfers', 'legs'])
+
+def _PreviousDay(date):
+    day = datetime.datetime.strptime(date, '%Y%m%d') - datetime.timedelta(days=1)
+    return day.strftime('%Y%m%d')
+
+def _FeedDate(text):
+    return datetime.datetime.strptime(text.strip(), '%Y%m%d').date()
+
+def _ServiceDates(feed):
+    "Return {service id: set of YYYYMMDD dates} from calendar.txt and calendar_dates.txt."
+    dates = collections.OrderedDict()
+    if feed.Has('calendar.txt'):
+        for row in feed.ReadDicts('calendar.txt'):
+            days = dates.setdefault(row['service_id'], set())
+            start, end = _FeedDate(row['start_date']), _FeedDate(row['end_date'])
+            weekdays = [row[day].strip() == '1' for day in feed_merge.WEEKDAYS]
+            for offset in range((end - start).days + 1):
+                day = start + datetime.timedelta(days=offset)
+                if weekdays[day.weekday()]:
+                    days.add(day.strftime('%Y%m%d'))
+    if feed.Has('calendar_dates.txt'):
+        for row in feed.ReadDicts('calendar_dates.txt'):
+            days = dates.setdefault(row['service_id'], set())
+            if row['exception_type'].strip() == '1':
+                days.add(row['date'].strip())
+            else:
+                days.discard(row['date'].strip())
+    return dates
+
+def _Interpolate(times):
+    "Fill in the None `times` of stops without one, evenly between the stops around them."
+    timed = [i for i, time in enumerate(times) if time is not None]
+    if not timed or timed[0] != 0 or timed[-1] != len(times) - 1:
+        raise ValueError('the first and last stop need a time')
+    for a, b in zip(timed, timed[1:]):
+        for i in range(a + 1, b):
+            times[i] = times[a] + (times[b] - times[a]) * (i - a) // (b - a)
+    return times
+
+def LoadFeed(path):
+    """Return the GTFS feed at `path` (a zip or directory) as a CompiledSchedule.
+
+    Stops, routes and service periods are keyed by their feed ids, and trips
+    keep their trip_id. A trip is taken to arrive at and leave a stop at its
+    departure_time, and stop times without one are interpolated. Stations
+    (location_type 1) are left out, and so are trips of services without
+    any date. Raises ValueError for stop times that cannot be planned over.
+    """
+    with feed_reader.Feed(path) as feed:
+        agencies = list(feed.ReadDicts('agency.txt'))
+        agency = {'name': agencies[0]['agency_name'], 'url': agencies[0]['agency_url'],
+                  'timezone': agencies[0]['agency_timezone'],
+                  'lang': agencies[0].get('agency_lang', '')} if agencies else {}
+        stops = [{'id': row['stop_id'], 'name': row['stop_name'],
+                  'lat': float(row['stop_lat']), 'lng': float(row['stop_lon'])}
+                 for row in feed.ReadDicts('stops.txt')
+                 if row.get('location_type', '').strip() in ('', '0')]
+        routes = [{'id': row['route_id'], 'short_name': row.get('route_short_name', ''),
+                   'long_name': row.get('route_long_name', ''), 'route_type': row['route_type']}
+                  for row in feed.ReadDicts('routes.txt')]
+        service_periods = [{'id': service, 'dates': sorted(days)}
+                           for service, days in _ServiceDates(feed).items() if days]
+        compiled = schedule_spec.CompiledSchedule(agency, stops, routes, service_periods)
+        # trip_id -> [(stop_sequence, stop index, time or None, pickup, drop off)].
+        stop_times = collections.defaultdict(list)
+        for row in feed.ReadDicts('stop_times.txt'):
+            stop = compiled.stop_index.get(row['stop_id'])
+            if stop is None:
+                raise ValueError('%s: trip %s stops at unknown stop %s' % (
+                    path, row['trip_id'], row['stop_id']))
+            time = (row.get('departure_time') or row.get('arrival_time') or '').strip()
+            stop_times[row['trip_id']].append((
+                int(row['stop_sequence']), stop, gtfs_time.ParseTime(time) if time else None,
+                int(row.get('pickup_type') or 0), int(row.get('drop_off_type') or 0)))
+        trip_index = {}
+        for row in feed.ReadDicts('trips.txt'):
+            service = compiled.service_index.get(row['service_id'])
+            rows = sorted(stop_times.pop(row['trip_id'], []))
+            if service is None or not rows:
+                continue
+            try:
+                times = _Interpolate([time for _, _, time, _, _ in rows])
+            except ValueError as e:
+                raise ValueError('%s: trip %s: %s' % (path, row['trip_id'], e))
+            trip_index[row['trip_id']] = compiled.NumTrips()
+            compiled.AddTrips(compiled.route_index[row['route_id']], service,
+                              row.get('trip_headsign', ''), [stop for _, stop, _, _, _ in rows],
+                              times, [pickup for _, _, _, pickup, _ in rows],
+                              [drop_off for _, _, _, _, drop_off in rows])
+            compiled.trip_ids.append(row['trip_id'])
+        if feed.Has('frequencies.txt'):
+            for row in feed.ReadDicts('frequencies.txt'):
+                trip = trip_index.get(row['trip_id'])
+                if trip is not None:
+                    compiled.AddFrequency(trip, gtfs_time.ParseTime(row['start_time']),
+                                          gtfs_time.ParseTime(row['end_time']),
+                                          int(row['headway_secs']))
+    return compiled
+
+def _Overtakes(earlier, later):
+    "Whether a trip with stop times `later` arrives somewhere before one with `earlier`."
+    return any(b < a for a, b in zip(earlier, later))
+
+class Timetable(object):
+    """The RAPTOR arrays of the trips of a CompiledSchedule running on `date`
+    (YYYYMMDD), with footpaths between stops within `walk_meters`."""
+
+    def __init__(self, compiled, date, walk_meters=0):
+        self.compiled = compiled
+        self.date = date
+        today = set(i for i, period in enumerate(compiled.service_periods)
+                    if date in period['dates'])
+        previous = _PreviousDay(date)
+        yesterday = set(i for i, period in enumerate(compiled.service_periods)
+                        if previous in period['dates'])
+        starts = collections.defaultdict(list)
+        for trip, start, end, headway in zip(compiled.freq_trip, compiled.freq_start,
+                                             compiled.freq_end, compiled.freq_headway):
+            starts[trip].extend(range(start, end, headway))
+        # (stops, pickups, drop_offs) -> [(times, trip)].
+        groups = collections.OrderedDict()
+        for trip in range(compiled.NumTrips()):
+            service = compiled.trip_service[trip]
+            shifts = ([0] if service in today else []) + ([-DAY] if service in yesterday else [])
+            if not shifts:
+                continue
+            begin, end = compiled.trip_offsets[trip], compiled.trip_offsets[trip + 1]
+            if end - begin < 2:
+                continue
+            key = (tuple(compiled.st_stop[begin:end]), tuple(compiled.st_pickup[begin:end]),
+                   tuple(compiled.st_drop_off[begin:end]))
+            times = compiled.st_time[begin:end]
+            runs = groups.setdefault(key, [])
+            for start in starts.get(trip, [times[0]]):
+                for shift in shifts:
+                    offset = start - times[0] + shift
+                    if times[-1] + offset >= 0:
+                        runs.append((tuple(time + offset for time in times), trip))
+        self.pattern_stops = array('i')
+        self.pattern_pickups = array('b')
+        self.pattern_drop_offs = array('b')
+        self.stop_offsets = array('i', [0])
+        self.times = array('i')
+        self.time_offsets = array('i', [0])
+        self.run_trips = array('i')
+        self.run_offsets = array('i', [0])
+        for (stops, pickups, drop_offs), runs in groups.items():
+            runs.sort()
+            # Trips that would overtake the last of every pattern so far start another.
+            patterns = []
+            for times, trip in runs:
+                for pattern in patterns:
+                    if not _Overtakes(pattern[-1][0], times):
+                        pattern.append((times, trip))
+                        break
+                else:
+                    patterns.append([(times, trip)])
+            for pattern in patterns:
+                self.pattern_stops.extend(stops)
+                # Regular (0) types allow boarding and alighting.
+                self.pattern_pickups.extend(array('b', [pickup == 0 for pickup in pickups]))
+                self.pattern_drop_offs.extend(
+                    array('b', [drop_off == 0 for drop_off in drop_offs]))
+                self.stop_offsets.append(len(self.pattern_stops))
+                for times, trip in pattern:
+                    self.times.extend(times)
+                    self.run_trips.append(trip)
+                self.time_offsets.append(len(self.times))
+                self.run_offsets.append(len(self.run_trips))
+        num_stops = len(compiled.stops)
+        serving = [[] for _ in range(num_stops)]
+        for pattern in range(self.NumPatterns()):
+            begin, end = self.stop_offsets[pattern], self.stop_offsets[pattern + 1]
+            for position in range(end - begin):
+                serving[self.pattern_stops[begin + position]].append((pattern, position))
+        self.stop_patterns, self.stop_positions = array('i'), array('i')
+        self.stop_pattern_offsets = array('i', [0])
+        for pairs in serving:
+            self.stop_patterns.extend(pattern for pattern, _ in pairs)
+            self.stop_positions.extend(position for _, position in pairs)
+            self.stop_pattern_offsets.append(len(self.stop_patterns))
+        walks = [[] for _ in range(num_stops)]
+        if walk_meters > 0 and num_stops:
+            index = stop_index.StopIndexFor(compiled.stops)
+            for i, j, meters in index.Pairs(walk_meters):
+                seconds = int(round(meters * WALK_DETOUR_FACTOR / WALK_SPEED))
+                walks[i].append((j, seconds))
+                walks[j].append((i, seconds))
+        self.footpath_stops, self.footpath_seconds = array('i'), array('i')
+        self.footpath_offsets = array('i', [0])
+        for pairs in walks:
+            self.footpath_stops.extend(stop for stop, _ in pairs)
+            self.footpath_seconds.extend(seconds for _, seconds in pairs)
+            self.footpath_offsets.append(len(self.footpath_stops))
+
+    def NumPatterns(self):
+        return len(self.stop_offsets) - 1
+
+    def Footpaths(self, stop):
+        "Return the (stop, seconds) of the footpaths from `stop`."
+        begin, end = self.footpath_offsets[stop], self.footpath_offsets[stop + 1]
+        return zip(self.footpath_stops[begin:end], self.footpath_seconds[begin:end])
+
+class _Search(object):
+    "The labels of RAPTOR runs towards one target, kept from run to run for rRAPTOR."
+
+    def __init__(self, timetable, target, rounds, change_seconds):
+        self.timetable = timetable
+        self.target = target
+        self.rounds = rounds
+        self.change_seconds = change_seconds
+        # Per round, stop -> earliest arrival and stop -> how it was reached:
+        # (pattern, run, boarding position, alighting position) for a trip,
+        # (None, from stop, seconds) for a walk.
+        self.labels = [{} for _ in range(rounds + 1)]
+        self.parents = [{} for _ in range(rounds + 1)]
+        self.best = {}
+
+    def _Walk(self, stops, round_index):
+        "Walk from `stops` reached in `round_index`; return the stops improved."
+        timetable, best = self.timetable, self.best
+        labels, parents = self.labels[round_index], self.parents[round_index]
+        target_best = best.get(self.target, INFINITY)
+        walked = []
+        for stop in stops:
+            arrival = labels[stop]
+            for other, seconds in timetable.Footpaths(stop):
+                time = arrival + seconds
+                if time < best.get(other, INFINITY) and time < target_best:
+                    labels[other] = best[other] = time
+                    parents[other] = (None, stop, seconds)
+                    walked.append(other)
+        return walked
+
+    def Run(self, origin, time):
+        "Run RAPTOR from `origin` at `time`; return the rounds whose target label improved."
+        timetable, best, target = self.timetable, self.best, self.target
+        labels, parents = self.labels, self.parents
+        before = [round_labels.get(target, INFINITY) for round_labels in labels]
+        if time < labels[0].get(origin, INFINITY):
+            labels[0][origin] = time
+            parents[0].pop(origin, None)
+        if time < best.get(origin, INFINITY):
+            best[origin] = time
+        marked = set([origin])
+        marked.update(self._Walk([origin], 0))
+        pattern_stops, pickups, drop_offs = (timetable.pattern_stops, timetable.pattern_pickups,
+                                             timetable.pattern_drop_offs)
+        stop_offsets, time_offsets, times = (timetable.stop_offsets, timetable.time_offsets,
+                                             timetable.times)
+        stop_patterns, stop_positions = timetable.stop_patterns, timetable.stop_positions
+        stop_pattern_offsets = timetable.stop_pattern_offsets
+        for round_index in range(1, self.rounds + 1):
+            queue = {}
+            for stop in marked:
+                for j in range(stop_pattern_offsets[stop], stop_pattern_offsets[stop + 1]):
+                    pattern, position = stop_patterns[j], stop_positions[j]
+                    if position < queue.get(pattern, position + 1):
+                        queue[pattern] = position
+            previous, current = labels[round_index - 1], labels[round_index]
+            parent = parents[round_index]
+            change = self.change_seconds if round_index > 1 else 0
+            marked = set()
+            for pattern, position in queue.items():
+                begin = stop_offsets[pattern]
+                width = stop_offsets[pattern + 1] - begin
+                base = time_offsets[pattern]
+                count = (time_offsets[pattern + 1] - base) // width
+                run, row, boarded = -1, 0, 0
+                target_best = best.get(target, INFINITY)
+                for i in range(position, width):
+                    stop = pattern_stops[begin + i]
+                    if run >= 0 and drop_offs[begin + i]:
+                        arrival = times[row + i]
+                        if arrival < best.get(stop, INFINITY) and arrival < target_best:
+                            current[stop] = best[stop] = arrival
+                            parent[stop] = (pattern, run, boarded, i)
+                            marked.add(stop)
+                            if stop == target:
+                                target_best = arrival
+                    ready = previous.get(stop)
+                    if ready is None or not pickups[begin + i]:
+                        continue
+                    ready += change
+                    if run >= 0 and ready >= times[row + i]:
+                        continue
+                    # The first run leaving at or after `ready`, before the current one.
+                    low, high = 0, run if run >= 0 else count
+                    while low < high:
+                        middle = (low + high) // 2
+                        if times[base + middle * width + i] < ready:
+                            low = middle + 1
+                        else:
+                            high = middle
+                    if low < (run if run >= 0 else count):
+                        run, row, boarded = low, base + low * width, i
+            marked.update(self._Walk(list(marked), round_index))
+            if not marked:
+                break
+        return [k for k, round_labels in enumerate(labels)
+                if round_labels.get(target, INFINITY) < before[k]]
+
+    def Journey(self, round_index):
+        "Return the Journey to the target reached in `round_index`."
+        timetable, compiled = self.timetable, self.timetable.compiled
+        stop = self.target
+        arrival = self.labels[round_index][stop]
+        legs = []
+        while True:
+            parent = self.parents[round_index].get(stop)
+            if parent is None:
+                if round_index == 0:
+                    break
+                # Reached in an earlier round already.
+                round_index -= 1
+                continue
+            if parent[0] is None:
+                _, from_stop, seconds = parent
+                time = self.labels[round_index][stop]
+                legs.append(Leg(from_stop, stop, time - seconds, time, None, None))
+                stop = from_stop
+                continue
+            pattern, run, boarded, alighted = parent
+            begin = timetable.stop_offsets[pattern]
+            width = timetable.stop_offsets[pattern + 1] - begin
+            row = timetable.time_offsets[pattern] + run * width
+            trip = timetable.run_trips[timetable.run_offsets[pattern] + run]
+            from_stop = timetable.pattern_stops[begin + boarded]
+            legs.append(Leg(from_stop, stop, timetable.times[row + boarded],
+                            timetable.times[row + alighted], compiled.trip_ids[trip],
+                            compiled.trip_route[trip]))
+            stop = from_stop
+            round_index -= 1
+        legs.reverse()
+        if len(legs) > 1 and legs[0].trip_id is None:
+            # Walk to the first trip as late as it allows.
+            walk, departure = legs[0], legs[1].departure
+            legs[0] = walk._replace(departure=departure - (walk.arrival - walk.departure),
+                                    arrival=departure)
+        rides = sum(1 for leg in legs if leg.trip_id is not None)
+        departure = legs[0].departure if legs else arrival
+        return Journey(departure, arrival, max(rides - 1, 0), legs)
+
+class JourneyPlanner(object):
+    """Plans journeys over a CompiledSchedule holding all of its rows.
+
+    Journeys change trips after at least `change_seconds`, take at most
+    `max_transfers` transfers, and walk between stops within `walk_meters`.
+    Stops are indexes into `compiled.stops`, times seconds since midnight of
+    the query date. A Timetable is built for each date on its first query.
+    """
+
+    def __init__(self, compiled, walk_meters=400, change_seconds=60, max_transfers=4):
+        self.compiled = compiled
+        self.walk_meters = walk_meters
+        self.change_seconds = change_seconds
+        self.max_transfers = max_transfers
+        self._timetables = {}
+
+    def Stop(self, key):
+        "Return the index of the stop with spec id `key`."
+        return self.compiled.stop_index[key]
+
+    def Timetable(self, date):
+        "Return the Timetable of `date` (YYYYMMDD)."
+        timetable = self._timetables.get(date)
+        if timetable is None:
+            timetable = self._timetables[date] = Timetable(self.compiled, date, self.walk_meters)
+        return timetable
+
+    def _Search(self, target, date):
+        return _Search(self.Timetable(date), target, self.max_transfers + 1, self.change_seconds)
+
+    def EarliestArrival(self, origin, target, date, time):
+        """Return the Journeys from `origin` at `time` to `target`: the one
+        arriving first, then any with fewer transfers arriving later."""
+        search = self._Search(target, date)
+        return sorted((search.Journey(k) for k in search.Run(origin, time)),
+                      key=lambda journey: journey.transfers)
+
+    def Profile(self, origin, target, date, start, end):
+        """Return the Journeys from `origin` to `target` that no other
+        journey beats, for setting off between `start` and `end`, by
+        departure. They are the earliest arrivals from those times, so the
+        last may leave after `end`. Walking all the way can start at any
+        time, so that journey is left out."""
+        timetable = self.Timetable(date)
+        # Boarding times at the origin, or at a stop walked to from it.
+        sources = [(origin, 0)] + list(timetable.Footpaths(origin))
+        departures = set()
+        for stop, walk in sources:
+            for j in range(timetable.stop_pattern_offsets[stop],
+                           timetable.stop_pattern_offsets[stop + 1]):
+                pattern, position = timetable.stop_patterns[j], timetable.stop_positions[j]
+                begin = timetable.stop_offsets[pattern]
+                if not timetable.pattern_pickups[begin + position]:
+                    continue
+                width = timetable.stop_offsets[pattern + 1] - begin
+                for row in range(timetable.time_offsets[pattern] + position,
+                                 timetable.time_offsets[pattern + 1], width):
+                    time = timetable.times[row] - walk
+                    if start <= time <= end:
+                        departures.add(time)
+        search = self._Search(target, date)
+        journeys = []
+        for time in sorted(departures, reverse=True):
+            journeys.extend(search.Journey(k) for k in search.Run(origin, time) if k > 0)
+        kept = []
+        for journey in sorted(journeys, key=lambda journey: (-journey.departure, journey.arrival,
+                                                             journey.transfers)):
+            if not any(other.departure >= journey.departure and other.arrival <= journey.arrival
+                       and other.transfers <= journey.transfers for other in kept):
+                kept.append(journey)
+        kept.reverse()
+        return kept
@@ -0,0 +1,163 @@
+# coding=UTF8
+"""Tests of journey_planner: RAPTOR against a connection scan, over a merged feed."""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import feed_pipeline
+import feed_writer
+import journey_planner
+import schedule_spec
+
+SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'io2017.json')
+CHANGE_SECONDS = 60
+INFINITY = float('inf')
+
+def WriteBart(directory):
+    "Write a small BART feed to `directory`: Embarcadero to Millbrae every 15 minutes."
+    os.mkdir(directory)
+    feed_writer.WriteTable(os.path.join(directory, 'agency.txt'),
+                           ('agency_id', 'agency_name', 'agency_url', 'agency_timezone'),
+                           [('BART', 'BART', 'https://www.bart.gov', 'America/Los_Angeles')])
+    # MLBR is 30 m from millbraeBart, so the merge shares the generated stop.
+    feed_writer.WriteTable(os.path.join(directory, 'stops.txt'),
+                           ('stop_id', 'stop_name', 'stop_lat', 'stop_lon'),
+                           [('EMBR', 'Embarcadero', '37.792874', '-122.39702'),
+                            ('MLBR', 'Millbrae', '37.600695', '-122.385861')])
+    feed_writer.WriteTable(os.path.join(directory, 'routes.txt'),
+                           ('route_id', 'agency_id', 'route_short_name', 'route_type'),
+                           [('YL', 'BART', 'Yellow', '1')])
+    feed_writer.WriteTable(os.path.join(directory, 'calendar.txt'),
+                           ('service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+                            'saturday', 'sunday', 'start_date', 'end_date'),
+                           [('weekday', '1', '1', '1', '1', '1', '0', '0', '20170501',
+                             '20170531')])
+    trips, stop_times = [], []
+    for start in range(6 * 60, 10 * 60, 15):
+        trip_id = 'YL%04d' % start
+        trips.append(('YL', 'weekday', trip_id))
+        for sequence, (stop, minutes) in enumerate((('EMBR', 0), ('MLBR', 25))):
+            time = '%02d:%02d:00' % divmod(start + minutes, 60)
+            stop_times.append((trip_id, time, time, stop, str(sequence + 1)))
+    feed_writer.WriteTable(os.path.join(directory, 'trips.txt'),
+                           ('route_id', 'service_id', 'trip_id'), trips)
+    feed_writer.WriteTable(os.path.join(directory, 'stop_times.txt'),
+                           ('trip_id', 'arrival_time', 'departure_time', 'stop_id',
+                            'stop_sequence'), stop_times)
+
+def ConnectionScan(timetable, origin, target, time):
+    """Return the earliest arrival at `target` leaving `origin` at `time`, by
+    scanning every connection of `timetable` in order of departure."""
+    connections = []
+    for pattern in range(timetable.NumPatterns()):
+        begin = timetable.stop_offsets[pattern]
+        width = timetable.stop_offsets[pattern + 1] - begin
+        base = timetable.time_offsets[pattern]
+        for run in range((timetable.time_offsets[pattern + 1] - base) // width):
+            row = base + run * width
+            for i in range(width - 1):
+                connections.append((
+                    timetable.times[row + i], timetable.times[row + i + 1],
+                    timetable.pattern_stops[begin + i], timetable.pattern_stops[begin + i + 1],
+                    (pattern, run), timetable.pattern_pickups[begin + i],
+                    timetable.pattern_drop_offs[begin + i + 1]))
+    connections.sort()
+    num_stops = len(timetable.compiled.stops)
+    # The arrival at each stop, and when a trip can be boarded there.
+    arrival, ready = [INFINITY] * num_stops, [INFINITY] * num_stops
+    arrival[origin] = ready[origin] = time
+    for stop, seconds in timetable.Footpaths(origin):
+        arrival[stop] = ready[stop] = min(arrival[stop], time + seconds)
+    boarded = set()
+    for departure, at, from_stop, to_stop, run, pickup, drop_off in connections:
+        if run not in boarded and not (pickup and ready[from_stop] <= departure):
+            continue
+        boarded.add(run)
+        if not drop_off or at >= arrival[to_stop]:
+            continue
+        arrival[to_stop] = at
+        ready[to_stop] = min(ready[to_stop], at + CHANGE_SECONDS)
+        for stop, seconds in timetable.Footpaths(to_stop):
+            arrival[stop] = min(arrival[stop], at + seconds)
+            ready[stop] = min(ready[stop], at + seconds + CHANGE_SECONDS)
+    return arrival[target]
+
+class JourneyPlannerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp(prefix='journey-planner-test-')
+        bart = os.path.join(cls.directory, 'bart')
+        WriteBart(bart)
+        cls.zip_path = os.path.join(cls.directory, 'feed.zip')
+        feed_pipeline.StreamFeed(schedule_spec.LoadSpec(SPEC), cls.zip_path, frequencies=True,
+                                 merges=[('bart', bart)], merge_stop_meters=100)
+        cls.compiled = journey_planner.LoadFeed(cls.zip_path)
+        cls.planner = journey_planner.JourneyPlanner(cls.compiled, 400, CHANGE_SECONDS, 30)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def testEarliestArrivalAgainstConnectionScan(self):
+        generator = random.Random(42)
+        for date in ('20170516', '20170517', '20170518', '20170519'):
+            timetable = self.planner.Timetable(date)
+            served = sorted(set(timetable.pattern_stops))
+            for _ in range(100):
+                origin, target = generator.choice(served), generator.choice(served)
+                if origin == target:
+                    continue
+                time = generator.randint(5 * 3600, 20 * 3600)
+                journeys = self.planner.EarliestArrival(origin, target, date, time)
+                self.assertEqual(min([journey.arrival for journey in journeys] or [INFINITY]),
+                                 ConnectionScan(timetable, origin, target, time))
+                for journey in journeys:
+                    self.assertEqual(journey.legs[0].from_stop, origin)
+                    self.assertEqual(journey.legs[-1].to_stop, target)
+                    for leg, next_leg in zip(journey.legs, journey.legs[1:]):
+                        self.assertEqual(leg.to_stop, next_leg.from_stop)
+                        self.assertLessEqual(leg.arrival, next_leg.departure)
+
+    def testProfileKeepsEarliestArrivals(self):
+        origin, target = self.planner.Stop('bart:EMBR'), self.planner.Stop('0')
+        journeys = self.planner.Profile(origin, target, '20170517', 6 * 3600, 8 * 3600)
+        self.assertTrue(journeys)
+        for journey in journeys:
+            (earliest,) = [found for found in self.planner.EarliestArrival(
+                origin, target, '20170517', journey.departure)
+                           if found.transfers == journey.transfers]
+            self.assertEqual(earliest.arrival, journey.arrival)
+
+    def testTransferToMergedFeed(self):
+        # The generated millbraeBart stop (the 12th of the spec) is shared
+        # with BART's Millbrae.
+        millbrae = self.planner.Stop('11')
+        self.assertEqual(self.compiled.stops[millbrae]['name'], 'Millbrae BART Station')
+        # The fastest journey changes from BART to the Millbrae shuttle; the
+        # one without transfers walks to the Hyatt for the San Francisco bus.
+        direct, journey = self.planner.EarliestArrival(
+            self.planner.Stop('bart:EMBR'), self.planner.Stop('0'), '20170517', 6 * 3600)
+        self.assertEqual((direct.transfers, journey.transfers), (0, 1))
+        self.assertLess(journey.arrival, direct.arrival)
+        self.assertEqual(direct.legs[0].trip_id, None)
+        bart, shuttle = journey.legs
+        self.assertEqual((bart.trip_id, bart.to_stop), ('bart:YL0360', millbrae))
+        route_ids = [route['id'] for route in schedule_spec.LoadSpec(SPEC)['routes']]
+        self.assertEqual(self.compiled.routes[shuttle.route]['id'],
+                         str(route_ids.index('millbraeBartRoute')))
+
+    def testLoadFeedServices(self):
+        # calendar.txt is clipped to the generated dates and expanded.
+        (weekday,) = [period for period in self.compiled.service_periods
+                      if period['id'] == 'bart:weekday']
+        self.assertEqual(weekday['dates'], ['20170516', '20170517', '20170518', '20170519'])
+        self.assertFalse(self.planner.EarliestArrival(self.planner.Stop('bart:EMBR'),
+                                                      self.planner.Stop('0'), '20170520',
+                                                      6 * 3600))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,230 @@
+# coding=UTF8
+"""Instrumentation of the feed generation pipeline (generate-gtfs.py --profile).
+
+A PipelineProfiler replaces the functions and methods listed in STEPS with
+timed wrappers while it runs, so the pipeline itself needs no hooks. Each
+call records its wall time, and if asked its net allocations (with
+tracemalloc, Python 3 only), under the path of timed calls enclosing it: the
+report is a tree with the total and self time of every step, e.g.
+
+  compile > expand from_hub > add trips
+
+Trip groups are expanded by _Compiler.Expand(), so the "expand <kind>" steps
+stand for the per-kind trip builders. Expansion and the per-block steps
+are also charged to the route of their group or block, which with the rows
+written by feed_writer.WriteTrips() gives the rows per second of each route.
+
+The self times can be written as folded stacks ("a;b;c microseconds" lines)
+for flamegraph.pl or speedscope, and a cProfile of the whole run as pstats
+for function-level detail. Blocks expanded by worker processes are not
+seen, so profile with a single job.
+"""
+
+import cProfile
+import collections
+import importlib
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    from time import perf_counter as _Clock
+except ImportError:
+    from time import time as _Clock
+
+def _GroupRoute(args):
+    return args[-1]['route']
+
+def _BlockRoute(args):
+    block = args[-1]
+    return block.trip_route[0] if block.NumTrips() else None
+
+def _ExpandLabel(args):
+    return 'expand %s' % args[-1]['kind']
+
+# (module, function or Class.method, label or function of the call's
+# arguments returning one, function of the arguments returning the route
+# index to charge or None).
+STEPS = [
+    ('schedule_spec', 'LoadSpec', 'load spec', None),
+    ('service_calendar', 'CompressSpec', 'compress calendar', None),
+    ('schedule_spec', 'CompileSpec', 'compile', None),
+    ('schedule_spec', '_Compiler.Shards', 'resolve groups', None),
+    ('schedule_spec', '_Compiler.Expand', _ExpandLabel, _GroupRoute),
+    ('schedule_spec', '_Compiler.TimedTrips', 'travel times', None),
+    ('schedule_spec', 'Broadcast', 'broadcast starts', None),
+    ('schedule_spec', 'Headways', 'headways', None),
+    ('schedule_spec', 'CompiledSchedule.AddTrips', 'add trips', None),
+    ('schedule_spec', 'CompiledSchedule.AssignTripIds', 'trip ids', None),
+    ('build_cache', 'BuildCache.Load', 'cache load', None),
+    ('build_cache', 'BuildCache.Store', 'cache store', None),
+    ('feed_shapes', 'ShapeBuilder.AddBlock', 'shapes', _BlockRoute),
+    ('vehicle_blocks', 'BlockBuilder.AddBlock', 'vehicle blocks', _BlockRoute),
+    ('feed_validator', 'FeedValidator.ValidateBlock', 'validate', _BlockRoute),
+    ('feed_validator', 'FeedValidator.Finish', 'validate feed', None),
+    ('feed_writer', 'WriteTrips', 'write trips', _BlockRoute),
+    ('feed_columnar', 'ColumnarFeedWriter.WriteBlock', 'columnar', _BlockRoute),
+    ('departure_index', 'DepartureIndexWriter.WriteBlock', 'departures', _BlockRoute),
+    ('trip_positions', 'TripPositionWriter.WriteBlock', 'positions', _BlockRoute),
+    ('stop_index', 'ParentStations', 'parent stations', None),
+    ('feed_writer', 'WriteMetadata', 'write stops and metadata', None),
+    ('feed_shapes', 'WriteShapes', 'write shapes', None),
+    ('feed_merge', 'MergeFeed', 'merge feed', None),
+    ('feed_writer', 'FeedWriter.Close', 'write zip', None),
+    ('feed_sqlite', 'SqliteFeedWriter.Close', 'write sqlite', None),
+    ('feed_columnar', 'ColumnarFeedWriter.Close', 'write columnar', None),
+    ('departure_index', 'DepartureIndexWriter.Close', 'write departures', None),
+    ('trip_positions', 'TripPositionWriter.Close', 'write positions', None),
+    ('vehicle_blocks', 'BlockBuilder.Report', 'vehicle report', None),
+]
+
+# The step whose blocks are counted as the rows generated by their route.
+ROWS_STEP = 'write trips'
+
+class _Node(object):
+    "The calls of one step under one path."
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.self_time = 0.0
+        self.self_allocated = 0
+
+class PipelineProfiler(object):
+    """Times the STEPS of the pipeline between Start() and Stop().
+
+    With `memory` and tracemalloc available, allocations are traced too,
+    which slows every step down about alike. With `stats`, the path of a
+    cProfile dump of the run.
+    """
+
+    def __init__(self, memory=False, stats=None):
+        self.memory = memory and tracemalloc is not None
+        self.stats = stats
+        # Path of labels -> _Node.
+        self.nodes = collections.OrderedDict()
+        # Route index -> [seconds, trips, stop times].
+        self.routes = collections.defaultdict(lambda: [0.0, 0, 0])
+        self.seconds = 0.0
+        self._stack = []
+        self._route_depth = 0
+        self._patched = []
+        self._profile = None
+        self._started = None
+
+    def _Memory(self):
+        return tracemalloc.get_traced_memory()[0] if self.memory else 0
+
+    def _Wrap(self, function, label, route):
+        profiler = self
+
+        def Timed(*args, **kwargs):
+            name = label(args) if callable(label) else label
+            route_index = route(args) if route is not None and not profiler._route_depth else None
+            if route_index is not None:
+                profiler._route_depth += 1
+            path = (profiler._stack[-1][0] if profiler._stack else ()) + (name,)
+            node = profiler.nodes.get(path)
+            if node is None:
+                node = profiler.nodes[path] = _Node()
+            # [path, children's seconds, children's bytes]
+            frame = [path, 0.0, 0]
+            profiler._stack.append(frame)
+            memory = profiler._Memory()
+            started = _Clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = _Clock() - started
+                allocated = profiler._Memory() - memory
+                profiler._stack.pop()
+                node.calls += 1
+                node.total += seconds
+                node.self_time += seconds - frame[1]
+                node.self_allocated += allocated - frame[2]
+                if profiler._stack:
+                    profiler._stack[-1][1] += seconds
+                    profiler._stack[-1][2] += allocated
+                if route_index is not None:
+                    profiler._route_depth -= 1
+                    profiler.routes[route_index][0] += seconds
+                if name == ROWS_STEP:
+                    counts = profiler.routes[_BlockRoute(args)]
+                    counts[1] += args[-1].NumTrips()
+                    counts[2] += args[-1].NumStopTimes()
+        Timed.__name__ = getattr(function, '__name__', 'Timed')
+        Timed.__doc__ = function.__doc__
+        return Timed
+
+    def Start(self):
+        "Instrument the STEPS and start the clock."
+        for module_name, attribute, label, route in STEPS:
+            owner = importlib.import_module(module_name)
+            if '.' in attribute:
+                class_name, attribute = attribute.split('.')
+                owner = getattr(owner, class_name)
+            # Methods are looked up in the class __dict__, so that Python 2
+            # restores the plain function rather than an unbound method.
+            function = owner.__dict__[attribute]
+            self._patched.append((owner, attribute, function))
+            setattr(owner, attribute, self._Wrap(function, label, route))
+        if self.memory:
+            tracemalloc.start()
+        if self.stats:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._started = _Clock()
+
+    def Stop(self):
+        "Stop the clock, restore the STEPS and write the cProfile stats."
+        self.seconds = _Clock() - self._started
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.stats)
+            self._profile = None
+        if self.memory:
+            tracemalloc.stop()
+        for owner, attribute, function in reversed(self._patched):
+            setattr(owner, attribute, function)
+        self._patched = []
+
+    def Report(self, route_ids=None):
+        """Return the lines of the step tree and of the per-route table;
+        `route_ids` are the spec ids of the routes by index."""
+        kilobytes = lambda value: '%9d' % (value // 1024) if self.memory else '%9s' % '-'
+        lines = ['%9s %9s %9s %9s  %s' % ('total ms', 'self ms', 'calls', 'net KB', 'step'),
+                 '%9.1f %9s %9s %9s  %s' % (self.seconds * 1000, '', '', '', 'run')]
+        children = collections.defaultdict(list)
+        for path in self.nodes:
+            children[path[:-1]].append(path)
+        pending = list(reversed(children[()]))
+        while pending:
+            path = pending.pop()
+            pending.extend(reversed(children[path]))
+            node = self.nodes[path]
+            lines.append('%9.1f %9.1f %9d %s  %s%s' % (
+                node.total * 1000, node.self_time * 1000, node.calls,
+                kilobytes(node.self_allocated), '  ' * len(path), path[-1]))
+        lines.append('')
+        lines.append('%-24s %9s %11s %9s %11s' % ('route', 'trips', 'stop times', 'ms', 'rows/s'))
+        for route in sorted(self.routes, key=lambda route: -self.routes[route][0]):
+            seconds, trips, stop_times = self.routes[route]
+            name = route_ids[route] if route_ids is not None and route is not None else route
+            lines.append('%-24s %9d %11d %9.1f %11.0f' % (
+                name, trips, stop_times, seconds * 1000,
+                (trips + stop_times) / seconds if seconds > 0 else 0))
+        return lines
+
+    def WriteFolded(self, path):
+        """Write the self time of each step path in microseconds as folded
+        stacks, under a 'run' root holding the time outside every step."""
+        outside = self.seconds - sum(node.total for path, node in self.nodes.items()
+                                     if len(path) == 1)
+        with open(path, 'w') as out:
+            out.write('run %d\n' % max(0, int(outside * 1e6)))
+            for stack, node in self.nodes.items():
+                microseconds = int(node.self_time * 1e6)
+                if microseconds > 0:
+                    out.write('%s %d\n' % (';'.join(('run',) + stack), microseconds))
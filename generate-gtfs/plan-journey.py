@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# coding=UTF8
+"""Plan journeys with transfers over the schedule of a spec, or over a feed.
+
+With FROM and TO stop ids, prints the journeys leaving at --time: the one
+arriving first and any with fewer transfers. With --until, prints every
+journey leaving until then that no other beats. With --benchmark N, times N
+earliest arrival and N profile queries between random stops instead.
+
+With --feed, journeys are planned over a GTFS feed instead, such as one
+written by generate-gtfs.py --merge, so that they can change to the trips
+of the merged feeds. FROM and TO are then feed stop ids, e.g.
+'bart:MLBR', or spec stop ids of the generated stops.
+"""
+
+import collections
+import os
+import random
+import sys
+import time
+from optparse import OptionParser
+
+import gtfs_time
+import journey_planner
+import schedule_spec
+import spec_scale
+
+parser = OptionParser(usage='%prog FROM_STOP TO_STOP [--date YYYYMMDD] [--time HH:MM:SS] '
+                            '[--until HH:MM:SS]\n       %prog --benchmark N [--scale N]')
+parser.add_option('--spec', dest='spec',
+                  help='Schedule spec to plan over')
+parser.add_option('--feed', dest='feed',
+                  help='GTFS zip or directory to plan over instead of the spec, e.g. the output '
+                       'of generate-gtfs.py --merge')
+parser.add_option('--date', dest='date',
+                  help='Travel date, YYYYMMDD; by default the first service date, or the '
+                       'busiest for --benchmark')
+parser.add_option('--time', dest='time',
+                  help='Earliest departure, HH:MM:SS')
+parser.add_option('--until', dest='until',
+                  help='Latest departure, HH:MM:SS, for a profile query')
+parser.add_option('--walk-meters', dest='walk_meters', type='float',
+                  help='Walk between stops up to this far apart')
+parser.add_option('--change-minutes', dest='change_minutes', type='float',
+                  help='Minimum time to change between trips')
+parser.add_option('--max-transfers', dest='max_transfers', type='int',
+                  help='Maximum number of transfers of a journey')
+parser.add_option('--benchmark', dest='benchmark', type='int',
+                  help='Time this many random queries of each kind')
+parser.add_option('--window-minutes', dest='window_minutes', type='int',
+                  help='With --benchmark, the departure window of the profile queries')
+parser.add_option('--scale', dest='scale', type='int',
+                  help='With --benchmark, scale the spec up first (see spec_scale.Factors)')
+parser.set_defaults(time='08:00:00', walk_meters=400.0, change_minutes=1.0, max_transfers=4,
+                    benchmark=0, window_minutes=120, scale=1,
+                    spec=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'io2017.json'))
+(options, args) = parser.parse_args()
+
+if not options.benchmark and len(args) != 2:
+    parser.error('expected FROM_STOP TO_STOP, or --benchmark N')
+
+if options.feed and options.scale > 1:
+    parser.error('--scale scales the spec; it cannot be used with --feed')
+
+spec = schedule_spec.LoadSpec(options.spec)
+if options.scale > 1:
+    spec = spec_scale.ScaleSpec(spec, *spec_scale.Factors(options.scale))
+if options.feed:
+    try:
+        compiled = journey_planner.LoadFeed(options.feed)
+    except (IOError, ValueError, KeyError) as e:
+        parser.error('cannot plan over %s: %s' % (options.feed, e))
+else:
+    compiled = schedule_spec.CompileSpec(spec)
+planner = journey_planner.JourneyPlanner(compiled, options.walk_meters,
+                                         int(options.change_minutes * 60), options.max_transfers)
+trips_per_date = collections.Counter()
+for service in compiled.trip_service:
+    trips_per_date.update(compiled.service_periods[service]['dates'])
+if options.date:
+    date = options.date
+elif options.benchmark:
+    date = min(trips_per_date, key=lambda date: (-trips_per_date[date], date))
+else:
+    date = min(trips_per_date)
+
+def StopName(stop):
+    return compiled.stops[stop]['name']
+
+def RouteName(route):
+    route = compiled.routes[route]
+    if options.feed:
+        return route.get('short_name') or route.get('long_name') or route['id']
+    return route['id']
+
+def StopKey(key):
+    """Return the key of planner.Stop() for the stop id `key`. The stops of
+    generate-gtfs.py are numbered in spec order."""
+    if options.feed and key not in compiled.stop_index:
+        for i, stop in enumerate(spec['stops']):
+            if stop['id'] == key:
+                return str(i)
+    return key
+
+def PrintJourney(journey):
+    transfers = '%d transfer%s' % (journey.transfers, '' if journey.transfers == 1 else 's')
+    print('%s -> %s, %s' % (gtfs_time.FormatTime(journey.departure),
+                            gtfs_time.FormatTime(journey.arrival), transfers))
+    for leg in journey.legs:
+        if leg.trip_id is None:
+            how = 'walk %d min' % round((leg.arrival - leg.departure) / 60.0)
+        else:
+            how = '%s, trip %s' % (RouteName(leg.route), leg.trip_id)
+        print('  %s %s -> %s %s (%s)' % (
+            gtfs_time.FormatTime(leg.departure), StopName(leg.from_stop),
+            gtfs_time.FormatTime(leg.arrival), StopName(leg.to_stop), how))
+
+def Benchmark(count):
+    """Time `count` random queries of each kind between stops connected by
+    some journey; return the report lines."""
+    started = time.time()
+    timetable = planner.Timetable(date)
+    lines = ['%d stops, %d patterns, %d stop times on %s; timetable built in %.3f s' % (
+        len(compiled.stops), timetable.NumPatterns(), len(timetable.times), date,
+        time.time() - started)]
+    origins = sorted(set(stop for stop, pickup in zip(timetable.pattern_stops,
+                                                      timetable.pattern_pickups) if pickup))
+    targets = sorted(set(stop for stop, drop_off in zip(timetable.pattern_stops,
+                                                        timetable.pattern_drop_offs) if drop_off))
+    times = sorted(set(timetable.times))
+    generator = random.Random(42)
+    queries = []
+    for _ in range(100 * count):
+        origin, target = generator.choice(origins), generator.choice(targets)
+        at = generator.randint(times[0], times[-1])
+        # Copies of a scaled spec are not connected; most pairs have no journey.
+        if origin != target and planner.EarliestArrival(origin, target, date, at):
+            queries.append((origin, target, at))
+            if len(queries) == count:
+                break
+    window = options.window_minutes * 60
+    for name, query in (('earliest arrival', lambda origin, target, at:
+                             planner.EarliestArrival(origin, target, date, at)),
+                        ('profile (%d min)' % options.window_minutes, lambda origin, target, at:
+                             planner.Profile(origin, target, date, at, at + window))):
+        started = time.time()
+        for origin, target, at in queries:
+            query(origin, target, at)
+        seconds = time.time() - started
+        lines.append('%s: %d queries in %.3f s, %.0f queries/s' % (
+            name, len(queries), seconds, len(queries) / seconds if seconds > 0 else 0))
+    return lines
+
+if options.benchmark:
+    for line in Benchmark(options.benchmark):
+        print(line)
+    sys.exit(0)
+
+try:
+    origin, target = planner.Stop(StopKey(args[0])), planner.Stop(StopKey(args[1]))
+except KeyError as e:
+    parser.error('unknown stop %s' % e)
+departure = gtfs_time.ParseTime(options.time)
+if options.until:
+    journeys = planner.Profile(origin, target, date, departure, gtfs_time.ParseTime(options.until))
+else:
+    journeys = planner.EarliestArrival(origin, target, date, departure)
+if not journeys:
+    sys.stderr.write('No journey from %s to %s on %s\n' % (
+        StopName(origin), StopName(target), date))
+    sys.exit(1)
+for journey in journeys:
+    PrintJourney(journey)
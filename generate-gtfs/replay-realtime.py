@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding=UTF8
+"""Replay a generated feed as a synthetic GTFS-Realtime stream.
+
+Serves VehiclePosition and TripUpdate feeds at /vehicle_positions and
+/trip_updates, with a new snapshot every --interval seconds of a clock
+running --speed times faster than real time, and reports the messages
+encoded and served per second on stderr. With --benchmark N, encodes N
+snapshots back to back instead and reports the throughput.
+"""
+
+import sys
+import time
+from optparse import OptionParser
+
+import gtfs_realtime
+import gtfs_time
+
+parser = OptionParser(usage='%prog [FEED] [--speed 60] [--port 8080]\n'
+                            '       %prog [FEED] --benchmark N')
+parser.add_option('--date', dest='date',
+                  help='Service date to replay, YYYYMMDD; the first one by default')
+parser.add_option('--start', dest='start',
+                  help='Simulated start time, HH:MM:SS; the first departure by default')
+parser.add_option('--end', dest='end',
+                  help='Stop once the simulated clock passes this time, HH:MM:SS')
+parser.add_option('--speed', dest='speed', type='float',
+                  help='Simulated seconds per wall clock second')
+parser.add_option('--interval', dest='interval', type='float',
+                  help='Wall clock seconds between snapshots')
+parser.add_option('--copies', dest='copies', type='int',
+                  help='Vehicles simulated per run of a trip, to multiply the load')
+parser.add_option('--delay-mean', dest='delay_mean', type='float',
+                  help='Mean initial delay of a vehicle, in seconds')
+parser.add_option('--delay-sigma', dest='delay_sigma', type='float',
+                  help='Deviation of the initial delay, and of its drift per simulated hour, '
+                       'in seconds')
+parser.add_option('--seed', dest='seed', type='int',
+                  help='Seed of the delay noise')
+parser.add_option('--host', dest='host',
+                  help='Address to serve on')
+parser.add_option('--port', dest='port', type='int',
+                  help='Port to serve on')
+parser.add_option('--report-seconds', dest='report_seconds', type='float',
+                  help='Wall clock seconds between throughput reports')
+parser.add_option('--benchmark', dest='benchmark', type='int',
+                  help='Encode this many snapshots as fast as possible and report the throughput')
+parser.set_defaults(speed=60.0, interval=1.0, copies=1, delay_mean=0.0, delay_sigma=0.0, seed=0,
+                    host='127.0.0.1', port=8080, report_seconds=10.0, benchmark=0)
+(options, args) = parser.parse_args()
+
+if len(args) > 1:
+    parser.error('expected at most one feed')
+if options.speed <= 0 or options.interval <= 0 or options.copies < 1:
+    parser.error('--speed, --interval and --copies must be positive')
+path = args[0] if args else 'google_transit.zip'
+date = options.date or gtfs_realtime.FirstServiceDate(path)
+if date is None:
+    parser.error('%s has no service dates' % path)
+
+started = time.time()
+replay = gtfs_realtime.RealtimeReplay(path, date, options.copies, options.delay_mean,
+                                      options.delay_sigma, options.seed)
+sys.stderr.write('Loaded %d vehicle runs on %s in %.1f s\n' % (
+    len(replay.runs), date, time.time() - started))
+start = gtfs_time.ParseTime(options.start) if options.start else replay.FirstDeparture()
+end = gtfs_time.ParseTime(options.end) if options.end else None
+
+if options.benchmark:
+    step = options.interval * options.speed
+    vehicles = size = 0
+    started = time.time()
+    for i in range(options.benchmark):
+        positions, updates, count = replay.Snapshot(start + i * step)
+        vehicles += count
+        size += len(positions) + len(updates)
+    seconds = time.time() - started
+    sys.stdout.write('%d snapshots from %s every %d s: %.0f vehicles on average, '
+                     '%.0f messages/s, %.1f MB/s, %.1f ms per snapshot\n' % (
+                         options.benchmark, gtfs_time.FormatTime(start), step,
+                         float(vehicles) / options.benchmark, 2 * vehicles / seconds,
+                         size / seconds / 1e6, seconds * 1000 / options.benchmark))
+    sys.exit(0)
+
+def Report(now, vehicles, rates):
+    sys.stderr.write('%s: %d vehicles; encoded %.0f messages/s (%.2f MB/s), '
+                     'served %.0f messages/s in %.1f responses/s (%.2f MB/s)\n' % (
+                         gtfs_time.FormatTime(int(now)), vehicles,
+                         rates.get('encoded messages', 0), rates.get('encoded bytes', 0) / 1e6,
+                         rates.get('served messages', 0), rates.get('responses', 0),
+                         rates.get('served bytes', 0) / 1e6))
+
+server = gtfs_realtime.RealtimeServer(replay, start, options.speed, options.interval,
+                                      options.host, options.port)
+sys.stderr.write('Serving http://%s:%d/vehicle_positions and /trip_updates from %s\n' % (
+    options.host, options.port, gtfs_time.FormatTime(start)))
+try:
+    server.Serve(end, Report, options.report_seconds)
+except KeyboardInterrupt:
+    pass
@@ -0,0 +1,588 @@
+# coding=UTF8
+"""Declarative schedule specs and their compiler.
+
+A spec is a JSON (or, with PyYAML installed, YAML) document describing the
+agency, service periods, stops, routes and a list of trip groups. See
+io2017.json for the I/O 2017 shuttle schedule. The top level keys are:
+
+  agency           name, url, timezone and lang of the agency.
+  service_periods  list of {"id", "dates"}; dates are YYYYMMDD strings.
+  stops            list of {"id", "name", "lat", "lng"}.
+  routes           list of {"id", "short_name", "long_name", "route_type",
+                   "color", "text_color"}, colors as 'RRGGBB' hex, and
+                   optionally the "capacity" of a vehicle, in passengers, for
+                   demand_simulation.py.
+  hub              id of the venue stop every trip starts or ends at.
+  time_lists       named start time lists, either a list of 'HH:MM:SS' times
+                   or a headway pattern {"from", "to", "every_minutes"}.
+  stop_patterns    named stop offset lists, [{"stop", "delta_minutes"}, ...],
+                   each delta relative to the previous stop.
+  trips            list of trip groups, expanded in order. Groups may carry a
+                   free-form "note".
+
+A trip group has a "kind":
+
+  to_hub    From "initial_stop" to the hub. Either "trips", a list of
+            [service_period, start_time, delta_minutes] entries, or
+            "service_period", "start_times" and "delta_minutes".
+  from_hub  From the hub, dropping off at each of "stops".
+  loop      From the hub, picking up at each of "stops" and dropping off at
+            the last one.
+
+"start_times" is a time list name, a list of times or a headway pattern, and
+"stops" is a stop pattern name or an inline stop offset list. A from_hub or
+loop group whose start times are a headway pattern may set "frequencies" to
+true to be written as a single trip plus a frequencies.txt entry instead of
+one trip per departure.
+
+A travel time model (see travel_times.py) can replace the fixed
+"delta_minutes" with durations that depend on the time of day; each trip's
+stop times are then accumulated stop by stop from its own departure.
+Frequency-based trips use the travel times of their first departure.
+
+CompileSpec() expands every group into flat integer columns in one pass: a
+group's stop template is computed once and then broadcast over all of its
+start times, so no per-stop objects are created. Trips are emitted in blocks,
+one per (route, service period), which can be expanded in parallel worker
+processes.
+"""
+
+import collections
+import hashlib
+import io
+import json
+import multiprocessing
+from array import array
+
+import gtfs_time
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+# pickup_type / drop_off_type values.
+REGULAR = 0
+NOT_AVAILABLE = 1
+
+class SpecError(ValueError):
+    "Raised for malformed or inconsistent schedule specs."
+
+def LoadSpec(path):
+    "Load a JSON or YAML schedule spec from `path`, preserving key order."
+    with io.open(path, encoding='utf-8') as spec_file:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise SpecError('PyYAML is required to read %s' % path)
+            return yaml.safe_load(spec_file)
+        return json.load(spec_file, object_pairs_hook=collections.OrderedDict)
+
+def _TimeList(value, time_lists):
+    if isinstance(value, string_types):
+        if time_lists is None or value not in time_lists:
+            raise SpecError('Unknown time list %r' % value)
+        value = time_lists[value]
+    return value
+
+def HeadwayPattern(value, time_lists=None):
+    "Return (start, end, interval) in seconds if `value` is a headway pattern, else None."
+    value = _TimeList(value, time_lists)
+    if not isinstance(value, dict):
+        return None
+    start = gtfs_time.ParseTime(value['from'])
+    end = gtfs_time.ParseTime(value['to'])
+    step = gtfs_time.Minutes(value['every_minutes'])
+    if step <= 0:
+        raise SpecError('Headway must be positive: %r' % (value,))
+    return start, end, step
+
+def ExpandTimes(value, time_lists=None):
+    "Return `value` (a time list, list name or headway pattern) as a list of seconds."
+    pattern = HeadwayPattern(value, time_lists)
+    if pattern is not None:
+        start, end, step = pattern
+        return list(range(start, end + 1, step))
+    return gtfs_time.ParseTimes(_TimeList(value, time_lists))
+
+def TripId(route_id, service_id, origin_stop_id, start):
+    """Return the stable id of a trip.
+
+    Ids depend only on the trip itself, so adding or removing other trips
+    leaves them unchanged, e.g. 'yellowRoute_day1_sheratonPaloAlto_070000'.
+    """
+    return '%s_%s_%s_%s' % (route_id, service_id, origin_stop_id,
+                            gtfs_time.FormatTime(start).replace(':', ''))
+
+def Broadcast(starts, offsets):
+    "Return the stop times of trips leaving at `starts` with stop `offsets`, back to back."
+    return [start + offset for start in starts for offset in offsets]
+
+def Headways(start, end, interval, offsets):
+    """Return the stop times of trips leaving every `interval` seconds from
+    `start` to `end` (inclusive) with stop `offsets`, back to back.
+
+    Like Broadcast() over a headway, but filled one stop column at a time by
+    strided array assignment, without a Python step per stop time.
+    """
+    width = len(offsets)
+    count = len(range(start, end + 1, interval))
+    times = array('i', [0]) * (count * width)
+    for column, offset in enumerate(offsets):
+        times[column::width] = array('i', range(start + offset, end + offset + 1, interval))
+    return times
+
+class CompiledSchedule(object):
+    """A schedule expanded into flat columns.
+
+    Trips are rows of `trip_route`, `trip_service` and `trip_headsign` (indexes
+    into `routes`, `service_periods` and `headsigns`). The stop times of trip
+    `i` are rows `trip_offsets[i]` to `trip_offsets[i + 1]` of the `st_*`
+    columns, in stop sequence order. Frequency-based trips also have rows in
+    the `freq_*` columns: the trip, and the start time, end time (exclusive)
+    and headway of its departures, in seconds. `trip_shape` and `st_dist`
+    are empty unless a feed_shapes.ShapeBuilder filled them in, and
+    `block_ids` unless a vehicle_blocks.BlockBuilder did.
+
+    When compiled with an `on_block` callback the rows are handed over and
+    cleared after every block; `trip_base` is then the number of trips
+    handed over before the rows currently held. For blocks expanded in a
+    worker process, `shard_check` holds what the `check_shard` function of
+    CompileSpec() returned for them there.
+    """
+
+    def __init__(self, agency, stops, routes, service_periods, hub=None):
+        self.agency = agency
+        self.stops = stops
+        self.routes = routes
+        self.service_periods = service_periods
+        self.hub = hub
+        self.stop_index = dict((stop['id'], i) for i, stop in enumerate(stops))
+        self.route_index = dict((route['id'], i) for i, route in enumerate(routes))
+        self.service_index = dict((period['id'], i) for i, period in enumerate(service_periods))
+        self.headsigns = []
+        self._headsign_index = {}
+        self.trip_base = 0
+        self.from_cache = False
+        self.shard_check = None
+        self._assigned_trip_ids = set()
+        self._ResetRows()
+
+    def ClearRows(self):
+        "Drop the trip and stop time rows held, keeping `trip_base` counting."
+        self.trip_base += self.NumTrips()
+        self._ResetRows()
+
+    def _ResetRows(self):
+        self.trip_ids = []
+        self.trip_route = array('i')
+        self.trip_service = array('i')
+        self.trip_headsign = array('i')
+        self.trip_offsets = array('i', [0])
+        self.st_stop = array('i')
+        self.st_time = array('i')
+        self.st_pickup = array('i')
+        self.st_drop_off = array('i')
+        self.freq_trip = array('i')
+        self.freq_start = array('i')
+        self.freq_end = array('i')
+        self.freq_headway = array('i')
+        self.trip_shape = array('i')
+        self.st_dist = array('d')
+        self.block_ids = []
+
+    def NumTrips(self):
+        return len(self.trip_route)
+
+    def NumStopTimes(self):
+        return len(self.st_stop)
+
+    def Headsign(self, headsign):
+        "Return the index of `headsign`, adding it if needed."
+        index = self._headsign_index.get(headsign)
+        if index is None:
+            index = self._headsign_index[headsign] = len(self.headsigns)
+            self.headsigns.append(headsign)
+        return index
+
+    def AddTrips(self, route, services, headsign, stops, times, pickups, drop_offs):
+        """Append trips that all follow the stop template `stops`.
+
+        `times` holds the stop times of every trip back to back, `len(stops)`
+        per trip. `services` is a service period index, or a list with one
+        per trip. `pickups` and `drop_offs` are per template stop.
+        """
+        width = len(stops)
+        count = len(times) // width
+        if isinstance(services, int):
+            services = [services] * count
+        base = len(self.st_stop)
+        self.trip_route.extend(array('i', [route]) * count)
+        self.trip_service.extend(array('i', services))
+        self.trip_headsign.extend(array('i', [self.Headsign(headsign)]) * count)
+        self.trip_offsets.extend(array('i', range(base + width, base + width * count + 1, width)))
+        self.st_stop.extend(array('i', stops) * count)
+        self.st_time.extend(array('i', times))
+        self.st_pickup.extend(array('i', pickups) * count)
+        self.st_drop_off.extend(array('i', drop_offs) * count)
+
+    def AddFrequency(self, trip, start, end, headway):
+        "Make `trip` depart every `headway` seconds from `start` until before `end`."
+        self.freq_trip.append(trip)
+        self.freq_start.append(start)
+        self.freq_end.append(end)
+        self.freq_headway.append(headway)
+
+    def AssignTripIds(self):
+        """Give the trips that do not have an id yet their TripId().
+
+        Trips sharing a route, service period, origin and start time are told
+        apart by a short hash of their headsign and stop times, then, if they
+        are identical, by a counter.
+        """
+        for trip in range(len(self.trip_ids), self.NumTrips()):
+            begin = self.trip_offsets[trip]
+            route = self.routes[self.trip_route[trip]]['id']
+            service = self.service_periods[self.trip_service[trip]]['id']
+            trip_id = TripId(route, service, self.stops[self.st_stop[begin]]['id'], self.st_time[begin])
+            if trip_id in self._assigned_trip_ids:
+                content = json.dumps([self.headsigns[self.trip_headsign[trip]], list(self.StopTimes(trip))])
+                trip_id += '_' + hashlib.sha1(content.encode('utf-8')).hexdigest()[:6]
+                unique_id, count = trip_id, 1
+                while unique_id in self._assigned_trip_ids:
+                    count += 1
+                    unique_id = '%s_%d' % (trip_id, count)
+                trip_id = unique_id
+            self._assigned_trip_ids.add(trip_id)
+            self.trip_ids.append(trip_id)
+
+    def Rows(self, first_trip=0):
+        "Return the columns of the trips from `first_trip` on, detached from this schedule."
+        begin = self.trip_offsets[first_trip]
+        headsigns = sorted(set(self.trip_headsign[first_trip:]))
+        local = dict((headsign, i) for i, headsign in enumerate(headsigns))
+        frequencies = [i for i, trip in enumerate(self.freq_trip) if trip >= first_trip]
+        return {
+            'headsigns': [self.headsigns[headsign] for headsign in headsigns],
+            'trip_headsign': array('i', [local[headsign] for headsign in self.trip_headsign[first_trip:]]),
+            'trip_route': self.trip_route[first_trip:],
+            'trip_service': self.trip_service[first_trip:],
+            'trip_offsets': array('i', [offset - begin for offset in self.trip_offsets[first_trip:]]),
+            'st_stop': self.st_stop[begin:],
+            'st_time': self.st_time[begin:],
+            'st_pickup': self.st_pickup[begin:],
+            'st_drop_off': self.st_drop_off[begin:],
+            'freq_trip': array('i', [self.freq_trip[i] - first_trip for i in frequencies]),
+            'freq_start': array('i', [self.freq_start[i] for i in frequencies]),
+            'freq_end': array('i', [self.freq_end[i] for i in frequencies]),
+            'freq_headway': array('i', [self.freq_headway[i] for i in frequencies]),
+        }
+
+    def ExtendRows(self, rows):
+        "Append columns returned by Rows()."
+        base = len(self.st_stop)
+        self.freq_trip.extend(array('i', [trip + self.NumTrips() for trip in rows['freq_trip']]))
+        for column in ('freq_start', 'freq_end', 'freq_headway'):
+            getattr(self, column).extend(rows[column])
+        headsigns = [self.Headsign(headsign) for headsign in rows['headsigns']]
+        self.trip_headsign.extend(array('i', [headsigns[headsign] for headsign in rows['trip_headsign']]))
+        self.trip_route.extend(rows['trip_route'])
+        self.trip_service.extend(rows['trip_service'])
+        self.trip_offsets.extend(array('i', [offset + base for offset in rows['trip_offsets'][1:]]))
+        for column in ('st_stop', 'st_time', 'st_pickup', 'st_drop_off'):
+            getattr(self, column).extend(rows[column])
+
+    def StopTimes(self, trip):
+        "Return the (stop, time, pickup, drop_off) rows of `trip`."
+        begin, end = self.trip_offsets[trip], self.trip_offsets[trip + 1]
+        return zip(self.st_stop[begin:end], self.st_time[begin:end],
+                   self.st_pickup[begin:end], self.st_drop_off[begin:end])
+
+class _Compiler(object):
+
+    def __init__(self, spec, on_block=None, cache=None, jobs=1, check_shard=None,
+                 frequencies=False, travel_times=None):
+        self.spec = spec
+        self.frequencies = frequencies
+        self.travel_times = travel_times
+        self.on_block = on_block
+        self.cache = cache
+        self.jobs = jobs
+        self.check_shard = check_shard
+        self.time_lists = spec.get('time_lists', {})
+        self.stop_patterns = spec.get('stop_patterns', {})
+        self.schedule = CompiledSchedule(
+            agency=spec['agency'],
+            stops=[dict(stop) for stop in spec['stops']],
+            routes=[dict(route) for route in spec['routes']],
+            service_periods=[dict(period) for period in spec['service_periods']],
+            hub=spec.get('hub'))
+
+    def _Lookup(self, index, key, kind):
+        try:
+            return index[key]
+        except KeyError:
+            raise SpecError('Unknown %s %r' % (kind, key))
+
+    def Stop(self, key):
+        return self._Lookup(self.schedule.stop_index, key, 'stop')
+
+    def Route(self, key):
+        return self._Lookup(self.schedule.route_index, key, 'route')
+
+    def Service(self, key):
+        return self._Lookup(self.schedule.service_index, key, 'service period')
+
+    def Hub(self, group):
+        hub = group.get('hub', self.schedule.hub)
+        if hub is None:
+            raise SpecError('Trip group %r needs a hub' % (group,))
+        return self.Stop(hub)
+
+    def StopPattern(self, value):
+        "Return (stop indexes, cumulative offsets in seconds) for a stop offset list."
+        if not isinstance(value, list):
+            value = self._Lookup(self.stop_patterns, value, 'stop pattern')
+        if not value:
+            raise SpecError('Empty stop pattern')
+        stops, offsets, offset = [], [], 0
+        for entry in value:
+            offset += gtfs_time.Minutes(entry['delta_minutes'])
+            stops.append(self.Stop(entry['stop']))
+            offsets.append(offset)
+        return stops, offsets
+
+    def Resolve(self, group):
+        """Resolve the names and times in a trip group.
+
+        Returns one dict per service period the group runs in, holding only
+        indexes, strings and seconds: "kind", "route", "service", "headsign",
+        "stops", "starts" and either "offsets" (shared by every trip) or
+        "deltas" (the hub arrival of each to_hub trip). Groups with a headway
+        pattern also have "headway", its (start, end, interval), and
+        "frequencies", whether to write them as a frequency-based trip.
+        """
+        kind = group.get('kind')
+        hub = self.Hub(group)
+        route = self.Route(group['route'])
+        if kind == 'to_hub':
+            headsign = group.get('headsign', 'To %s' % self.schedule.stops[hub]['name'])
+            if 'trips' in group:
+                entries = [(self.Service(service), gtfs_time.ParseTime(start), gtfs_time.Minutes(delta))
+                           for service, start, delta in group['trips']]
+            else:
+                service = self.Service(group['service_period'])
+                delta = gtfs_time.Minutes(group['delta_minutes'])
+                entries = [(service, start, delta)
+                           for start in ExpandTimes(group['start_times'], self.time_lists)]
+            resolved = collections.OrderedDict()
+            for service, start, delta in entries:
+                if service not in resolved:
+                    resolved[service] = {
+                        'kind': kind, 'route': route, 'service': service, 'headsign': headsign,
+                        'stops': [self.Stop(group['initial_stop']), hub], 'starts': [], 'deltas': []}
+                resolved[service]['starts'].append(start)
+                resolved[service]['deltas'].append(delta)
+            return list(resolved.values())
+        if kind in ('from_hub', 'loop'):
+            stops, offsets = self.StopPattern(group['stops'])
+            resolved = {'kind': kind, 'route': route, 'service': self.Service(group['service_period']),
+                        'headsign': group['headsign'], 'stops': [hub] + stops, 'offsets': [0] + offsets,
+                        'starts': ExpandTimes(group['start_times'], self.time_lists)}
+            headway = HeadwayPattern(group['start_times'], self.time_lists)
+            frequencies = group.get('frequencies', self.frequencies and headway is not None)
+            if frequencies and headway is None:
+                raise SpecError('Trip group %r needs a headway pattern for frequencies' % (group,))
+            if headway is not None:
+                resolved['headway'] = list(headway)
+                resolved['frequencies'] = bool(frequencies)
+            return [resolved]
+        raise SpecError('Unknown trip group kind %r' % kind)
+
+    def Shards(self):
+        """Return the resolved trip groups split by (route, service period).
+
+        Shards are ordered by first appearance in the spec, and the groups of
+        a shard keep their spec order.
+        """
+        shards = collections.OrderedDict()
+        for group in self.spec.get('trips', []):
+            for resolved in self.Resolve(group):
+                shards.setdefault((resolved['route'], resolved['service']), []).append(resolved)
+        return shards
+
+    def ShardInputs(self, route, service, groups):
+        "Return everything the rows of a shard depend on, for hashing."
+        stops = sorted(set(stop for group in groups for stop in group['stops']))
+        inputs = {
+            'route': [route, self.schedule.routes[route]],
+            'service': [service, self.schedule.service_periods[service]['id']],
+            'stops': [[stop, self.schedule.stops[stop]] for stop in stops],
+            'groups': groups,
+        }
+        if self.travel_times is not None:
+            # Shards the model has no times for stay cached as without it.
+            travel_times = self.travel_times.Inputs(
+                [self.Segment(a, b) for group in groups
+                 for a, b in zip(group['stops'], group['stops'][1:])])
+            if travel_times:
+                inputs['travel_times'] = travel_times
+        return inputs
+
+    def Segment(self, from_stop, to_stop):
+        "Return the spec ids of a pair of stop indexes."
+        stops = self.schedule.stops
+        return stops[from_stop]['id'], stops[to_stop]['id']
+
+    def TimedTrips(self, stops, starts, deltas):
+        """Return the stop times of trips leaving at `starts`, back to back.
+
+        `deltas` are the default travel times to each stop from the previous
+        one, in seconds; the travel time model may change them.
+        """
+        segments = [self.Segment(a, b) for a, b in zip(stops, stops[1:])]
+        seconds = self.travel_times.Seconds
+        times = []
+        for start in starts:
+            time = start
+            times.append(time)
+            for (from_stop, to_stop), delta in zip(segments, deltas):
+                time += seconds(from_stop, to_stop, time, delta)
+                times.append(time)
+        return times
+
+    def Expand(self, group):
+        "Append the trips of a resolved group."
+        stops = group['stops']
+        count = len(stops) - 1
+        if group['kind'] == 'to_hub':
+            if self.travel_times is not None:
+                times = []
+                for start, delta in zip(group['starts'], group['deltas']):
+                    times.extend(self.TimedTrips(stops, [start], [delta]))
+            else:
+                times = [time for start, delta in zip(group['starts'], group['deltas'])
+                         for time in (start, start + delta)]
+            pickups, drop_offs = [REGULAR, NOT_AVAILABLE], [NOT_AVAILABLE, REGULAR]
+        else:
+            offsets = group['offsets']
+            if group.get('frequencies'):
+                start, end, interval = group['headway']
+                self.schedule.AddFrequency(self.schedule.NumTrips(), start, end + interval, interval)
+            if self.travel_times is not None:
+                deltas = [b - a for a, b in zip(offsets, offsets[1:])]
+                starts = [group['headway'][0]] if group.get('frequencies') else group['starts']
+                times = self.TimedTrips(stops, starts, deltas)
+            elif group.get('frequencies'):
+                times = [group['headway'][0] + offset for offset in offsets]
+            elif 'headway' in group:
+                start, end, interval = group['headway']
+                times = Headways(start, end, interval, offsets)
+            else:
+                times = Broadcast(group['starts'], offsets)
+            if group['kind'] == 'loop':
+                pickups = [REGULAR] * count + [NOT_AVAILABLE]
+                drop_offs = [NOT_AVAILABLE] * count + [REGULAR]
+            else:
+                pickups = [REGULAR] + [NOT_AVAILABLE] * count
+                drop_offs = [NOT_AVAILABLE] + [REGULAR] * count
+        self.schedule.AddTrips(group['route'], group['service'], group['headsign'],
+                               stops, times, pickups, drop_offs)
+
+    def ExpandShard(self, groups):
+        """Expand the groups of one shard into a schedule of their own.
+
+        Returns (rows, check): the Rows() of the shard and the result of
+        `check_shard` on them, if set. Run in the worker processes.
+        """
+        self.schedule = schedule = CompiledSchedule(
+            self.schedule.agency, self.schedule.stops, self.schedule.routes,
+            self.schedule.service_periods, self.schedule.hub)
+        for group in groups:
+            self.Expand(group)
+        schedule.AssignTripIds()
+        check = self.check_shard(schedule) if self.check_shard is not None else None
+        return schedule.Rows(), check
+
+    def Compile(self):
+        schedule = self.schedule
+        shards = self.Shards()
+        digests = {}
+        if self.cache is not None:
+            for (route, service), groups in shards.items():
+                digests[route, service] = self.cache.Digest(self.ShardInputs(route, service, groups))
+        pool, pending, waiting = None, {}, collections.deque()
+        if self.jobs > 1:
+            pool = multiprocessing.Pool(self.jobs, _InitWorker,
+                                        (self.spec, self.check_shard, self.travel_times))
+            waiting.extend(key for key in shards
+                           if key not in digests or not self.cache.Contains(digests[key]))
+        try:
+            for key, groups in shards.items():
+                # Keep a few shards per worker in flight, so that finished
+                # rows do not pile up ahead of the one being written.
+                while waiting and len(pending) < 2 * self.jobs:
+                    next_key = waiting.popleft()
+                    pending[next_key] = pool.apply_async(_ExpandShard, (shards[next_key],))
+                first_trip = schedule.NumTrips()
+                schedule.from_cache = False
+                schedule.shard_check = None
+                if key in digests:
+                    schedule.from_cache = self.cache.Load(digests[key], schedule)
+                if not schedule.from_cache:
+                    if key in pending:
+                        rows, schedule.shard_check = pending.pop(key).get()
+                        schedule.ExtendRows(rows)
+                    else:
+                        for group in groups:
+                            self.Expand(group)
+                    if key in digests:
+                        self.cache.Store(digests[key], schedule.Rows(first_trip))
+                schedule.AssignTripIds()
+                if self.on_block is not None:
+                    self.on_block(schedule)
+                    schedule.ClearRows()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+        schedule.from_cache = False
+        schedule.shard_check = None
+        return schedule
+
+_worker_compiler = None
+
+def _InitWorker(spec, check_shard, travel_times):
+    global _worker_compiler
+    _worker_compiler = _Compiler(spec, check_shard=check_shard, travel_times=travel_times)
+
+def _ExpandShard(groups):
+    return _worker_compiler.ExpandShard(groups)
+
+def CompileSpec(spec, on_block=None, cache=None, jobs=1, check_shard=None, frequencies=False,
+                travel_times=None):
+    """Expand the trip groups of `spec` into a CompiledSchedule.
+
+    Trips are expanded in blocks, one per (route, service period). If
+    `on_block` is given it is called with the schedule after each block, and
+    the block's rows are dropped once it returns, so memory use stays
+    proportional to the largest block rather than the whole feed. If `cache`
+    (a build_cache.BuildCache) is given, blocks whose inputs are unchanged
+    since an earlier build are spliced in from it instead of being expanded;
+    `schedule.from_cache` tells `on_block` which ones those are.
+
+    With `jobs` > 1 the blocks are expanded by a pool of that many worker
+    processes, which also run `check_shard` (a module level function taking
+    the block's CompiledSchedule) on them. Blocks are still handed to
+    `on_block` in spec order and trip ids are assigned in this process, so
+    the output is the same as with a single job.
+
+    With `frequencies` every from_hub and loop group with a headway pattern
+    that does not set "frequencies" itself becomes a frequency-based trip.
+
+    `travel_times`, a travel_times.TravelTimeModel, overrides the fixed
+    "delta_minutes" of the spec.
+    """
+    return _Compiler(spec, on_block, cache, jobs, check_shard, frequencies,
+                     travel_times).Compile()
@@ -0,0 +1,53 @@
+# coding=UTF8
+"""Tests of schedule_spec: io2017.json carries what the map and the backend read."""
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+import feed_reader
+import feed_writer
+import schedule_spec
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+SPEC = os.path.join(DIRECTORY, 'io2017.json')
+COLOR = re.compile(r'^[0-9A-F]{6}$')
+
+def _Rows(path, table):
+    "Return the rows of `table` in the feed at `path`, sorted, without empty values."
+    with feed_reader.Feed(path) as feed:
+        return sorted(sorted((column, value) for column, value in row.items() if value)
+                      for row in feed.ReadDicts(table))
+
+class Io2017SpecTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.compiled = schedule_spec.CompileSpec(schedule_spec.LoadSpec(SPEC))
+
+    def testRouteColors(self):
+        for route in self.compiled.routes:
+            self.assertTrue(COLOR.match(route.get('color', '')), route['id'])
+            self.assertTrue(COLOR.match(route.get('text_color', '')), route['id'])
+
+    def testAgency(self):
+        self.assertEqual(self.compiled.agency['name'], 'Google I/O Buses')
+
+    def testCheckedInTables(self):
+        # The map and the backend read google_transit/; regenerating it from
+        # the spec must not lose columns they use.
+        directory = tempfile.mkdtemp(prefix='schedule-spec-test-')
+        try:
+            zip_path = os.path.join(directory, 'feed.zip')
+            with feed_writer.FeedWriter(zip_path) as writer:
+                feed_writer.WriteMetadata(writer, self.compiled)
+            for table in ('agency.txt', 'routes.txt', 'stops.txt'):
+                self.assertEqual(_Rows(zip_path, table),
+                                 _Rows(os.path.join(DIRECTORY, 'google_transit'), table), table)
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
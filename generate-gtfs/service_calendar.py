@@ -0,0 +1,164 @@
+# coding=UTF8
+"""Calendar compression.
+
+Specs list the trips of each day under that day's service period, so a
+conference running the same shuttles on several days repeats every trip
+once per day. CompressSpec() finds the trips that are identical but for
+their service period, and moves each onto one service period covering all
+of their days: trips running on day1, day2 and day3 alike are written once
+under 'day1+day2+day3'. Two trips are identical when their groups match
+in everything but the service period, start times and note, and have the
+same start time (and, for to_hub trips, the same delta_minutes). A trip
+listed more than once on a day is a copy, e.g. a second bus: copies merge
+only as many times as every day has them, and the extra copies stay on
+their own days. The trips and stop times written shrink by about the
+number of days.
+
+CalendarPattern() encodes the dates of a service period as a weekly
+calendar.txt row plus calendar_dates.txt exceptions, when that takes fewer
+rows than listing every date.
+"""
+
+import collections
+import datetime
+import json
+
+import gtfs_time
+import schedule_spec
+
+# Group keys holding its trips and service periods, rather than what its trips are like.
+TRIP_KEYS = ('service_period', 'start_times', 'trips', 'delta_minutes')
+
+# Group keys that do not make its trips different.
+IGNORED_KEYS = ('note',)
+
+def _Date(text):
+    return datetime.datetime.strptime(text, '%Y%m%d').date()
+
+def _Trips(group, time_lists):
+    "Return [(service period id, trip key, start seconds, delta)] for a trip group."
+    if group.get('kind') == 'to_hub' and 'trips' in group:
+        return [(service, (gtfs_time.ParseTime(start), gtfs_time.Minutes(delta)),
+                 gtfs_time.ParseTime(start), delta)
+                for service, start, delta in group['trips']]
+    delta = group.get('delta_minutes')
+    trips = []
+    for start in schedule_spec.ExpandTimes(group['start_times'], time_lists):
+        key = (start, gtfs_time.Minutes(delta)) if delta is not None else (start,)
+        trips.append((group['service_period'], key, start, delta))
+    return trips
+
+def _StartTimes(groups, starts, time_lists):
+    """Return the start_times of one of `groups` if it has exactly `starts`,
+    keeping time list names and headway patterns, else a list of times."""
+    seconds = [start for start, _ in starts]
+    for group in groups:
+        if schedule_spec.ExpandTimes(group['start_times'], time_lists) == seconds:
+            return group['start_times']
+    return [gtfs_time.FormatTime(start) for start in seconds]
+
+def CompressSpec(spec):
+    """Return a copy of `spec` with identical trips of different service
+    periods moved onto shared service periods.
+
+    The merged service periods are named after their days joined with '+'
+    and come after the original ones still used. Groups whose trips all
+    keep the same service periods are left as they are.
+    """
+    time_lists = spec.get('time_lists', {})
+    periods = collections.OrderedDict((period['id'], period) for period in spec['service_periods'])
+    # Group template -> trip key -> (start, delta, {service period id: copies}).
+    templates = collections.OrderedDict()
+    originals = collections.defaultdict(list)
+    for group in spec.get('trips', []):
+        template = collections.OrderedDict(
+            (key, value) for key, value in group.items() if key not in TRIP_KEYS)
+        signature = json.dumps(dict((key, value) for key, value in template.items()
+                                    if key not in IGNORED_KEYS), sort_keys=True)
+        trips = templates.setdefault(signature, (template, collections.OrderedDict()))[1]
+        originals[signature].append(group)
+        for service, key, start, delta in _Trips(group, time_lists):
+            if service not in periods:
+                raise schedule_spec.SpecError('Unknown service period %r' % service)
+            entry = trips.setdefault(key, (start, delta, collections.OrderedDict()))
+            entry[2][service] = entry[2].get(service, 0) + 1
+    order = dict((service, i) for i, service in enumerate(periods))
+    merged = collections.OrderedDict()
+    compressed_trips = []
+    used = set()
+    for signature, (template, trips) in templates.items():
+        by_services = collections.OrderedDict()
+        for start, delta, copies in trips.values():
+            copies = dict(copies)
+            # Peel off the copies every remaining day has, fewest first.
+            while copies:
+                services = tuple(sorted(copies, key=order.get))
+                count = min(copies.values())
+                by_services.setdefault(services, []).extend([(start, delta)] * count)
+                copies = dict((service, left - count) for service, left in copies.items()
+                              if left > count)
+        if all(len(services) == 1 for services in by_services):
+            # Nothing to share: keep the groups as written.
+            compressed_trips.extend(originals[signature])
+            used.update(services[0] for services in by_services)
+            continue
+        to_hub_entries = []
+        for services, starts in by_services.items():
+            if len(services) == 1:
+                service = services[0]
+                used.add(service)
+            else:
+                service = '+'.join(services)
+                if service not in merged:
+                    dates = sorted(set(date for period in services
+                                       for date in periods[period]['dates']))
+                    merged[service] = {'id': service, 'dates': dates}
+            if template.get('kind') == 'to_hub':
+                to_hub_entries.extend([service, gtfs_time.FormatTime(start), delta]
+                                      for start, delta in starts)
+            else:
+                group = collections.OrderedDict(template)
+                group['service_period'] = service
+                group['start_times'] = _StartTimes(originals[signature], starts, time_lists)
+                if isinstance(group['start_times'], list):
+                    # Only a headway pattern can be written as frequencies.
+                    group.pop('frequencies', None)
+                compressed_trips.append(group)
+        if to_hub_entries:
+            group = collections.OrderedDict(template)
+            group['trips'] = to_hub_entries
+            compressed_trips.append(group)
+    compressed = collections.OrderedDict(spec)
+    compressed['service_periods'] = (
+        [period for service, period in periods.items() if service in used] + list(merged.values()))
+    compressed['trips'] = compressed_trips
+    return compressed
+
+def CalendarPattern(dates):
+    """Return (calendar, added, removed) encoding the YYYYMMDD `dates` as a
+    weekly pattern, or None if listing the dates takes fewer rows.
+
+    `calendar` is (weekday flags from Monday, start date, end date); `added`
+    and `removed` are the dates of exception_type 1 and 2.
+    """
+    days = sorted(set(_Date(date) for date in dates))
+    if len(days) < 2:
+        return None
+    start, end = days[0], days[-1]
+    span = [start + datetime.timedelta(days=offset) for offset in range((end - start).days + 1)]
+    covered = set(days)
+    occurrences, hits = collections.Counter(), collections.Counter()
+    for day in span:
+        occurrences[day.weekday()] += 1
+        hits[day.weekday()] += day in covered
+    # A weekday is in the pattern if that removes more additions than it needs removals.
+    flags = [int(hits[weekday] > occurrences[weekday] - hits[weekday]) for weekday in range(7)]
+    if not any(flags):
+        return None
+    added = [day for day in days if not flags[day.weekday()]]
+    removed = [day for day in span if flags[day.weekday()] and day not in covered]
+    if 1 + len(added) + len(removed) >= len(days):
+        return None
+    text = lambda day: day.strftime('%Y%m%d')
+    return ((flags, text(start), text(end)), [text(day) for day in added],
+            [text(day) for day in removed])
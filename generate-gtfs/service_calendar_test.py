@@ -0,0 +1,71 @@
+# coding=UTF8
+"""Tests of service_calendar: compressed specs run the same trips on the same days."""
+
+import collections
+import copy
+import os
+import unittest
+
+import schedule_spec
+import service_calendar
+
+SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'io2017.json')
+
+def TripDays(spec):
+    "Return a Counter of (route id, headsign, stop times, date) over the trips of `spec`."
+    compiled = schedule_spec.CompileSpec(spec)
+    trip_days = collections.Counter()
+    for trip in range(compiled.NumTrips()):
+        stop_times = tuple((compiled.stops[stop]['id'], time, pickup, drop_off)
+                           for stop, time, pickup, drop_off in compiled.StopTimes(trip))
+        trip_key = (compiled.routes[compiled.trip_route[trip]]['id'],
+                    compiled.headsigns[compiled.trip_headsign[trip]], stop_times)
+        for date in compiled.service_periods[compiled.trip_service[trip]]['dates']:
+            trip_days[trip_key + (date,)] += 1
+    return trip_days
+
+class CompressSpecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.spec = schedule_spec.LoadSpec(SPEC)
+
+    def testTripDaysRoundTrip(self):
+        compressed = service_calendar.CompressSpec(self.spec)
+        self.assertEqual(TripDays(compressed), TripDays(self.spec))
+        self.assertLess(schedule_spec.CompileSpec(compressed).NumTrips(),
+                        schedule_spec.CompileSpec(self.spec).NumTrips())
+
+    def testCopiesOnOneDay(self):
+        spec = copy.deepcopy(self.spec)
+        # Two buses at 07:00 on day1 and one on day2 make one trip on
+        # day1+day2 and one on day1; three at 08:00 on day1 and two on day2
+        # and day3 make two on day1+day2+day3 and one on day1.
+        spec['trips'] = [{'kind': 'to_hub', 'route': 'yellowRoute',
+                          'initial_stop': 'sheratonPaloAlto', 'trips': [
+                              ['day1', '07:00:00', 30], ['day1', '07:00:00', 30],
+                              ['day2', '07:00:00', 30],
+                              ['day1', '08:00:00', 30], ['day1', '08:00:00', 30],
+                              ['day1', '08:00:00', 30], ['day2', '08:00:00', 30],
+                              ['day2', '08:00:00', 30], ['day3', '08:00:00', 30],
+                              ['day3', '08:00:00', 30]]},
+                         {'kind': 'from_hub', 'route': 'limeRoute', 'service_period': 'day1',
+                          'headsign': 'To Avatar Hotel',
+                          'start_times': ['17:00:00', '17:00:00'],
+                          'stops': [{'stop': 'avatarHotel', 'delta_minutes': 25}]},
+                         {'kind': 'from_hub', 'route': 'limeRoute', 'service_period': 'day2',
+                          'headsign': 'To Avatar Hotel',
+                          'start_times': ['17:00:00'],
+                          'stops': [{'stop': 'avatarHotel', 'delta_minutes': 25}]}]
+        compressed = service_calendar.CompressSpec(spec)
+        self.assertEqual(TripDays(compressed), TripDays(spec))
+        self.assertEqual(schedule_spec.CompileSpec(compressed).NumTrips(), 7)
+
+    def testNothingToShare(self):
+        spec = copy.deepcopy(self.spec)
+        spec['trips'] = [group for group in spec['trips']
+                         if group.get('service_period') == 'day1']
+        compressed = service_calendar.CompressSpec(spec)
+        self.assertEqual(compressed['trips'], spec['trips'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# coding=UTF8
+"""Simulate passenger demand against the vehicle capacity of a spec's schedule.
+
+Reads the arrival demand per stop from a CSV file (see demand_simulation.py),
+boards the passengers onto the trips of one service date, and prints the
+wait at every stop and the most loaded trips. --trips-csv and --stops-csv
+write the load of every trip and the waits at every stop in full.
+"""
+
+import collections
+import os
+import sys
+import time
+from optparse import OptionParser
+
+import demand_simulation
+import feed_writer
+import gtfs_time
+import schedule_spec
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+parser = OptionParser(usage='%prog [--demand CSV] [--date YYYYMMDD] [--capacity N] '
+                            '[--passengers N]')
+parser.add_option('--spec', dest='spec',
+                  help='Schedule spec to simulate')
+parser.add_option('--demand', dest='demand',
+                  help='CSV file of passenger arrivals per stop')
+parser.add_option('--date', dest='date',
+                  help='Service date to simulate, YYYYMMDD; the busiest by default')
+parser.add_option('--capacity', dest='capacity', type='int',
+                  help='Passengers per vehicle on routes without a "capacity" in the spec')
+parser.add_option('--passengers', dest='passengers', type='int',
+                  help='Scale the demand to this many passengers in all')
+parser.add_option('--cohort-seconds', dest='cohort_seconds', type='int',
+                  help='Passengers arriving at a stop within this many seconds board together')
+parser.add_option('--top', dest='top', type='int',
+                  help='Number of most loaded trips to print')
+parser.add_option('--trips-csv', dest='trips_csv',
+                  help='Write the load of every trip to this CSV file')
+parser.add_option('--stops-csv', dest='stops_csv',
+                  help='Write the waits at every stop to this CSV file')
+parser.set_defaults(capacity=demand_simulation.DEFAULT_CAPACITY, cohort_seconds=60, top=20,
+                    spec=os.path.join(DIRECTORY, 'io2017.json'),
+                    demand=os.path.join(DIRECTORY, 'io2017_demand.csv'))
+(options, args) = parser.parse_args()
+
+if args:
+    parser.error('unexpected arguments %s' % ' '.join(args))
+if options.capacity < 1 or options.cohort_seconds < 1:
+    parser.error('--capacity and --cohort-seconds must be positive')
+
+compiled = schedule_spec.CompileSpec(schedule_spec.LoadSpec(options.spec))
+trips_per_date = collections.Counter()
+for service in compiled.trip_service:
+    trips_per_date.update(compiled.service_periods[service]['dates'])
+date = options.date or min(trips_per_date, key=lambda date: (-trips_per_date[date], date))
+try:
+    demand = demand_simulation.ReadDemand(options.demand, compiled.stop_index)
+except (IOError, ValueError) as e:
+    parser.error(str(e))
+except KeyError as e:
+    parser.error('%s has no %s column' % (options.demand, e))
+
+started = time.time()
+simulation = demand_simulation.DemandSimulation(compiled, date, demand, options.capacity,
+                                                options.cohort_seconds, options.passengers)
+setup_seconds = time.time() - started
+started = time.time()
+events = simulation.Run()
+run_seconds = time.time() - started
+
+def StopId(stop):
+    return compiled.stops[stop]['id']
+
+for stop, to_stop, passengers in simulation.Unserved():
+    sys.stderr.write('Demand: no trip from %s to %s on %s for %d passengers\n' % (
+        StopId(stop), StopId(to_stop), date, passengers))
+trip_rows = simulation.TripRows()
+stop_rows = simulation.StopRows()
+minutes = lambda seconds: '%.1f' % (seconds / 60.0)
+
+print('%-28s %10s %9s %9s %9s %9s %9s %11s' % (
+    'stop', 'passengers', 'boarded', 'stranded', 'mean min', 'p95 min', 'max min',
+    'left behind'))
+for stop_id, passengers, boarded, stranded, mean, p95, longest, left_behind in stop_rows:
+    print('%-28s %10d %9d %9d %9s %9s %9s %11d' % (
+        stop_id, passengers, boarded, stranded, minutes(mean), minutes(p95), minutes(longest),
+        left_behind))
+print('')
+print('%-52s %8s %-18s %9s %9s %7s %11s' % (
+    'trip', 'start', 'route', 'boardings', 'peak', 'load', 'left behind'))
+for row in sorted(trip_rows, key=lambda row: (-row[6], -row[7], row[1], row[0]))[:options.top]:
+    trip_id, start, route_id, capacity, boardings, peak, load_factor, left_behind = row
+    print('%-52s %8s %-18s %9d %4d/%-4d %6.0f%% %11d' % (
+        trip_id, gtfs_time.FormatTime(start), route_id, boardings, peak, capacity,
+        load_factor * 100, left_behind))
+
+total = sum(row[1] for row in stop_rows)
+boarded = sum(row[2] for row in stop_rows)
+full = sum(1 for row in trip_rows if row[7])
+sys.stderr.write('Demand: %d passengers in %d cohorts on %s, %d boarded, %d stranded; '
+                 '%d of %d trips left passengers behind\n' % (
+                     total, len(simulation.cohort_time), date, boarded, total - boarded, full,
+                     len(trip_rows)))
+sys.stderr.write('Demand: %d stop events simulated in %.3f s (set up in %.3f s)\n' % (
+    events, run_seconds, setup_seconds))
+
+if options.trips_csv:
+    feed_writer.WriteTable(options.trips_csv,
+                           ('trip_id', 'start_time', 'route_id', 'capacity', 'boardings',
+                            'peak_load', 'load_factor', 'left_behind'),
+                           ((trip_id, gtfs_time.FormatTime(start), route_id, capacity, boardings,
+                             peak, '%.3f' % load_factor, left_behind)
+                            for trip_id, start, route_id, capacity, boardings, peak, load_factor,
+                            left_behind in trip_rows))
+if options.stops_csv:
+    feed_writer.WriteTable(options.stops_csv,
+                           ('stop_id', 'passengers', 'boarded', 'stranded', 'mean_wait_seconds',
+                            'p95_wait_seconds', 'max_wait_seconds', 'left_behind'),
+                           ((stop_id, passengers, boarded, stranded, '%.0f' % mean, p95,
+                             longest, left_behind)
+                            for stop_id, passengers, boarded, stranded, mean, p95, longest,
+                            left_behind in stop_rows))
@@ -0,0 +1,105 @@
+# coding=UTF8
+"""Synthetic scale-up of schedule specs, for benchmarks.
+
+ScaleSpec() multiplies a spec along three independent axes:
+
+  copies   The whole network is repeated as that many venues, each with its
+           own copy of every stop (shifted north), route and trip group.
+  days     Every service period is repeated on that many consecutive weeks.
+  density  Every start time becomes `density` departures, one minute apart,
+           as if the headways were that many times shorter.
+
+The number of trips grows by copies * days * density. The copies keep the
+structure of the original, so they exercise the same code paths.
+"""
+
+import collections
+import copy
+import datetime
+
+import gtfs_time
+import schedule_spec
+
+# Degrees of latitude between two copies of a stop.
+COPY_LATITUDE_SHIFT = 0.1
+
+def _Suffix(key, index, tag):
+    return key if index == 0 else '%s_%s%d' % (key, tag, index + 1)
+
+def _ShiftDate(date, weeks):
+    day = datetime.datetime.strptime(date, '%Y%m%d') + datetime.timedelta(weeks=weeks)
+    return day.strftime('%Y%m%d')
+
+def _Densify(times, density):
+    return sorted(time + 60 * step for time in times for step in range(density))
+
+def Factors(scale):
+    """Split `scale` into (copies, days, density) with that product.
+
+    Prime factors, largest first, are dealt out to the three axes in turn,
+    so that each grows at a similar rate: 10 is (5, 2, 1), 100 is (10, 5, 2)
+    and 1000 is (10, 10, 10).
+    """
+    factors, remaining, divisor = [], scale, 2
+    while remaining > 1:
+        while remaining % divisor == 0:
+            factors.append(divisor)
+            remaining //= divisor
+        divisor += 1
+    axes = [1, 1, 1]
+    for i, factor in enumerate(sorted(factors, reverse=True)):
+        axes[i % 3] *= factor
+    return tuple(axes)
+
+def ScaleSpec(spec, copies=1, days=1, density=1):
+    "Return a copy of `spec` scaled up by `copies`, `days` and `density`."
+    time_lists = spec.get('time_lists', {})
+    scaled = collections.OrderedDict()
+    scaled['agency'] = copy.deepcopy(spec['agency'])
+    scaled['service_periods'] = [
+        {'id': _Suffix(period['id'], day, 'w'),
+         'dates': [_ShiftDate(date, day) for date in period['dates']]}
+        for day in range(days) for period in spec['service_periods']]
+    scaled['stops'] = [
+        dict(stop, id=_Suffix(stop['id'], venue, 'v'),
+             lat=float(stop['lat']) + venue * COPY_LATITUDE_SHIFT)
+        for venue in range(copies) for stop in spec['stops']]
+    scaled['routes'] = [dict(route, id=_Suffix(route['id'], venue, 'v'))
+                        for venue in range(copies) for route in spec['routes']]
+    scaled['hub'] = spec.get('hub')
+    scaled['time_lists'] = {}
+    scaled['stop_patterns'] = collections.OrderedDict(
+        (_Suffix(name, venue, 'v'),
+         [dict(entry, stop=_Suffix(entry['stop'], venue, 'v')) for entry in pattern])
+        for venue in range(copies) for name, pattern in spec.get('stop_patterns', {}).items())
+    scaled['trips'] = []
+    for venue in range(copies):
+        rename = lambda key: _Suffix(key, venue, 'v')
+        for group in spec.get('trips', []):
+            group = copy.deepcopy(group)
+            group['route'] = rename(group['route'])
+            if 'hub' in group or venue:
+                group['hub'] = rename(group.get('hub', spec.get('hub')))
+            if 'initial_stop' in group:
+                group['initial_stop'] = rename(group['initial_stop'])
+            if 'stops' in group:
+                if isinstance(group['stops'], list):
+                    group['stops'] = [dict(entry, stop=rename(entry['stop'])) for entry in group['stops']]
+                else:
+                    group['stops'] = rename(group['stops'])
+            if 'trips' in group:
+                group['trips'] = [
+                    [_Suffix(service, day, 'w'), gtfs_time.FormatTime(start), delta]
+                    for service, start, delta in group['trips'] for day in range(days)
+                    for start in _Densify([gtfs_time.ParseTime(start)], density)]
+            else:
+                starts = _Densify(schedule_spec.ExpandTimes(group['start_times'], time_lists), density)
+                group['start_times'] = [gtfs_time.FormatTime(start) for start in starts]
+            for day in range(days):
+                day_group = dict(group)
+                if 'service_period' in group:
+                    day_group['service_period'] = _Suffix(group['service_period'], day, 'w')
+                elif day:
+                    continue
+                scaled['trips'].append(day_group)
+    return scaled
@@ -0,0 +1,149 @@
+# coding=UTF8
+"""Grid index over stop locations.
+
+Stops are bucketed into square-ish grid cells of a fixed size in meters, so
+radius and nearest-stop queries only look at the few cells around the query
+point instead of every stop. Building the index is O(n); finding every pair
+of stops within a radius is O(n) for evenly spread stops, where the pairwise
+check is O(n^2).
+"""
+
+import collections
+import math
+
+import feed_shapes
+
+# Meters per degree of latitude.
+METERS_PER_DEGREE = math.pi * feed_shapes.EARTH_RADIUS_METERS / 180
+
+class StopIndex(object):
+    "A grid over a list of (lat, lng) points; queries return point indexes."
+
+    def __init__(self, points, cell_meters=200.0):
+        self.points = [(float(lat), float(lng)) for lat, lng in points]
+        self.cell_meters = cell_meters
+        self.cell_lat = cell_meters / METERS_PER_DEGREE
+        # Cells are sized for the highest latitude so none is narrower than
+        # cell_meters.
+        max_lat = max([abs(lat) for lat, _ in self.points] or [0])
+        self._min_cos = max(math.cos(math.radians(max_lat)), 0.01)
+        self.cell_lng = self.cell_lat / self._min_cos
+        self.cells = collections.defaultdict(list)
+        for i, (lat, lng) in enumerate(self.points):
+            self.cells[self._Cell(lat, lng)].append(i)
+        if self.cells:
+            rows = [row for row, _ in self.cells]
+            columns = [column for _, column in self.cells]
+            self._bounds = (min(rows), max(rows), min(columns), max(columns))
+
+    def _Cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_lat)), int(math.floor(lng / self.cell_lng))
+
+    def _Distances(self, lat, lng, candidates):
+        points = self.points
+        return feed_shapes.Haversine([lat] * len(candidates), [lng] * len(candidates),
+                                     [points[i][0] for i in candidates],
+                                     [points[i][1] for i in candidates])
+
+    def Within(self, lat, lng, radius):
+        "Return [(index, distance)] of the points within `radius` meters, nearest first."
+        row, column = self._Cell(lat, lng)
+        rows = int(math.ceil(radius / self.cell_meters))
+        cos = max(math.cos(math.radians(lat)), self._min_cos)
+        columns = int(math.ceil(radius / (self.cell_lng * METERS_PER_DEGREE * cos)))
+        candidates = [i for r in range(row - rows, row + rows + 1)
+                      for c in range(column - columns, column + columns + 1)
+                      for i in self.cells.get((r, c), ())]
+        distances = self._Distances(lat, lng, candidates)
+        found = [(distance, i) for i, distance in zip(candidates, distances) if distance <= radius]
+        return [(i, distance) for distance, i in sorted(found)]
+
+    def _Ring(self, row, column, ring):
+        "Yield the cells at Chebyshev distance `ring` from (row, column) within the bounds."
+        min_row, max_row, min_column, max_column = self._bounds
+        first_column, last_column = max(column - ring, min_column), min(column + ring, max_column)
+        for r in (row - ring, row + ring) if ring else (row,):
+            if min_row <= r <= max_row:
+                for c in range(first_column, last_column + 1):
+                    yield r, c
+        if ring:
+            for r in range(max(row - ring + 1, min_row), min(row + ring - 1, max_row) + 1):
+                for c in (column - ring, column + ring):
+                    if min_column <= c <= max_column:
+                        yield r, c
+
+    def Nearest(self, lat, lng, max_distance=None):
+        "Return (index, distance) of the point nearest to (lat, lng), or None."
+        if not self.cells:
+            return None
+        row, column = self._Cell(lat, lng)
+        min_row, max_row, min_column, max_column = self._bounds
+        last_ring = max(abs(row - min_row), abs(row - max_row),
+                        abs(column - min_column), abs(column - max_column))
+        # Every point outside ring k is at least k cells of this width away.
+        cell_width = min(self.cell_meters,
+                         self.cell_lng * METERS_PER_DEGREE * math.cos(math.radians(lat)))
+        # Rings closer than this hold no cells of the grid.
+        first_ring = max(0, min_row - row, row - max_row, min_column - column, column - max_column)
+        best = None
+        for ring in range(first_ring, last_ring + 1):
+            reach = (ring - 1) * cell_width if ring else 0
+            if best is not None and best[1] <= reach:
+                break
+            if max_distance is not None and reach > max_distance:
+                break
+            candidates = [i for cell in self._Ring(row, column, ring)
+                          for i in self.cells.get(cell, ())]
+            for i, distance in zip(candidates, self._Distances(lat, lng, candidates)):
+                if best is None or distance < best[1]:
+                    best = (i, distance)
+        if best is None or (max_distance is not None and best[1] > max_distance):
+            return None
+        return best
+
+    def Pairs(self, radius):
+        "Yield (i, j, distance) for every pair of points i < j within `radius` meters."
+        for i, (lat, lng) in enumerate(self.points):
+            for j, distance in self.Within(lat, lng, radius):
+                if j > i:
+                    yield i, j, distance
+
+    def Clusters(self, radius):
+        """Return the groups of points linked by chains of pairs within
+        `radius` meters, as sorted index lists, for groups of two or more."""
+        parents = list(range(len(self.points)))
+        def Root(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+        for i, j, _ in self.Pairs(radius):
+            parents[Root(j)] = Root(i)
+        groups = collections.defaultdict(list)
+        for i in range(len(self.points)):
+            groups[Root(i)].append(i)
+        return sorted(group for group in groups.values() if len(group) > 1)
+
+def StopIndexFor(stops, cell_meters=200.0):
+    "Return a StopIndex over spec or compiled stop dicts with 'lat' and 'lng'."
+    return StopIndex([(stop['lat'], stop['lng']) for stop in stops], cell_meters)
+
+def ParentStations(stops, radius):
+    """Group the stops within `radius` meters of each other into stations.
+
+    Returns a list of (station, children): station is a stop dict with the
+    mean location of its children and their names joined, children the
+    indexes of its stops.
+    """
+    stations = []
+    for children in StopIndexFor(stops, max(radius, 1.0)).Clusters(radius):
+        names = []
+        for child in children:
+            if stops[child]['name'] not in names:
+                names.append(stops[child]['name'])
+        stations.append(({
+            'name': ' / '.join(names),
+            'lat': round(sum(float(stops[child]['lat']) for child in children) / len(children), 6),
+            'lng': round(sum(float(stops[child]['lng']) for child in children) / len(children), 6),
+        }, children))
+    return stations
@@ -0,0 +1,144 @@
+# coding=UTF8
+"""Time-of-day dependent travel times between stops.
+
+A travel time model replaces the fixed `delta_minutes` of a stop pattern
+with a duration that depends on when the vehicle leaves the previous stop.
+Pass one as the `travel_times` of schedule_spec.CompileSpec(); any object
+with the Seconds() and Inputs() methods of TravelTimeModel will do.
+
+SegmentTimes loads observed segment times from a CSV file with the columns
+
+  from_stop, to_stop   stop ids as in the spec
+  from_time, to_time   the departure window, 'HH:MM:SS', end exclusive
+  minutes              an observed travel time
+
+Observations of the same segment and window are averaged. A window must
+end after it starts, and the windows of a segment must not overlap. A
+window may run past midnight, e.g. from 22:00:00 to 26:00:00; a departure after
+24:00:00 outside such windows falls in the window of its time on the next
+day's clock. Departures outside every window of a segment, and segments
+without observations, keep their `delta_minutes`. io2017_travel_times.csv
+is an example for io2017.json.
+"""
+
+import bisect
+import collections
+import csv
+import io
+import sys
+
+try:
+    from math import gcd as _Gcd
+except ImportError:
+    from fractions import gcd as _Gcd
+
+import gtfs_time
+
+PY2 = sys.version_info[0] == 2
+
+SECONDS_PER_DAY = 24 * 3600
+
+class TravelTimeModel(object):
+    "The model that keeps every `delta_minutes`."
+
+    def Seconds(self, from_stop, to_stop, departure, default):
+        """Return the travel time from `from_stop` to `to_stop` (spec stop ids)
+        for a vehicle leaving at `departure`, or `default`, in seconds."""
+        return default
+
+    def Inputs(self, segments):
+        "Return a JSON-serializable description of the model for `segments`, for hashing."
+        return None
+
+class SegmentTimes(TravelTimeModel):
+    "Piecewise constant travel times per segment and departure window."
+
+    def __init__(self, windows):
+        """`windows` maps (from_stop, to_stop) to a list of (from_time, to_time,
+        seconds), in seconds since midnight. Raise ValueError for a window that
+        does not end after it starts or overlaps another of its segment."""
+        self._windows = {}
+        for segment, entries in windows.items():
+            entries = sorted(entries)
+            for i, (start, end, _) in enumerate(entries):
+                if end <= start:
+                    raise ValueError('Window %s of %s -> %s does not end after it starts' % (
+                        _Window(start, end), segment[0], segment[1]))
+                if i and start < entries[i - 1][1]:
+                    raise ValueError('Windows %s and %s of %s -> %s overlap' % (
+                        _Window(*entries[i - 1][:2]), _Window(start, end), segment[0],
+                        segment[1]))
+            self._windows[segment] = ([start for start, _, _ in entries], entries)
+        self._step = _Step(self._windows)
+        self._memo = {}
+
+    def Seconds(self, from_stop, to_stop, departure, default):
+        # Every departure in a bucket of _step seconds falls in the same
+        # window, so the memo holds one lookup per segment and bucket.
+        key = (from_stop, to_stop, departure // self._step)
+        seconds = self._memo.get(key)
+        if seconds is None:
+            seconds = self._memo[key] = self._Lookup(from_stop, to_stop, departure)
+        return default if seconds < 0 else seconds
+
+    def _Lookup(self, from_stop, to_stop, departure):
+        "Return the travel time of the window `departure` falls in, or -1."
+        windows = self._windows.get((from_stop, to_stop))
+        if windows is None:
+            return -1
+        starts, entries = windows
+        times = [departure]
+        if departure >= SECONDS_PER_DAY:
+            times.append(departure % SECONDS_PER_DAY)
+        for time in times:
+            i = bisect.bisect_right(starts, time) - 1
+            if i >= 0 and time < entries[i][1]:
+                return entries[i][2]
+        return -1
+
+    def Inputs(self, segments):
+        return [[list(segment), self._windows[segment][1]]
+                for segment in sorted(set(segments)) if segment in self._windows]
+
+    def __getstate__(self):
+        # The memo is rebuilt in worker processes rather than pickled.
+        return {'_windows': self._windows, '_step': self._step}
+
+    def __setstate__(self, state):
+        self._windows = state['_windows']
+        self._step = state['_step']
+        self._memo = {}
+
+def _Window(start, end):
+    return '%s-%s' % (gtfs_time.FormatTime(start), gtfs_time.FormatTime(end))
+
+def _Step(windows):
+    """Return the largest number of seconds dividing the day and every window
+    bound of `windows`, the bucket width of the SegmentTimes memo."""
+    step = SECONDS_PER_DAY
+    for _, entries in windows.values():
+        for start, end, _ in entries:
+            step = _Gcd(_Gcd(step, start), end)
+    return step
+
+def LoadSegmentTimes(path):
+    """Return the SegmentTimes of the CSV file at `path`; raise ValueError for
+    inverted or overlapping windows."""
+    if PY2:
+        csv_file = open(path, 'rb')
+    else:
+        csv_file = io.open(path, encoding='utf-8-sig', newline='')
+    observations = collections.defaultdict(list)
+    with csv_file:
+        for row in csv.DictReader(csv_file):
+            if PY2:
+                row = dict((key.decode('utf-8-sig'), value.decode('utf-8'))
+                           for key, value in row.items())
+            window = (row['from_stop'].strip(), row['to_stop'].strip(),
+                      gtfs_time.ParseTime(row['from_time']), gtfs_time.ParseTime(row['to_time']))
+            observations[window].append(float(row['minutes']))
+    windows = collections.defaultdict(list)
+    for (from_stop, to_stop, start, end), minutes in observations.items():
+        windows[from_stop, to_stop].append(
+            (start, end, gtfs_time.Minutes(sum(minutes) / len(minutes))))
+    return SegmentTimes(windows)
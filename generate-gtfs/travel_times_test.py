@@ -0,0 +1,113 @@
+# coding=UTF8
+"""Tests of travel_times: window lookup, past-midnight windows and the memo."""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import gtfs_time
+import schedule_spec
+import travel_times
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+def T(value):
+    return gtfs_time.ParseTime(value)
+
+class SegmentTimesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.model = travel_times.SegmentTimes({
+            ('a', 'b'): [(T('07:00:00'), T('09:30:00'), 1800),
+                         (T('22:00:00'), T('26:00:00'), 600)],
+            ('b', 'c'): [(T('00:00:00'), T('01:00:00'), 300)]})
+
+    def testWindows(self):
+        seconds = lambda departure: self.model.Seconds('a', 'b', T(departure), 900)
+        self.assertEqual(seconds('06:59:59'), 900)
+        self.assertEqual(seconds('07:00:00'), 1800)
+        self.assertEqual(seconds('09:29:59'), 1800)
+        self.assertEqual(seconds('09:30:00'), 900)
+        self.assertEqual(self.model.Seconds('a', 'c', T('08:00:00'), 900), 900)
+
+    def testPastMidnight(self):
+        seconds = lambda departure: self.model.Seconds('a', 'b', T(departure), 900)
+        self.assertEqual(seconds('23:59:59'), 600)
+        self.assertEqual(seconds('24:30:00'), 600)
+        self.assertEqual(seconds('25:59:59'), 600)
+        self.assertEqual(seconds('26:00:00'), 900)
+        # Before 26:00:00 the window of the service day wins; after, the
+        # departure falls in 07:00:00 to 09:30:00 on the next day's clock.
+        self.assertEqual(seconds('31:00:00'), 1800)
+        self.assertEqual(self.model.Seconds('b', 'c', T('24:30:00'), 900), 300)
+        self.assertEqual(self.model.Seconds('b', 'c', T('00:30:00'), 900), 300)
+
+    def testMemoIsPerWindow(self):
+        for departure in range(T('07:00:00'), T('09:30:00'), 7):
+            self.assertEqual(self.model.Seconds('a', 'b', departure, 900), 1800)
+        # Bounds on the half hour: a bucket per 30 minutes of the window.
+        self.assertEqual(len(self.model._memo), 5)
+
+    def testPickle(self):
+        model = pickle.loads(pickle.dumps(self.model))
+        self.assertEqual(model.Seconds('a', 'b', T('24:30:00'), 900), 600)
+
+    def testExample(self):
+        model = travel_times.LoadSegmentTimes(os.path.join(DIRECTORY, 'io2017_travel_times.csv'))
+        # The two observations of the window are averaged.
+        self.assertEqual(model.Seconds('hyattRegencyEmbarcaderoSF', 'shorelineAmphitheatre',
+                                       T('06:30:00'), 0), 100 * 60)
+        self.assertEqual(model.Seconds('millbraeBart', 'hyattRegencyEmbarcaderoSF',
+                                       T('24:10:00'), 0), 25 * 60)
+        compiled = schedule_spec.CompileSpec(
+            schedule_spec.LoadSpec(os.path.join(DIRECTORY, 'io2017.json')), travel_times=model)
+        plain = schedule_spec.CompileSpec(
+            schedule_spec.LoadSpec(os.path.join(DIRECTORY, 'io2017.json')))
+        self.assertEqual(len(compiled.st_time), len(plain.st_time))
+        self.assertNotEqual(list(compiled.st_time), list(plain.st_time))
+
+    def testInvertedWindow(self):
+        with self.assertRaises(ValueError) as raised:
+            travel_times.SegmentTimes({('a', 'b'): [(T('09:00:00'), T('07:00:00'), 1800)]})
+        self.assertIn('a -> b', str(raised.exception))
+        self.assertRaises(ValueError, travel_times.SegmentTimes,
+                          {('a', 'b'): [(T('07:00:00'), T('07:00:00'), 1800)]})
+
+    def testOverlappingWindows(self):
+        with self.assertRaises(ValueError) as raised:
+            travel_times.SegmentTimes({('a', 'b'): [(T('07:00:00'), T('09:30:00'), 1800),
+                                                    (T('09:00:00'), T('10:00:00'), 1200)]})
+        self.assertIn('a -> b', str(raised.exception))
+        # Windows may meet, and other segments may share a window.
+        model = travel_times.SegmentTimes({('a', 'b'): [(T('07:00:00'), T('09:30:00'), 1800),
+                                                        (T('09:30:00'), T('10:00:00'), 1200)],
+                                           ('b', 'a'): [(T('07:00:00'), T('09:30:00'), 600)]})
+        self.assertEqual(model.Seconds('a', 'b', T('09:45:00'), 900), 1200)
+
+class LoadSegmentTimesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='travel-times-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _Load(self, *rows):
+        path = os.path.join(self.directory, 'travel_times.csv')
+        with open(path, 'w') as csv_file:
+            csv_file.write('from_stop,to_stop,from_time,to_time,minutes\n')
+            for row in rows:
+                csv_file.write(row + '\n')
+        return travel_times.LoadSegmentTimes(path)
+
+    def testInvertedWindow(self):
+        self.assertRaises(ValueError, self._Load, 'a,b,09:00:00,07:00:00,30')
+
+    def testOverlappingWindows(self):
+        self.assertRaises(ValueError, self._Load, 'a,b,07:00:00,09:30:00,30',
+                          'a,b,06:00:00,08:00:00,20')
+
+if __name__ == '__main__':
+    unittest.main()
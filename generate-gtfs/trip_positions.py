@@ -0,0 +1,226 @@
+# coding=UTF8
+"""Precomputed bus positions.
+
+Every run of a trip (a trip, or a departure of a trip with frequencies) is
+sampled every `step` seconds from its first to its last stop time, along
+its shape when a feed_shapes.ShapeBuilder assigned one and along straight
+lines between its stops otherwise. The samples of each run are written
+out as its block arrives, one after the other, so the file holds only the
+slots a run is under way and memory holds only a few numbers per run.
+The runs are indexed per service period in order of their first slot, so
+the buses under way at one moment are found by two bisections. The file is
+in the columnar format of feed_columnar.py and TripPositions memory-maps
+it. Columns:
+
+  positions.step (i4)         the one sampling interval, in seconds
+  periods.runs (i4)           the runs of service period p are runs[p]:runs[p + 1]
+  periods.max_slots (i4)      the most slots of any run of the period
+  runs.trip (i4)              trip index of each run
+  runs.first_slot (i4)        its first time slot (time / step), ascending per period
+  runs.slots (i4)             its number of slots
+  runs.offset (i4)            its position in slot first_slot + i is row
+                              offset + i of positions.*
+  positions.lat, positions.lon (f4)
+  trips.id (str), trips.route (i4), routes.name, routes.color (str),
+  service_periods.key (str), calendar_dates.date, calendar_dates.service (i4)
+"""
+
+import bisect
+import collections
+import shutil
+from array import array
+
+import feed_columnar
+import feed_shapes
+
+def _Sample(times, distances, points, cumulative, step):
+    """Return (first slot, lats, lngs) of a run with stop `times` and stop
+    `distances` along the path `points`, whose own distances are `cumulative`."""
+    first_slot = -(-times[0] // step)
+    last_slot = times[-1] // step
+    lats, lngs = array('f'), array('f')
+    stop, segment, last_stop, last_segment = 0, 0, len(times) - 2, len(points) - 2
+    for slot in range(first_slot, last_slot + 1):
+        time = slot * step
+        while stop < last_stop and times[stop + 1] <= time:
+            stop += 1
+        span = times[stop + 1] - times[stop]
+        fraction = float(time - times[stop]) / span if span > 0 else 0.0
+        distance = distances[stop] + fraction * (distances[stop + 1] - distances[stop])
+        while segment < last_segment and cumulative[segment + 1] <= distance:
+            segment += 1
+        if last_segment < 0:
+            lat, lng = points[0]
+        else:
+            length = cumulative[segment + 1] - cumulative[segment]
+            along = (distance - cumulative[segment]) / length if length > 0 else 0.0
+            along = min(1.0, max(0.0, along))
+            (lat1, lng1), (lat2, lng2) = points[segment], points[segment + 1]
+            lat, lng = lat1 + (lat2 - lat1) * along, lng1 + (lng2 - lng1) * along
+        lats.append(lat)
+        lngs.append(lng)
+    return first_slot, lats, lngs
+
+class TripPositionWriter(feed_columnar.ColumnarFeedWriter):
+    """Writes the position tables of a CompiledSchedule.
+
+    Call WriteBlock() with each block of trips, after `shapes` (a
+    feed_shapes.ShapeBuilder, or None for straight lines) has seen it, and
+    Close() with the final schedule. The samples are written as they are
+    taken; Close() sorts the runs of each service period by first slot.
+    """
+
+    def __init__(self, path, step=5, shapes=None):
+        feed_columnar.ColumnarFeedWriter.__init__(self, path)
+        self.step = step
+        self.shapes = shapes
+        self._shape_distances = {}
+        # Per run: service period, first slot, trip, number of slots, offset.
+        self._runs = [array('i') for _ in range(5)]
+        self._num_trips = 0
+
+    def _Path(self, compiled, trip, stops):
+        "Return (points, cumulative distances, stop distances) for `trip`."
+        if self.shapes is not None and compiled.trip_shape:
+            shape = compiled.trip_shape[trip]
+            points = self.shapes.shapes[shape]
+            cumulative = self._shape_distances.get(shape)
+            if cumulative is None:
+                cumulative = self._shape_distances[shape] = feed_shapes.Cumulative(points)
+            begin = compiled.trip_offsets[trip]
+            return points, cumulative, compiled.st_dist[begin:begin + len(stops)]
+        points = [(float(compiled.stops[stop]['lat']), float(compiled.stops[stop]['lng']))
+                  for stop in stops]
+        cumulative = feed_shapes.Cumulative(points)
+        return points, cumulative, cumulative
+
+    def WriteBlock(self, compiled):
+        "Sample the runs of the trips currently held by `compiled`."
+        starts = collections.defaultdict(list)
+        for trip, start, end, headway in zip(compiled.freq_trip, compiled.freq_start,
+                                             compiled.freq_end, compiled.freq_headway):
+            starts[trip].extend(range(start, end, headway))
+        offsets = compiled.trip_offsets
+        for trip in range(compiled.NumTrips()):
+            begin, end = offsets[trip], offsets[trip + 1]
+            times = compiled.st_time[begin:end]
+            if len(times) < 2:
+                continue
+            points, cumulative, distances = self._Path(compiled, trip, compiled.st_stop[begin:end])
+            for start in starts.get(trip, [times[0]]):
+                shifted = array('i', [time + start - times[0] for time in times])
+                first_slot, lats, lngs = _Sample(shifted, distances, points, cumulative,
+                                                 self.step)
+                run = (compiled.trip_service[trip], first_slot, self._num_trips + trip,
+                       len(lats), self._counts.get('positions.lat', 0))
+                for column, value in zip(self._runs, run):
+                    column.append(value)
+                self._Append('positions.lat', 'f4', lats)
+                self._Append('positions.lon', 'f4', lngs)
+        self._AppendStrings('trips.id', compiled.trip_ids)
+        self._Append('trips.route', 'i4', compiled.trip_route)
+        self._num_trips += compiled.NumTrips()
+
+    def Close(self, compiled):
+        "Index the runs of each service period and write the file."
+        try:
+            self._Append('positions.step', 'i4', [self.step])
+            services, first_slots, trips, slots, offsets = self._runs
+            order = sorted(range(len(services)),
+                           key=lambda run: (services[run], first_slots[run], trips[run]))
+            self._Append('runs.trip', 'i4', [trips[run] for run in order])
+            self._Append('runs.first_slot', 'i4', [first_slots[run] for run in order])
+            self._Append('runs.slots', 'i4', [slots[run] for run in order])
+            self._Append('runs.offset', 'i4', [offsets[run] for run in order])
+            run_offsets = [0] * (len(compiled.service_periods) + 1)
+            max_slots = [0] * len(compiled.service_periods)
+            for service, run_slots in zip(services, slots):
+                run_offsets[service + 1] += 1
+                max_slots[service] = max(max_slots[service], run_slots)
+            for service in range(len(max_slots)):
+                run_offsets[service + 1] += run_offsets[service]
+            self._Append('periods.runs', 'i4', run_offsets)
+            self._Append('periods.max_slots', 'i4', max_slots)
+            # Without any run or trip, the columns are still written, empty.
+            self._Append('positions.lat', 'f4', [])
+            self._Append('positions.lon', 'f4', [])
+            self._AppendStrings('trips.id', [])
+            self._Append('trips.route', 'i4', [])
+            self._AppendStrings('service_periods.key',
+                                [period['id'] for period in compiled.service_periods])
+            dates = sorted((int(date), i) for i, period in enumerate(compiled.service_periods)
+                           for date in period['dates'])
+            self._Append('calendar_dates.date', 'i4', [date for date, _ in dates])
+            self._Append('calendar_dates.service', 'i4', [service for _, service in dates])
+            self._AppendStrings('routes.name', [
+                route.get('short_name') or route.get('long_name', '') for route in compiled.routes])
+            self._AppendStrings('routes.color',
+                                [route.get('color', '') for route in compiled.routes])
+            for column_file in self._files.values():
+                column_file.close()
+            self._Assemble(compiled.agency)
+        finally:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+Bus = collections.namedtuple('Bus', ['trip_id', 'route', 'lat', 'lng', 'trip'])
+
+class TripPositions(object):
+    "A memory-mapped position file written by TripPositionWriter."
+
+    def __init__(self, path):
+        self.feed = feed_columnar.ColumnarFeed(path)
+        column = self.feed.Column
+        self.step = column('positions.step')[0]
+
+    def Service(self, key):
+        "Return the index of the service period with spec id `key`."
+        return list(self.feed.Column('service_periods.key')).index(key)
+
+    def Services(self, date):
+        "Return the indexes of the service periods running on `date` (YYYYMMDD)."
+        dates = self.feed.Column('calendar_dates.date')
+        services = self.feed.Column('calendar_dates.service')
+        date = int(date)
+        return [services[i] for i in range(bisect.bisect_left(dates, date),
+                                           bisect.bisect_right(dates, date))]
+
+    def Slot(self, service, time):
+        """Return (run trips, lats, lngs), lists of the runs of `service` under
+        way at `time` seconds since its midnight, rounded down to a slot."""
+        column = self.feed.Column
+        runs = column('periods.runs')
+        first_slots, slots = column('runs.first_slot'), column('runs.slots')
+        slot = time // self.step
+        # No run starting max_slots or more slots earlier is still under way.
+        begin = bisect.bisect_right(first_slots, slot - column('periods.max_slots')[service],
+                                    runs[service], runs[service + 1])
+        end = bisect.bisect_right(first_slots, slot, begin, runs[service + 1])
+        run_trips, offsets = column('runs.trip'), column('runs.offset')
+        lats, lngs = column('positions.lat'), column('positions.lon')
+        trips, run_lats, run_lngs = [], [], []
+        for run in range(begin, end):
+            sample = slot - first_slots[run]
+            if sample < slots[run]:
+                trips.append(run_trips[run])
+                run_lats.append(lats[offsets[run] + sample])
+                run_lngs.append(lngs[offsets[run] + sample])
+        return trips, run_lats, run_lngs
+
+    def Buses(self, service, time):
+        "Return the Buses under way in `service` at `time` seconds since its midnight."
+        trips, lats, lngs = self.Slot(service, time)
+        trip_ids = self.feed.Column('trips.id')
+        trip_routes = self.feed.Column('trips.route')
+        route_names = self.feed.Column('routes.name')
+        return [Bus(trip_ids[trip], route_names[trip_routes[trip]], lat, lng, trip)
+                for trip, lat, lng in zip(trips, lats, lngs)]
+
+    def Close(self):
+        "Close the file; Slot() and Buses() return copies, which stay valid."
+        self.feed.Close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
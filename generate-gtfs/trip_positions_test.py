@@ -0,0 +1,103 @@
+# coding=UTF8
+"""Tests of trip_positions: sampled positions against the CSV feed's stop times."""
+
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+
+import feed_reader
+import feed_writer
+import gtfs_time
+import schedule_spec
+import trip_positions
+
+SPEC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'io2017.json')
+STEP = 60
+
+class TripPositionsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp(prefix='trip-positions-test-')
+        zip_path = os.path.join(cls.directory, 'feed.zip')
+        cls.positions_path = os.path.join(cls.directory, 'feed.pos')
+        positions = trip_positions.TripPositionWriter(cls.positions_path, STEP)
+        with feed_writer.FeedWriter(zip_path) as writer:
+            def WriteBlock(block):
+                feed_writer.WriteTrips(writer, block)
+                positions.WriteBlock(block)
+            compiled = schedule_spec.CompileSpec(schedule_spec.LoadSpec(SPEC),
+                                                 on_block=WriteBlock, frequencies=True)
+            feed_writer.WriteMetadata(writer, compiled)
+        positions.Close(compiled)
+        cls.service_keys = [period['id'] for period in compiled.service_periods]
+        cls.expected = cls._ScanFeed(zip_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    @staticmethod
+    def _ScanFeed(path):
+        """Return {(service index, slot): sorted [(trip id, lat, lng)]}, the runs
+        under way, interpolated in time between their stops."""
+        with feed_reader.Feed(path) as feed:
+            stops = dict((stop['stop_id'], (float(stop['stop_lat']), float(stop['stop_lon'])))
+                         for stop in feed.ReadDicts('stops.txt'))
+            starts = collections.defaultdict(list)
+            for row in feed.ReadDicts('frequencies.txt'):
+                starts[row['trip_id']].extend(range(
+                    gtfs_time.ParseTime(row['start_time']), gtfs_time.ParseTime(row['end_time']),
+                    int(row['headway_secs'])))
+            stop_times = collections.defaultdict(list)
+            for row in feed.ReadDicts('stop_times.txt'):
+                stop_times[row['trip_id']].append(
+                    (int(row['stop_sequence']), gtfs_time.ParseTime(row['arrival_time']),
+                     stops[row['stop_id']]))
+            trips = list(feed.ReadDicts('trips.txt'))
+        expected = collections.defaultdict(list)
+        for trip in trips:
+            rows = sorted(stop_times[trip['trip_id']])
+            first = rows[0][1]
+            for start in starts.get(trip['trip_id'], [first]):
+                times = [time - first + start for _, time, _ in rows]
+                for slot in range(-(-times[0] // STEP), times[-1] // STEP + 1):
+                    time = slot * STEP
+                    i = max(i for i in range(len(times) - 1) if times[i] <= time or i == 0)
+                    span = times[i + 1] - times[i]
+                    fraction = float(time - times[i]) / span if span else 0.0
+                    (lat1, lng1), (lat2, lng2) = rows[i][2], rows[i + 1][2]
+                    expected[int(trip['service_id']), slot].append(
+                        (trip['trip_id'], lat1 + (lat2 - lat1) * fraction,
+                         lng1 + (lng2 - lng1) * fraction))
+        for buses in expected.values():
+            buses.sort()
+        return expected
+
+    def setUp(self):
+        self.positions = trip_positions.TripPositions(self.positions_path)
+
+    def tearDown(self):
+        self.positions.Close()
+
+    def testEverySlot(self):
+        slots = set(slot for _, slot in self.expected)
+        for service in range(len(self.service_keys)):
+            for slot in range(min(slots) - 1, max(slots) + 2):
+                buses = sorted(self.positions.Buses(service, slot * STEP + STEP // 2))
+                expected = self.expected.get((service, slot), [])
+                self.assertEqual([bus.trip_id for bus in buses],
+                                 [trip_id for trip_id, _, _ in expected])
+                for bus, (_, lat, lng) in zip(buses, expected):
+                    self.assertAlmostEqual(bus.lat, lat, places=4)
+                    self.assertAlmostEqual(bus.lng, lng, places=4)
+
+    def testServices(self):
+        self.assertEqual([self.service_keys[service]
+                          for service in self.positions.Services('20170518')], ['day2'])
+        self.assertEqual(self.positions.Services('20170601'), [])
+
+if __name__ == '__main__':
+    unittest.main()
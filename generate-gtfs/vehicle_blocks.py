@@ -0,0 +1,142 @@
+# coding=UTF8
+"""Vehicle blocks: which bus runs which trips.
+
+The trips of each (route, service period) are chained into blocks, one per
+vehicle, greedily in order of departure: a trip goes to a vehicle that is
+free at its first stop in time, preferring one already there, then the one
+with the shortest deadhead; otherwise it needs a new vehicle. A vehicle is
+free `layover` seconds after its last trip ends, and deadheads between
+stops at `speed` km/h over DETOUR_FACTOR times the straight-line distance.
+
+With a heap of free vehicles per terminal stop this is O(n log n) in the
+number of trips for a fixed number of terminals. Without deadheads, taking
+any free vehicle in departure order uses the fewest vehicles possible, as
+for interval partitioning; with deadheads it is a good heuristic.
+
+Trips with frequencies are blocked per departure but get no block_id, as
+one trips.txt row then stands for runs of several vehicles.
+"""
+
+import collections
+import heapq
+
+import feed_shapes
+
+# Road distance over straight-line distance for deadheads.
+DETOUR_FACTOR = 1.3
+
+def BlockId(route_id, service_id, vehicle):
+    "Return the block id of the `vehicle`th (from 0) block of a route and service period."
+    return '%s_%s_block%d' % (route_id, service_id, vehicle + 1)
+
+class BlockBuilder(object):
+    """Assigns the trips of a CompiledSchedule to vehicle blocks as its rows are handed over.
+
+    AddBlock() fills the `block_ids` column of the rows held; `vehicles`
+    maps (route, service period) indexes to the number of blocks.
+    """
+
+    def __init__(self, speed=30.0, layover=5 * 60):
+        self.speed = speed
+        self.layover = layover
+        self._deadheads = {}
+        self.vehicles = {}
+
+    def Deadhead(self, compiled, from_stop, to_stop):
+        "Return the seconds to drive empty from stop index `from_stop` to `to_stop`."
+        if from_stop == to_stop:
+            return 0
+        key = (from_stop, to_stop)
+        seconds = self._deadheads.get(key)
+        if seconds is None:
+            start, end = compiled.stops[from_stop], compiled.stops[to_stop]
+            (meters,) = feed_shapes.Haversine([float(start['lat'])], [float(start['lng'])],
+                                              [float(end['lat'])], [float(end['lng'])])
+            seconds = self._deadheads[key] = int(round(
+                meters * DETOUR_FACTOR / (self.speed / 3.6)))
+        return seconds
+
+    def _Runs(self, compiled):
+        """Return {(route, service period): runs} for the trips held by `compiled`.
+
+        Runs are (start, end, first stop, last stop, trip), sorted by start,
+        with trip None for the departures of trips with frequencies.
+        """
+        starts = collections.defaultdict(list)
+        for trip, start, end, headway in zip(compiled.freq_trip, compiled.freq_start,
+                                             compiled.freq_end, compiled.freq_headway):
+            starts[trip].extend(range(start, end, headway))
+        runs = collections.defaultdict(list)
+        for trip in range(compiled.NumTrips()):
+            begin, end = compiled.trip_offsets[trip], compiled.trip_offsets[trip + 1] - 1
+            first, last = compiled.st_time[begin], compiled.st_time[end]
+            first_stop, last_stop = compiled.st_stop[begin], compiled.st_stop[end]
+            shard = runs[compiled.trip_route[trip], compiled.trip_service[trip]]
+            if trip in starts:
+                shard.extend((start, start + last - first, first_stop, last_stop, None)
+                             for start in starts[trip])
+            else:
+                shard.append((first, last, first_stop, last_stop, trip))
+        for shard in runs.values():
+            shard.sort(key=lambda run: run[:2])
+        return runs
+
+    def Chain(self, compiled, runs):
+        "Return the vehicle of each of `runs`, sorted by start, numbering vehicles from 0."
+        # Terminal stop -> heap of (time free, vehicle).
+        free = collections.defaultdict(list)
+        vehicles, count = [], 0
+        for start, end, first_stop, last_stop, _ in runs:
+            best = None
+            for stop, waiting in free.items():
+                if not waiting:
+                    continue
+                deadhead = self.Deadhead(compiled, stop, first_stop)
+                if waiting[0][0] + deadhead <= start and (best is None or deadhead < best[0]):
+                    best = (deadhead, stop)
+            if best is None:
+                vehicle, count = count, count + 1
+            else:
+                _, vehicle = heapq.heappop(free[best[1]])
+            vehicles.append(vehicle)
+            heapq.heappush(free[last_stop], (end + self.layover, vehicle))
+        return vehicles
+
+    def AddBlock(self, compiled):
+        "Set `block_ids` for the trips currently held by `compiled`."
+        compiled.block_ids = [None] * compiled.NumTrips()
+        # The rows of a (route, service period) are always handed over together.
+        for (route, service), runs in self._Runs(compiled).items():
+            vehicles = self.Chain(compiled, runs)
+            route_id = compiled.routes[route]['id']
+            service_id = compiled.service_periods[service]['id']
+            for (_, _, _, _, trip), vehicle in zip(runs, vehicles):
+                if trip is not None:
+                    compiled.block_ids[trip] = BlockId(route_id, service_id, vehicle)
+            self.vehicles[route, service] = max(vehicles) + 1
+
+    def Report(self, compiled):
+        """Return lines with the vehicles each route needs on its busiest
+        service period, and the whole fleet on the busiest date. Service
+        periods sharing a date are blocked apart and their vehicles add up,
+        which is why generate-gtfs.py refuses --blocks with
+        --compress-calendar."""
+        lines = []
+        by_route = collections.defaultdict(dict)
+        for (route, service), count in self.vehicles.items():
+            by_route[route][service] = count
+        for route in sorted(by_route):
+            counts = by_route[route]
+            peak = max(counts, key=lambda service: (counts[service], -service))
+            lines.append('%s: %d vehicles (%s)' % (
+                compiled.routes[route]['id'], counts[peak], ', '.join(
+                    '%s %d' % (compiled.service_periods[service]['id'], counts[service])
+                    for service in sorted(counts))))
+        by_date = collections.Counter()
+        for (route, service), count in self.vehicles.items():
+            for date in compiled.service_periods[service]['dates']:
+                by_date[date] += count
+        if by_date:
+            date = max(sorted(by_date), key=lambda date: by_date[date])
+            lines.append('fleet: %d vehicles on %s' % (by_date[date], date))
+        return lines